@@ -0,0 +1,217 @@
+# batch_inference.py
+"""
+Bedrock batch inference for the first pass.
+
+Prompts are written to a JSONL manifest of {"recordId", "modelInput"} lines,
+submitted through a backend, and the JSONL results (one line per record with
+either "modelOutput" or "error") are read back by recordId.
+
+Backends implement two methods:
+    submit(manifest_path, job_name) -> job_id
+    wait(job_id) -> local path of the results JSONL
+"""
+import json
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+from LLM_APIs.bedrock_client import get_bedrock_client
+
+# Bedrock rejects jobs with fewer records than this
+MIN_BATCH_RECORDS = 100
+
+# Terminal job states, see GetModelInvocationJob
+SUCCEEDED_STATES = {'Completed', 'PartiallyCompleted'}
+FAILED_STATES = {'Failed', 'Stopped', 'Expired'}
+
+
+def part_record_id(part_number: int) -> str:
+    return f'part_{part_number:02d}'
+
+
+def batch_job_name(log_name: str) -> str:
+    """A unique job name limited to the characters and length Bedrock accepts."""
+    name = re.sub(r'[^a-zA-Z0-9-]+', '-', log_name).strip('-') or 'timeline'
+    return f"{name[:48]}-{time.strftime('%Y%m%d%H%M%S')}"
+
+
+def write_manifest(records: Dict[str, dict], manifest_path: Union[str, Path]) -> Path:
+    """Write {recordId: modelInput} as a batch-inference input JSONL file."""
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    with manifest_path.open('w', encoding='utf-8') as f:
+        for record_id, model_input in records.items():
+            f.write(json.dumps({'recordId': record_id, 'modelInput': model_input}, ensure_ascii=False) + '\n')
+    return manifest_path
+
+
+def read_results(results_path: Union[str, Path]) -> Dict[str, dict]:
+    """Map recordId to its result line from a batch-inference output JSONL file."""
+    results = {}
+    with open(results_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[result.get('recordId')] = result
+    return results
+
+
+def result_text(result: Optional[dict]) -> str:
+    """Reply text of one Claude result line; raises RuntimeError for errors and missing records."""
+    if result is None:
+        raise RuntimeError('no result returned for record')
+    if result.get('error'):
+        error = result['error']
+        raise RuntimeError(error.get('errorMessage', error) if isinstance(error, dict) else error)
+    return result['modelOutput']['content'][0]['text'].strip()
+
+
+class LocalDirectoryBackend:
+    """
+    Directory-based stand-in for Bedrock batch inference.
+
+    submit() copies the manifest to <root>/<job>/input/; wait() polls until
+    <root>/<job>/output/<manifest name>.out exists, as written by another
+    process in Bedrock's output format. If `responder` is given, it is called
+    with each record's modelInput and its return value written as that record's
+    modelOutput at submit time, so jobs complete immediately.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        responder: Optional[Callable[[dict], dict]] = None,
+        poll_interval: float = 5.0,
+        timeout: Optional[float] = None
+    ):
+        self.root = Path(root)
+        self.responder = responder
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    def _output_path(self, job_id: str) -> Path:
+        job_dir = self.root / job_id
+        manifest = next((job_dir / 'input').glob('*.jsonl'))
+        return job_dir / 'output' / f'{manifest.name}.out'
+
+    def submit(self, manifest_path: Union[str, Path], job_name: str) -> str:
+        input_dir = self.root / job_name / 'input'
+        input_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copy(manifest_path, input_dir / Path(manifest_path).name)
+        if self.responder is not None:
+            output_path = self._output_path(job_name)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(manifest_path, 'r', encoding='utf-8') as src, \
+                    output_path.open('w', encoding='utf-8') as dst:
+                for line in src:
+                    record = json.loads(line)
+                    try:
+                        record['modelOutput'] = self.responder(record['modelInput'])
+                    except Exception as e:
+                        record['error'] = {'errorMessage': str(e)}
+                    dst.write(json.dumps(record, ensure_ascii=False) + '\n')
+        return job_name
+
+    def wait(self, job_id: str) -> Path:
+        output_path = self._output_path(job_id)
+        started = time.monotonic()
+        while not output_path.exists():
+            if self.timeout is not None and time.monotonic() - started > self.timeout:
+                raise TimeoutError(f'No results for batch job {job_id} in {output_path}')
+            time.sleep(self.poll_interval)
+        return output_path
+
+
+class BedrockBatchBackend:
+    """
+    Bedrock model-invocation jobs. The manifest is uploaded under
+    `s3_uri`/<job>/input/, results are written by Bedrock under
+    `s3_uri`/<job>/output/ and downloaded next to the local manifest.
+    `role_arn` must allow Bedrock to read and write that S3 location.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        role_arn: str,
+        s3_uri: str,
+        region_name: str = 'us-east-1',
+        poll_interval: float = 60.0,
+        timeout: Optional[float] = None
+    ):
+        self.model_id = model_id
+        self.role_arn = role_arn
+        self.s3_uri = s3_uri.rstrip('/')
+        self.region_name = region_name
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._jobs = {}
+
+    @staticmethod
+    def _split_s3_uri(uri: str):
+        bucket, _, key = uri[len('s3://'):].partition('/')
+        return bucket, key
+
+    def submit(self, manifest_path: Union[str, Path], job_name: str) -> str:
+        manifest_path = Path(manifest_path)
+        input_uri = f'{self.s3_uri}/{job_name}/input/{manifest_path.name}'
+        output_uri = f'{self.s3_uri}/{job_name}/output/'
+
+        s3 = get_bedrock_client(self.region_name, service_name='s3')
+        s3.upload_file(str(manifest_path), *self._split_s3_uri(input_uri))
+
+        bedrock = get_bedrock_client(self.region_name, service_name='bedrock')
+        response = bedrock.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=self.model_id,
+            inputDataConfig={'s3InputDataConfig': {'s3Uri': input_uri, 's3InputFormat': 'JSONL'}},
+            outputDataConfig={'s3OutputDataConfig': {'s3Uri': output_uri}},
+        )
+        job_arn = response['jobArn']
+        self._jobs[job_arn] = (output_uri, manifest_path)
+        print(f'Submitted batch job {job_name} ({job_arn})')
+        return job_arn
+
+    def wait(self, job_id: str) -> Path:
+        output_uri, manifest_path = self._jobs[job_id]
+        bedrock = get_bedrock_client(self.region_name, service_name='bedrock')
+        started = time.monotonic()
+        while True:
+            job = bedrock.get_model_invocation_job(jobIdentifier=job_id)
+            status = job['status']
+            if status in SUCCEEDED_STATES:
+                break
+            if status in FAILED_STATES:
+                raise RuntimeError(f"Batch job {job_id} {status}: {job.get('message', '')}")
+            if self.timeout is not None and time.monotonic() - started > self.timeout:
+                raise TimeoutError(f'Batch job {job_id} still {status} after {self.timeout}s')
+            print(f'Batch job {job_id}: {status}')
+            time.sleep(self.poll_interval)
+
+        # Bedrock writes <output uri><job id>/<input file name>.out
+        results_uri = f"{output_uri}{job_id.split('/')[-1]}/{manifest_path.name}.out"
+        results_path = manifest_path.with_name(f'{manifest_path.name}.out')
+        s3 = get_bedrock_client(self.region_name, service_name='s3')
+        s3.download_file(*self._split_s3_uri(results_uri), str(results_path))
+        return results_path
+
+
+def run_batch_job(
+    backend,
+    records: Dict[str, dict],
+    manifest_path: Union[str, Path],
+    job_name: str
+) -> Dict[str, dict]:
+    """Write `records` as a manifest, run it on `backend` and return read_results() of the output."""
+    if len(records) < MIN_BATCH_RECORDS and isinstance(backend, BedrockBatchBackend):
+        print(f'Warning: Bedrock batch jobs need at least {MIN_BATCH_RECORDS} records, '
+              f'this one has {len(records)}')
+    write_manifest(records, manifest_path)
+    job_id = backend.submit(manifest_path, job_name)
+    return read_results(backend.wait(job_id))
@@ -1,7 +1,9 @@
 # timeline_generator.py
 import json
+import threading
 import time
-from typing import Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import sys
 from pathlib import Path
 
@@ -10,7 +12,36 @@ from pathlib import Path
 # ──────────────────────────────
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(PROJECT_ROOT))
-from LLM_APIs.llm_bedrockClaude import call_bedrock  # <-- use the shared client
+from LLM_APIs.llm_bedrockClaude import build_request_body, call_bedrock  # <-- use the shared client
+from LLM_APIs.rate_limiter import TokenBucketLimiter, estimate_tokens
+from LLM_APIs.retry import AIMDConcurrency
+from tools.payload_encoder import encode_events
+from tools.run_metrics import record_call
+from Bedrock.batch_inference import batch_job_name, part_record_id, result_text, run_batch_job
+
+# Stand-in for the log payload when splitting the template around it
+_PAYLOAD_SENTINEL = "\x00log_json\x00"
+
+
+def split_prompt_template(prompt_template: str) -> tuple:
+    """
+    Split a `{log_json}` prompt template into the static text before the
+    payload and the text after it, with `{{`/`}}` escapes already resolved.
+    """
+    rendered = prompt_template.format(log_json=_PAYLOAD_SENTINEL)
+    prefix, _, suffix = rendered.partition(_PAYLOAD_SENTINEL)
+    return prefix, suffix
+
+
+def _report_failed(failed: Dict[int, Exception], raise_error: bool = True) -> None:
+    """Report the parts that failed; raise a RuntimeError listing them if `raise_error`."""
+    if not failed:
+        return
+    message = f"{len(failed)} part(s) failed: {', '.join(str(n) for n in sorted(failed))}"
+    if raise_error:
+        raise RuntimeError(message)
+    print(message)
+
 
 def generate_timeline(
     md_filepath: str,
@@ -20,16 +51,76 @@ def generate_timeline(
     log_name: str,
     region: str = 'us-east-1',
     model_id: str = 'us.anthropic.claude-sonnet-4-20250514-v1:0',
-    delay_between_calls: float = 8.0,
-    long_delay_every: Optional[int] = 7,
-    long_delay_duration: float = 100.0,
+    max_workers: int = 4,
+    requests_per_minute: Optional[float] = 20,
+    tokens_per_minute: Optional[float] = 200_000,
     max_tokens: int = 9999,
     temperature: float = 0.8,
     top_p: float = 0.9,
-) -> None:
+    payload_format: str = 'indent',
+    stream: bool = False,
+    on_partial: Optional[Callable[[int, str], None]] = None,
+    on_reply: Optional[Callable[[int, str], None]] = None,
+    cache_prompt_prefix: bool = True,
+    batch_backend=None,
+    metrics=None,
+    parts: Optional[Iterable[Tuple[int, List[dict]]]] = None,
+    max_pending_parts: Optional[int] = None,
+    failed_parts: Optional[Dict[int, Exception]] = None,
+) -> int:
     """
     Iterate over JSON log parts, call Amazon Bedrock to generate timeline entries,
-    and append each part's output to a Markdown file.
+    and append each part's output to a Markdown file. Returns the number of
+    parts processed.
+
+    Parts are read from `./requestsToLLM/<log_name>/part_NN.json` for
+    NN in [start_range, end_range), or, if `parts` is given, taken from that
+    iterable of (part_number, events) pairs as it produces them (e.g.
+    tools.split_jsonToFit.iter_parts), so the first call starts while later
+    parts are still being split. At most `max_pending_parts` (default
+    2 * max_workers) parts are submitted but unfinished at any time; the
+    iterable is not advanced further until one completes.
+
+    Parts are dispatched concurrently from a pool of `max_workers` threads,
+    paced by a requests-per-minute / tokens-per-minute token bucket (None
+    disables a limit). Replies are still written to the Markdown in part
+    order, as soon as every earlier part has been written.
+
+    Throttled calls are retried with backoff, and throttling lowers the
+    number of in-flight requests (AIMD) until calls succeed again. A part
+    that still fails is marked as failed in the Markdown instead of having
+    the error text written as its analysis, and a RuntimeError listing the
+    failed parts is raised once all other parts are written. If a
+    `failed_parts` dict is given, the failures are recorded there instead
+    (part number -> exception) and the call returns normally, so a pipeline
+    can go on with the parts that succeeded.
+
+    `payload_format` selects how each part's events are serialized into the
+    prompt (see tools.payload_encoder.PAYLOAD_FORMATS).
+
+    With `stream=True` each reply is streamed from Bedrock, and
+    `on_partial(part_number, text_so_far)` (if given) is called as text
+    arrives, so a part can be processed before it has finished generating.
+    `on_reply(part_number, reply)` (if given) is called with each successful
+    part's full reply as soon as it completes, in completion order and from
+    a worker thread (e.g. tools.consolidatorJSON.IncrementalConsolidator.add_reply).
+
+    With `cache_prompt_prefix`, the template text before `{log_json}` is sent
+    as a Claude prompt-cache block, so parts after the first read it from
+    the cache instead of reprocessing it (Bedrock only caches prefixes
+    above the model's minimum size, e.g. 1,024 tokens for Sonnet). Cache
+    read/write token counts are printed per part and in total.
+
+    With a `batch_backend` (see Bedrock.batch_inference), all parts are
+    instead written to one batch-inference manifest
+    (`./requestsToLLM/<log_name>/batch_input.jsonl`), submitted as a single
+    job and the results written to the same Markdown layout. Rate limits,
+    streaming and prompt caching do not apply in batch mode.
+
+    Each call's provider-reported token usage and timings (including the time
+    a part queued for a worker and for the rate limiter) are recorded under
+    the "first_pass" stage of `metrics` (a tools.run_metrics.RunMetrics),
+    if given.
     """
 
     # 1. Write (or overwrite) the file header
@@ -39,38 +130,158 @@ def generate_timeline(
     # 2. Load prompt template
     with open(prompt_filepath, 'r', encoding='utf-8') as f:
         prompt_template = f.read()
+    if cache_prompt_prefix:
+        prompt_prefix, prompt_suffix = split_prompt_template(prompt_template)
 
-    for part_number in range(start_range, end_range):
-        # Load the JSON log data
-        json_path = f'./requestsToLLM/{log_name}/part_{part_number:02d}.json'
-        with open(json_path, 'r', encoding='utf-8') as f:
-            log_data = json.load(f)
+    limiter = TokenBucketLimiter(requests_per_minute, tokens_per_minute)
+    concurrency = AIMDConcurrency(initial=max_workers, maximum=max_workers)
+    cache_totals = {'cache_read_input_tokens': 0, 'cache_creation_input_tokens': 0}
+    totals_lock = threading.Lock()
 
-        # Fill in the prompt
-        prompt = prompt_template.format(log_json=json.dumps(log_data, indent=2))
+    def iter_part_data():
+        if parts is not None:
+            yield from parts
+            return
+        for part_number in range(start_range, end_range):
+            yield part_number, None
+
+    def build_prompt(part_number: int, log_data: Optional[List[dict]] = None) -> tuple:
+        # Load the JSON log data unless the part was handed over directly
+        if log_data is None:
+            json_path = f'./requestsToLLM/{log_name}/part_{part_number:02d}.json'
+            with open(json_path, 'r', encoding='utf-8') as f:
+                log_data = json.load(f)
+
+        # Fill in the prompt; the static prefix is sent separately for caching
+        log_json = encode_events(log_data, payload_format)
+        if cache_prompt_prefix:
+            return prompt_prefix, log_json + prompt_suffix
+        return None, prompt_template.format(log_json=log_json)
+
+    def write_reply(part_number: int, reply: str) -> None:
+        with open(md_filepath, 'a', encoding='utf-8') as md_file:
+            md_file.write(f'## Part {part_number}\n\n')
+            md_file.write(reply + '\n\n')
+
+    failed = failed_parts if failed_parts is not None else {}
+
+    if batch_backend is not None:
+        # 3. Submit every part as one batch job and write the results in part order
+        records = {}
+        part_numbers = []
+        for part_number, log_data in iter_part_data():
+            part_numbers.append(part_number)
+            cached_prefix, prompt = build_prompt(part_number, log_data)
+            records[part_record_id(part_number)] = build_request_body(
+                (cached_prefix or '') + prompt, temperature, max_tokens
+            )
+        results = run_batch_job(
+            batch_backend,
+            records,
+            manifest_path=f'./requestsToLLM/{log_name}/batch_input.jsonl',
+            job_name=batch_job_name(log_name),
+        )
+        for part_number in part_numbers:
+            result = results.get(part_record_id(part_number))
+            try:
+                reply = result_text(result)
+                record_call(metrics, 'first_pass', {'usage': result['modelOutput'].get('usage', {})},
+                            part=part_number)
+                print(f"[Part {part_number}] received {len(reply)} chars")
+                if on_reply:
+                    on_reply(part_number, reply)
+            except Exception as e:
+                print(f"[Part {part_number}] failed: {e}")
+                failed[part_number] = e
+                reply = f'_Part {part_number} failed: {e}_'
+            write_reply(part_number, reply)
+
+        _report_failed(failed, failed_parts is None)
+        print(f"All responses written to {md_filepath}")
+        return len(part_numbers)
+
+    def run_part(part_number: int, submitted: float, log_data: Optional[List[dict]]) -> str:
+        queue_wait = time.monotonic() - submitted
+        cached_prefix, prompt = build_prompt(part_number, log_data)
+
+        # Throttle to the configured quota
+        queue_wait += limiter.acquire(estimate_tokens((cached_prefix or '') + prompt))
 
         # Use llm_bedrock
         reply = ""
+        stats = {'queue_wait': queue_wait}
         for chunk in call_bedrock(
             model_id=model_id,
             conversation_text=prompt,
             temperature=temperature,
             max_tokens=max_tokens,
-            region_name=region
+            region_name=region,
+            raise_errors=True,
+            concurrency=concurrency,
+            stream=stream,
+            use_cache=True,
+            stats=stats,
+            cached_prefix=cached_prefix
         ):
-            reply = chunk  # single final response
+            reply = chunk  # growing reply when streaming, else single final response
+            if on_partial:
+                on_partial(part_number, reply)
 
-        print(f"[Part {part_number}] received {len(reply)} chars")
+        print(f"[Part {part_number}] received {len(reply)} chars in {stats.get('latency', 0):.1f}s"
+              + (f" (first token after {stats['time_to_first_token']:.1f}s)"
+                 if 'time_to_first_token' in stats else ""))
+        record_call(metrics, 'first_pass', stats, part=part_number)
+        usage = stats.get('usage', {})
+        # A reply from the response cache carries its original call's usage
+        if cached_prefix and usage and not stats.get('cache_hit'):
+            print(f"[Part {part_number}] prompt cache: "
+                  f"{usage.get('cache_read_input_tokens', 0)} tokens read, "
+                  f"{usage.get('cache_creation_input_tokens', 0)} written")
+            with totals_lock:
+                for name in cache_totals:
+                    cache_totals[name] += usage.get(name) or 0
+        if on_reply:
+            on_reply(part_number, reply)
+        return reply
 
-        # Append to markdown
-        with open(md_filepath, 'a', encoding='utf-8') as md_file:
-            md_file.write(f'## Part {part_number}\n\n')
-            md_file.write(reply + '\n\n')
+    # 3. Dispatch parts and append replies to markdown in part order
+    max_pending = max_pending_parts or 2 * max_workers
+    futures = {}
+    replies = {}
+    next_part = None
+    num_parts = 0
+
+    def collect(done) -> None:
+        nonlocal next_part
+        for future in done:
+            part_number = futures.pop(future)
+            try:
+                replies[part_number] = future.result()
+            except Exception as e:
+                print(f"[Part {part_number}] failed: {e}")
+                failed[part_number] = e
+                replies[part_number] = f'_Part {part_number} failed: {e}_'
+        while next_part in replies:
+            write_reply(next_part, replies.pop(next_part))
+            next_part += 1
 
-        # Throttle
-        time.sleep(delay_between_calls)
-        if long_delay_every and (part_number - start_range + 1) % long_delay_every == 0:
-            print(f"Reached {part_number}; pausing {long_delay_duration}s")
-            time.sleep(long_delay_duration)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for part_number, log_data in iter_part_data():
+            if next_part is None:
+                next_part = part_number
+            # Backpressure: wait for a slot before taking the next part
+            while len(futures) >= max_pending:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                collect(done)
+            futures[pool.submit(run_part, part_number, time.monotonic(), log_data)] = part_number
+            num_parts += 1
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            collect(done)
 
+    _report_failed(failed, failed_parts is None)
+    if cache_prompt_prefix:
+        print(f"Prompt cache: {cache_totals['cache_read_input_tokens']} tokens read, "
+              f"{cache_totals['cache_creation_input_tokens']} written")
     print(f"All responses written to {md_filepath}")
+    return num_parts
@@ -12,6 +12,8 @@ import sys
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 sys.path.insert(0, str(PROJECT_ROOT))
 from LLM_APIs.llm_bedrockClaude import call_bedrock  # <-- use the shared client
+from tools.payload_encoder import encode_events
+from tools.run_metrics import record_call
 
 
 def generate_flagged_timeline(
@@ -25,7 +27,10 @@ def generate_flagged_timeline(
     max_tokens: int = 99999,
     temperature: float = 0.7,
     top_p: float = 0.95,
-    delay_between_parts: float = 0.0
+    delay_between_parts: float = 0.0,
+    payload_format: str = 'indent',
+    stream: bool = False,
+    metrics=None
 ) -> None:
     """
     Iterate once (or over a small range) to generate a consolidated timeline
@@ -43,6 +48,11 @@ def generate_flagged_timeline(
         temperature: Sampling temperature.
         top_p: Nucleus sampling parameter.
         delay_between_parts: Seconds to sleep after each part (default 0).
+        payload_format: Serialization of JSON inputs in the prompt
+                        (see tools.payload_encoder.PAYLOAD_FORMATS).
+        stream: Stream the reply from Bedrock instead of waiting for it whole.
+        metrics: tools.run_metrics.RunMetrics to record each call's token
+                 usage and timings in (stage "second_pass").
     """
     md_path = Path(md_filepath)
     # 1. Write (or overwrite) header
@@ -66,7 +76,7 @@ def generate_flagged_timeline(
             with open(json_path, 'r', encoding='utf-8') as f:
                 log_data = json.load(f)
             # Fill in the prompt using JSON
-            prompt = prompt_template.format(log_json=json.dumps(log_data, indent=2))
+            prompt = prompt_template.format(log_json=encode_events(log_data, payload_format))
 
         elif ext == ".md":
             # Load Markdown content
@@ -78,16 +88,24 @@ def generate_flagged_timeline(
 
         # Use llm_bedrock
         reply = ""
+        stats = {}
         for chunk in call_bedrock(
             model_id=model_id,
             conversation_text=prompt,
             temperature=temperature,
             max_tokens=max_tokens,
-            region_name=region
+            region_name=region,
+            raise_errors=True,
+            stream=stream,
+            use_cache=True,
+            stats=stats
         ):
-            reply = chunk  # single final response
+            reply = chunk  # growing reply when streaming, else single final response
 
-        print(f"[Part {part_number}] received {len(reply)} chars")
+        print(f"[Part {part_number}] received {len(reply)} chars in {stats.get('latency', 0):.1f}s"
+              + (f" (first token after {stats['time_to_first_token']:.1f}s)"
+                 if 'time_to_first_token' in stats else ""))
+        record_call(metrics, 'second_pass', stats, part=part_number)
 
         # Append to markdown
         with md_path.open('a', encoding='utf-8') as md_file:
@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+from typing import Optional
+
+import boto3
+from botocore.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Defaults for every client built here; override with the environment.
+# The pool must be at least as large as the number of parts dispatched at once
+# (botocore's own default is 10), and the read timeout must cover a full
+# non-streamed generation of MAX_TOKENS.
+DEFAULT_MAX_POOL_CONNECTIONS = int(os.environ.get("BEDROCK_MAX_POOL_CONNECTIONS", 50))
+DEFAULT_CONNECT_TIMEOUT = float(os.environ.get("BEDROCK_CONNECT_TIMEOUT", 10))
+DEFAULT_READ_TIMEOUT = float(os.environ.get("BEDROCK_READ_TIMEOUT", 300))
+DEFAULT_RETRY_MODE = os.environ.get("BEDROCK_RETRY_MODE", "adaptive")
+# Botocore attempts for calls nothing else retries (S3 and the control plane in
+# batch_inference); model calls retry in LLM_APIs.retry and ask for a single
+# attempt (streaming.RUNTIME_MAX_ATTEMPTS) so the two don't multiply
+DEFAULT_MAX_ATTEMPTS = int(os.environ.get("BEDROCK_MAX_ATTEMPTS", 2))
+
+# Cache clients by (service, region, settings); boto3 clients are thread-safe
+# once built, but building them from the default session is not
+_clients = {}
+_lock = threading.Lock()
+
+
+def client_config(
+    max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    read_timeout: float = DEFAULT_READ_TIMEOUT,
+    retry_mode: str = DEFAULT_RETRY_MODE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+) -> Config:
+    return Config(
+        max_pool_connections=max_pool_connections,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        tcp_keepalive=True,
+        retries={"mode": retry_mode, "total_max_attempts": max_attempts},
+    )
+
+
+def get_bedrock_client(
+    region_name: str = "us-east-1",
+    service_name: str = "bedrock-runtime",
+    max_pool_connections: Optional[int] = None,
+    connect_timeout: Optional[float] = None,
+    read_timeout: Optional[float] = None,
+    retry_mode: Optional[str] = None,
+    max_attempts: Optional[int] = None
+):
+    """
+    Return a shared boto3 client for `service_name` in `region_name`, built
+    once per distinct set of settings. Unset settings use the module defaults.
+    Used by every model adapter in LLM_APIs; safe to call from threads.
+    """
+    settings = (
+        max_pool_connections or DEFAULT_MAX_POOL_CONNECTIONS,
+        connect_timeout or DEFAULT_CONNECT_TIMEOUT,
+        read_timeout or DEFAULT_READ_TIMEOUT,
+        retry_mode or DEFAULT_RETRY_MODE,
+        max_attempts or DEFAULT_MAX_ATTEMPTS,
+    )
+    key = (service_name, region_name) + settings
+    with _lock:
+        if key not in _clients:
+            logger.info(
+                f"Creating {service_name} client in {region_name} "
+                f"(pool={settings[0]}, connect={settings[1]}s, read={settings[2]}s, "
+                f"retries={settings[3]}x{settings[4]})"
+            )
+            _clients[key] = boto3.session.Session().client(
+                service_name=service_name,
+                region_name=region_name,
+                config=client_config(*settings),
+            )
+        return _clients[key]
@@ -1,58 +1,107 @@
-import json
-import logging
-import boto3
+from LLM_APIs.streaming import call_bedrock_model, stream_bedrock_model
+from LLM_APIs.usage import merge_usage
 
-logger = logging.getLogger(__name__)
-
-# Cache clients by region to avoid re-creating them repeatedly
-_clients = {}
-
-def get_bedrock_client(region_name: str = "ap-southeast-1"):
-    if region_name not in _clients:
-        _clients[region_name] = boto3.client(
-            service_name="bedrock-runtime",
-            region_name=region_name
-        )
-    return _clients[region_name]    
-
-def call_bedrock(
-    model_id: str,
+def build_request_body(
     conversation_text: str,
-    temperature: float = 0.7,
-    max_tokens: int = 512,
-    region_name: str = "ap-southeast-1"
-):
-    body = {
+    temperature: float,
+    max_tokens: int,
+    cached_prefix: str = None
+) -> dict:
+    """
+    Anthropic Messages request body for Bedrock. A `cached_prefix` is sent
+    as a separate leading text block marked with cache_control, so Bedrock
+    can reuse its processed form across calls that share it.
+    """
+    content = [{"type": "text", "text": conversation_text}]
+    if cached_prefix:
+        content.insert(0, {
+            "type": "text",
+            "text": cached_prefix,
+            "cache_control": {"type": "ephemeral"},
+        })
+    return {
         "anthropic_version": "bedrock-2023-05-31",
         "max_tokens": max_tokens,
         "temperature": temperature,
         "messages": [
             {
                 "role": "user",
-                "content": [{"type": "text", "text": conversation_text}],
+                "content": content,
             }
-        ]   
+        ]
     }
 
-    try:
-        bedrock_runtime = get_bedrock_client(region_name)
-        ### non-streaming, change to invoke_model_with_response_stream if streaming desired
-        response = bedrock_runtime.invoke_model(
-            modelId=model_id,
-            body=json.dumps(body)
-        )
-        response_body = json.loads(response['body'].read())
-        reply = response_body['content'][0]['text'].strip()
-        yield reply
-    except Exception as e:
-        logger.exception(f"Error calling Bedrock API: {e}")
-        yield f"Error: {e}"
+def read_chunk(chunk: dict, usage: dict = None):
+    """Text delta of a streamed Messages event, if any; usage events go into `usage`."""
+    kind = chunk.get("type")
+    if kind == "content_block_delta":
+        return chunk.get("delta", {}).get("text")
+    if kind == "message_start":
+        merge_usage(usage, chunk.get("message", {}).get("usage", {}))
+    elif kind == "message_delta":
+        merge_usage(usage, chunk.get("usage", {}))
+    return None
+
+def read_reply(response: dict, response_body: dict, usage: dict = None) -> str:
+    """Text of a Messages response; its token usage goes into `usage`."""
+    merge_usage(usage, response_body.get('usage', {}))
+    return response_body['content'][0]['text'].strip()
+
+def stream_bedrock(
+    model_id: str,
+    conversation_text: str,
+    temperature: float = 0.7,
+    max_tokens: int = 512,
+    region_name: str = "ap-southeast-1",
+    concurrency=None,
+    cached_prefix: str = None,
+    stats: dict = None
+):
+    """
+    Yield incremental text deltas of a Claude reply streamed from Bedrock;
+    retries, restarts and stats are as in LLM_APIs.streaming.stream_bedrock_model.
+    """
+    body = build_request_body(conversation_text, temperature, max_tokens, cached_prefix)
+    yield from stream_bedrock_model(model_id, body, read_chunk, region_name, concurrency, stats)
+
+def call_bedrock(
+    model_id: str,
+    conversation_text: str,
+    temperature: float = 0.7,
+    max_tokens: int = 512,
+    region_name: str = "ap-southeast-1",
+    raise_errors: bool = False,
+    concurrency=None,
+    stream: bool = False,
+    stats: dict = None,
+    use_cache: bool = False,
+    cached_prefix: str = None
+):
+    """
+    Send `conversation_text` (after `cached_prefix`, if given) to a Claude
+    model on Bedrock and yield the reply. Streaming, stats, caching, retry
+    and error handling are as in LLM_APIs.streaming.call_bedrock_model.
+    """
+    body = build_request_body(conversation_text, temperature, max_tokens, cached_prefix)
+    yield from call_bedrock_model(
+        model_id, body, read_reply, read_chunk,
+        prompt=(cached_prefix or "") + conversation_text,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        region_name=region_name,
+        raise_errors=raise_errors,
+        concurrency=concurrency,
+        stream=stream,
+        stats=stats,
+        use_cache=use_cache,
+    )
 
 
 ## for debugging & sanity check
 if __name__ == "__main__":
     for reply in call_bedrock(
         model_id="apac.anthropic.claude-sonnet-4-20250514-v1:0",  # example Bedrock model
-        conversation_text="Hello from Bedrock!"
+        conversation_text="Hello from Bedrock!",
+        stream=True
     ):
-        print("Reply:", reply)
\ No newline at end of file
+        print("Reply:", reply)
@@ -1,29 +1,14 @@
-import json
 import logging
-import boto3
+
+from LLM_APIs.streaming import call_bedrock_model, stream_bedrock_model
+from LLM_APIs.usage import merge_header_usage, merge_stream_usage, merge_usage
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Cache clients by region to avoid re-creating them repeatedly
-_clients = {}
-
-def get_bedrock_client(region_name: str = "us-east-1"):
-    if region_name not in _clients:
-        _clients[region_name] = boto3.client(
-            service_name="bedrock-runtime",
-            region_name=region_name
-        )
-    return _clients[region_name]    
-
 
-def call_bedrock(
-    model_id: str,
-    conversation_text: str,
-    temperature: float = 0.6,
-    max_tokens: int = 512,
-    region_name: str = "us-east-1"
-):  
+def build_request_body(conversation_text: str, temperature: float, max_tokens: int) -> dict:
+    """DeepSeek native request body for Bedrock."""
     # Split conversation_text by lines and map "User:" / "Bot:" prefixes
     formatted = "<|begin_of_sentence|>"
     for line in conversation_text.splitlines():
@@ -42,35 +27,78 @@ def call_bedrock(
     formatted += "<|Assistant|><think>\n"
 
     # Prepare DeepSeek request
-    native_request = {
+    return {
         "prompt": formatted,
         "max_tokens": max_tokens,
         "temperature": temperature,
     }
 
-    # logger.info("Formatted prompt:\n%s", formatted)
-    # logger.info("JSON request:\n%s", json.dumps(native_request, indent=2))
 
-    try:
-        bedrock_runtime = get_bedrock_client(region_name)
-        response = bedrock_runtime.invoke_model(
-            modelId=model_id,
-            body=json.dumps(native_request)
-        )
+def read_chunk(chunk: dict, usage: dict = None):
+    """Text delta of a streamed DeepSeek chunk, if any; token counts go into `usage`."""
+    merge_usage(usage, chunk)
+    merge_stream_usage(usage, chunk)
+    choices = chunk.get("choices") or [{}]
+    return choices[0].get("text")
 
-        model_response = json.loads(response['body'].read())
-        choices = model_response.get("choices", [])
 
-        if not choices:
-            yield "Error: No response choices returned from model"
-            return
+def read_reply(response: dict, model_response: dict, usage: dict = None) -> str:
+    """Text of a DeepSeek response; token counts (headers and body) go into `usage`."""
+    merge_header_usage(usage, response)
+    merge_usage(usage, model_response)
+    choices = model_response.get("choices", [])
+    if not choices:
+        raise RuntimeError("No response choices returned from model")
+    return choices[0].get("text", "").strip()
 
-        generation = choices[0].get("text", "").strip()
-        yield generation
 
-    except Exception as e:
-        logger.exception(f"Error calling Bedrock API: {e}")
-        yield f"Error: {e}"
+def stream_bedrock(
+    model_id: str,
+    conversation_text: str,
+    temperature: float = 0.6,
+    max_tokens: int = 512,
+    region_name: str = "us-east-1",
+    concurrency=None,
+    stats: dict = None
+):
+    """
+    Yield incremental text deltas of a DeepSeek reply streamed from Bedrock;
+    retries, restarts and stats are as in LLM_APIs.streaming.stream_bedrock_model.
+    """
+    native_request = build_request_body(conversation_text, temperature, max_tokens)
+    yield from stream_bedrock_model(model_id, native_request, read_chunk, region_name, concurrency, stats)
+
+
+def call_bedrock(
+    model_id: str,
+    conversation_text: str,
+    temperature: float = 0.6,
+    max_tokens: int = 512,
+    region_name: str = "us-east-1",
+    raise_errors: bool = False,
+    concurrency=None,
+    stream: bool = False,
+    stats: dict = None,
+    use_cache: bool = False
+):
+    """
+    Send `conversation_text` to a DeepSeek model on Bedrock and yield the reply.
+    Streaming, stats, caching, retry and error handling are as in
+    LLM_APIs.streaming.call_bedrock_model.
+    """
+    native_request = build_request_body(conversation_text, temperature, max_tokens)
+    yield from call_bedrock_model(
+        model_id, native_request, read_reply, read_chunk,
+        prompt=conversation_text,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        region_name=region_name,
+        raise_errors=raise_errors,
+        concurrency=concurrency,
+        stream=stream,
+        stats=stats,
+        use_cache=use_cache,
+    )
 
 
 ## for debugging & sanity check
@@ -2,9 +2,27 @@ import requests
 import json
 import logging
 
+from LLM_APIs.response_cache import cache_key, get_response_cache
+from LLM_APIs.usage import merge_usage
+
 logger = logging.getLogger(__name__)
 
-def call_local_llm(model_name, conversation_text, temperature=0.7, max_tokens=512):
+def call_local_llm(model_name, conversation_text, temperature=0.7, max_tokens=512, use_cache=False, stats=None):
+    # Ollama reports prompt/eval token counts on its final line; they are
+    # recorded in stats["usage"] like the Bedrock adapters do
+    usage = stats.setdefault("usage", {}) if stats is not None else None
+    cache = get_response_cache(use_cache)
+    key = cache_key(model_name, conversation_text, temperature, max_tokens)
+    if cache is not None:
+        entry = cache.lookup(key)
+        if entry is not None:
+            cached, cached_usage = entry
+            if stats is not None:
+                stats["cache_hit"] = True
+                merge_usage(usage, cached_usage)
+            yield cached
+            return
+
     payload = {
         "model": model_name,
         "prompt": conversation_text,
@@ -23,11 +41,15 @@ def call_local_llm(model_name, conversation_text, temperature=0.7, max_tokens=51
                 if line:
                     try:
                         data = json.loads(line.decode("utf-8"))
+                        if data.get("done"):
+                            merge_usage(usage, data)
                         if "response" in data:
                             reply += data["response"]
                             yield reply  # stream partial responses
                     except json.JSONDecodeError:
                         continue
+        if cache is not None and reply:
+            cache.put(key, reply, model_name, usage)
     except Exception as e:
         logger.exception(f"Error calling local Ollama API: {e}")
         yield f"Error: {e}"
@@ -0,0 +1,72 @@
+import threading
+import time
+from typing import Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap input-token estimate (~4 characters per token) for rate limiting."""
+    return len(text) // 4 + 1
+
+
+class TokenBucketLimiter:
+    """
+    Thread-safe requests-per-minute / tokens-per-minute limiter.
+
+    Each limit is a bucket holding up to one minute of budget that refills
+    continuously. `acquire` blocks until both buckets can cover the request,
+    so callers dispatching from a thread pool are paced to the configured
+    quota instead of sleeping a fixed time between calls.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None
+    ):
+        """
+        Args:
+            requests_per_minute: Request quota (None = unlimited)
+            tokens_per_minute: Input-token quota (None = unlimited)
+        """
+        self._lock = threading.Lock()
+        self._limits = {
+            "requests": requests_per_minute,
+            "tokens": tokens_per_minute,
+        }
+        # Buckets start full so the first calls go out immediately
+        self._levels = {k: v for k, v in self._limits.items() if v}
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        for name, level in self._levels.items():
+            limit = self._limits[name]
+            self._levels[name] = min(limit, level + elapsed * limit / 60.0)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        Block until one request using `tokens` input tokens fits the quota.
+
+        Requests larger than the per-minute token quota are clamped to it, so
+        they wait for a full bucket instead of blocking forever.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                need = {"requests": 1.0, "tokens": float(tokens)}
+                wait = 0.0
+                for name, level in self._levels.items():
+                    amount = min(need[name], self._limits[name])
+                    if level < amount:
+                        wait = max(wait, (amount - level) * 60.0 / self._limits[name])
+                if wait <= 0:
+                    for name in self._levels:
+                        self._levels[name] -= min(need[name], self._limits[name])
+                    return now - started
+            time.sleep(wait)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Location and size of the shared cache; override with the environment
+DEFAULT_CACHE_PATH = Path(os.environ.get("LLM_CACHE_PATH", ".cache/llm_responses.sqlite"))
+DEFAULT_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 1 << 30))
+
+# Set to 1/true/yes to skip the cache entirely (no reads, no writes)
+BYPASS_ENV = "LLM_CACHE_BYPASS"
+
+# Bump when the key layout changes so stale entries are never hit
+KEY_VERSION = 1
+
+
+def cache_key(model_id: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    """SHA-256 over everything that determines a reply."""
+    material = json.dumps(
+        [KEY_VERSION, model_id, prompt, float(temperature), int(max_tokens)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def cache_bypassed() -> bool:
+    return os.environ.get(BYPASS_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+class ResponseCache:
+    """
+    Persistent LLM reply cache in a single SQLite file, keyed by cache_key().
+
+    Each reply is stored with the token usage the provider reported for it,
+    so replayed calls can still be accounted for. When the stored replies
+    exceed `max_bytes`, the least recently read or written entries are
+    evicted. Safe to share between threads; separate
+    processes serialize on SQLite's file lock.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                       key TEXT PRIMARY KEY,
+                       model_id TEXT,
+                       response TEXT NOT NULL,
+                       size INTEGER NOT NULL,
+                       created REAL NOT NULL,
+                       last_access REAL NOT NULL,
+                       usage TEXT
+                   )"""
+            )
+            # Caches created before usage was stored
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+            if "usage" not in columns:
+                self._conn.execute("ALTER TABLE responses ADD COLUMN usage TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.lookup(key)
+        return entry[0] if entry is not None else None
+
+    def lookup(self, key: str) -> Optional[Tuple[str, Optional[Dict[str, int]]]]:
+        """(reply, usage) stored under `key`; usage is None if it wasn't recorded."""
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, usage FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+        return row[0], json.loads(row[1]) if row[1] else None
+
+    def put(
+        self,
+        key: str,
+        response: str,
+        model_id: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> None:
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO responses
+                       (key, model_id, response, size, created, last_access, usage)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (key, model_id, response, size, now, now, json.dumps(usage) if usage else None),
+            )
+            self._evict()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_access"
+        ):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
+        logger.info(f"Evicted {len(evicted)} cached LLM responses")
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache(use_cache: bool = True) -> Optional[ResponseCache]:
+    """
+    Return the process-wide cache, or None if `use_cache` is False, the
+    LLM_CACHE_BYPASS environment variable is set, or the cache can't be opened.
+    """
+    global _default_cache
+    if not use_cache or cache_bypassed():
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = ResponseCache()
+            except sqlite3.Error as e:
+                logger.warning(f"LLM response cache unavailable ({e}); continuing without it")
+                return None
+        return _default_cache
@@ -0,0 +1,225 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, Optional, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Bedrock error codes that signal "slow down"; the lower-case ones are the
+# exception events of a response stream, raised mid-stream as EventStreamError
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "throttlingException",
+}
+
+# Transient service-side errors worth retrying; anything else is fatal
+RETRYABLE_ERROR_CODES = THROTTLING_ERROR_CODES | {
+    "ServiceUnavailableException",
+    "ServiceUnavailable",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "serviceUnavailableException",
+    "internalServerException",
+    "modelStreamErrorException",
+    "modelTimeoutException",
+}
+
+# Yielded by stream_with_retry when an attempt fails after items were already
+# yielded: what came before it belongs to the failed attempt and must be dropped
+STREAM_RESTART = object()
+
+
+def error_code(exc: BaseException) -> Optional[str]:
+    """Return the AWS error code of a botocore ClientError, if any."""
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def is_throttle(exc: BaseException) -> bool:
+    return error_code(exc) in THROTTLING_ERROR_CODES
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """True for throttling, transient service errors and connection drops."""
+    if error_code(exc) in RETRYABLE_ERROR_CODES:
+        return True
+    try:
+        from botocore import exceptions
+    except ImportError:
+        return False
+    return isinstance(
+        exc,
+        (exceptions.ConnectionClosedError, exceptions.ConnectTimeoutError,
+         exceptions.EndpointConnectionError, exceptions.ReadTimeoutError,
+         # A connection dropped while reading a response stream (botocore >= 1.29)
+         getattr(exceptions, "ResponseStreamingError", exceptions.ConnectionClosedError))
+    )
+
+
+class AIMDConcurrency:
+    """
+    Adaptive cap on in-flight requests (additive increase, multiplicative
+    decrease). Every success grows the cap by `increase / cap` (about +1 per
+    full window of successes); a throttle multiplies it by `decrease`, at
+    most once per `cooldown` seconds so one burst of throttles from the same
+    window only counts once.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: Optional[int] = None,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        cooldown: float = 2.0
+    ):
+        self.minimum = minimum
+        self.maximum = maximum if maximum is not None else initial
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.limit = float(max(minimum, min(initial, self.maximum)))
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        with self._cond:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+
+    def on_throttle(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            logger.info(f"Throttled; concurrency limit lowered to {int(self.limit)}")
+
+
+def _acquire(concurrency: Optional[AIMDConcurrency], stats: Optional[Dict]) -> None:
+    if concurrency:
+        waited = time.monotonic()
+        concurrency.acquire()
+        if stats is not None:
+            stats["queue_wait"] = stats.get("queue_wait", 0.0) + time.monotonic() - waited
+
+
+def _on_failure(
+    e: Exception,
+    attempt: int,
+    max_attempts: int,
+    base_delay: float,
+    max_delay: float,
+    concurrency: Optional[AIMDConcurrency],
+    stats: Optional[Dict]
+) -> float:
+    """Report a failed attempt (its slot already released); return the backoff delay or re-raise."""
+    if concurrency and is_throttle(e):
+        concurrency.on_throttle()
+    if attempt == max_attempts or not is_retryable(e):
+        raise e
+    delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+    logger.warning(
+        f"Bedrock call failed ({error_code(e) or type(e).__name__}), "
+        f"attempt {attempt}/{max_attempts}; retrying in {delay:.1f}s"
+    )
+    if stats is not None:
+        stats["retries"] = stats.get("retries", 0) + 1
+    return delay
+
+
+def call_with_retry(
+    fn: Callable[[], T],
+    max_attempts: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    concurrency: Optional[AIMDConcurrency] = None,
+    stats: Optional[Dict] = None
+) -> T:
+    """
+    Call `fn`, retrying throttling/transient errors with full-jitter
+    exponential backoff (sleep uniform(0, min(max_delay, base_delay * 2**n))).
+    Fatal errors and the last failed attempt are re-raised.
+
+    If `concurrency` is given, each attempt holds one of its slots and
+    reports success/throttling back to it.
+
+    If a `stats` dict is given, the number of retries and the seconds spent
+    waiting for a concurrency slot ("queue_wait") are added to it.
+    """
+    for attempt in range(1, max_attempts + 1):
+        _acquire(concurrency, stats)
+        try:
+            result = fn()
+        except Exception as e:
+            if concurrency:
+                concurrency.release()
+            time.sleep(_on_failure(e, attempt, max_attempts, base_delay, max_delay, concurrency, stats))
+        else:
+            if concurrency:
+                concurrency.release()
+                concurrency.on_success()
+            return result
+
+
+def stream_with_retry(
+    open_stream: Callable[[], Iterable[T]],
+    max_attempts: int = 6,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    concurrency: Optional[AIMDConcurrency] = None,
+    stats: Optional[Dict] = None
+) -> Iterator[Union[T, object]]:
+    """
+    Yield the items of `open_stream()`, retried like call_with_retry. An
+    attempt lasts until the stream is drained: it holds its concurrency slot
+    until then, and an error raised while reading (a mid-stream throttle, a
+    dropped connection) fails the attempt like one raised when opening it.
+
+    If a failed attempt had already yielded items, STREAM_RESTART is yielded
+    before the next attempt's items.
+    """
+    for attempt in range(1, max_attempts + 1):
+        _acquire(concurrency, stats)
+        yielded = False
+        try:
+            try:
+                for item in open_stream():
+                    yielded = True
+                    yield item
+            finally:
+                # Also when the consumer stops early
+                if concurrency:
+                    concurrency.release()
+        except Exception as e:
+            delay = _on_failure(e, attempt, max_attempts, base_delay, max_delay, concurrency, stats)
+            if yielded:
+                yield STREAM_RESTART
+            time.sleep(delay)
+        else:
+            if concurrency:
+                concurrency.on_success()
+            return
@@ -0,0 +1,202 @@
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from LLM_APIs.bedrock_client import get_bedrock_client  # shared, pooled clients
+from LLM_APIs.response_cache import cache_key, get_response_cache
+from LLM_APIs.retry import STREAM_RESTART, call_with_retry, stream_with_retry
+from LLM_APIs.usage import merge_usage
+
+logger = logging.getLogger(__name__)
+
+
+def iter_stream_chunks(
+    response: Dict[str, Any],
+    stats: Optional[Dict[str, Any]] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Decode the JSON payload of each chunk of an invoke_model_with_response_stream
+    response, adding the payload sizes to stats["bytes_out"] if `stats` is given.
+    """
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if chunk:
+            if stats is not None:
+                stats["bytes_out"] = stats.get("bytes_out", 0) + len(chunk["bytes"])
+            yield json.loads(chunk["bytes"])
+
+
+def accumulate(
+    deltas: Iterable[str],
+    stats: Optional[Dict[str, Any]] = None,
+    started: Optional[float] = None
+) -> Iterator[str]:
+    """
+    Turn a stream of text deltas into the growing reply, the same way
+    call_local_llm yields partial responses, so callers that keep the last
+    value get the full reply.
+
+    If `stats` is given, "time_to_first_token" and "latency" (seconds since
+    `started`, default: now) are recorded in it.
+
+    A STREAM_RESTART in `deltas` (see LLM_APIs.retry.stream_with_retry)
+    discards the text so far: "" is yielded and the reply starts over.
+    """
+    started = time.monotonic() if started is None else started
+    reply = ""
+    first = True
+    for delta in deltas:
+        if delta is STREAM_RESTART:
+            reply = ""
+            yield reply
+            continue
+        if first and stats is not None:
+            stats["time_to_first_token"] = time.monotonic() - started
+            logger.info(f"First token after {stats['time_to_first_token']:.2f}s")
+        first = False
+        reply += delta
+        yield reply
+    if stats is not None:
+        stats["latency"] = time.monotonic() - started
+    if reply != reply.strip():
+        yield reply.strip()
+
+
+# Botocore attempts per call: call_with_retry/stream_with_retry already retry
+# with backoff, and botocore retries inside each attempt would multiply them
+RUNTIME_MAX_ATTEMPTS = 1
+
+# read_chunk(chunk, usage) -> text delta or None, merging any usage into `usage`
+ChunkReader = Callable[[Dict[str, Any], Optional[Dict[str, int]]], Optional[str]]
+# read_reply(response, body, usage) -> reply text; raises if there is none
+ReplyReader = Callable[[Dict[str, Any], Dict[str, Any], Optional[Dict[str, int]]], str]
+
+
+def stream_bedrock_model(
+    model_id: str,
+    body: Dict[str, Any],
+    read_chunk: ChunkReader,
+    region_name: str,
+    concurrency=None,
+    stats: Optional[Dict[str, Any]] = None
+) -> Iterator[Any]:
+    """
+    Yield incremental text deltas from invoke_model_with_response_stream,
+    read from each decoded chunk by the model adapter's `read_chunk`.
+    Each attempt holds its concurrency slot until the stream is drained, and
+    throttling or errors mid-stream are retried like call_bedrock_model; if
+    an attempt fails after yielding deltas, STREAM_RESTART is yielded before
+    the retry's deltas. Errors that remain are raised.
+    Token usage, retries, queue wait and request/response sizes are
+    recorded in `stats` if given.
+    """
+    payload = json.dumps(body)
+    usage = stats.setdefault("usage", {}) if stats is not None else None
+    if stats is not None:
+        stats["bytes_in"] = len(payload.encode("utf-8"))
+    bedrock_runtime = get_bedrock_client(region_name, max_attempts=RUNTIME_MAX_ATTEMPTS)
+
+    def open_stream():
+        response = bedrock_runtime.invoke_model_with_response_stream(
+            modelId=model_id, body=payload
+        )
+        return iter_stream_chunks(response, stats)
+
+    for chunk in stream_with_retry(open_stream, concurrency=concurrency, stats=stats):
+        if chunk is STREAM_RESTART:
+            yield chunk
+            continue
+        text = read_chunk(chunk, usage)
+        if text:
+            yield text
+
+
+def call_bedrock_model(
+    model_id: str,
+    body: Dict[str, Any],
+    read_reply: ReplyReader,
+    read_chunk: ChunkReader,
+    prompt: str,
+    temperature: float,
+    max_tokens: int,
+    region_name: str,
+    raise_errors: bool = False,
+    concurrency=None,
+    stream: bool = False,
+    stats: Optional[Dict[str, Any]] = None,
+    use_cache: bool = False
+) -> Iterator[str]:
+    """
+    Send the request `body` to a model on Bedrock and yield the reply; the
+    model adapters (llm_bedrock*.call_bedrock) supply the body and the
+    readers that take text and token usage out of its responses.
+
+    With `stream=True` the reply is streamed (see stream_bedrock_model) and
+    the growing text is yielded as deltas arrive; otherwise the single final
+    reply is yielded. Either way the last value yielded is the full reply.
+    If a `stats` dict is passed, time_to_first_token (streaming only),
+    latency and queue_wait in seconds, retries, bytes_in and bytes_out are
+    recorded in it.
+
+    With `use_cache=True` successful replies are stored in the on-disk
+    response cache (LLM_APIs.response_cache) keyed by model, `prompt`,
+    temperature and max_tokens, with the token usage Bedrock reported; a
+    cached reply is yielded without calling Bedrock, sets stats["cache_hit"]
+    and puts its stored usage in stats["usage"]. It is off by default so sampled
+    (chat) replies are not replayed; the analysis pipeline turns it on, and
+    LLM_CACHE_BYPASS=1 turns it off everywhere.
+
+    Throttling and transient errors are retried with backoff (LLM_APIs.retry);
+    `concurrency` (an AIMDConcurrency) is told about throttles and successes.
+    Errors that remain are yielded as "Error: ..." text, or re-raised if
+    `raise_errors` is set so pipelines never mistake them for a reply.
+    """
+    started = time.monotonic()
+    try:
+        cache = get_response_cache(use_cache)
+        key = cache_key(model_id, prompt, temperature, max_tokens)
+        usage = stats.setdefault("usage", {}) if stats is not None else None
+        if cache is not None:
+            entry = cache.lookup(key)
+            if entry is not None:
+                reply, cached_usage = entry
+                if stats is not None:
+                    stats["cache_hit"] = True
+                    merge_usage(usage, cached_usage)
+                yield reply
+                return
+
+        if stream:
+            reply = ""
+            for reply in accumulate(
+                stream_bedrock_model(model_id, body, read_chunk, region_name, concurrency, stats),
+                stats=stats,
+                started=started,
+            ):
+                yield reply
+            if cache is not None and reply:
+                cache.put(key, reply, model_id, usage)
+            return
+
+        payload = json.dumps(body)
+        bedrock_runtime = get_bedrock_client(region_name, max_attempts=RUNTIME_MAX_ATTEMPTS)
+
+        def invoke():
+            response = bedrock_runtime.invoke_model(modelId=model_id, body=payload)
+            return response, response["body"].read()
+
+        response, raw = call_with_retry(invoke, concurrency=concurrency, stats=stats)
+        if stats is not None:
+            stats["bytes_in"], stats["bytes_out"] = len(payload.encode("utf-8")), len(raw)
+        reply = read_reply(response, json.loads(raw), usage)
+        if stats is not None:
+            stats["latency"] = time.monotonic() - started
+        yield reply
+        if cache is not None and reply:
+            cache.put(key, reply, model_id, usage)
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.exception(f"Error calling Bedrock API: {e}")
+        yield f"Error: {e}"
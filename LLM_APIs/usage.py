@@ -0,0 +1,57 @@
+from typing import Any, Dict, Optional
+
+# Normalized token-usage keys recorded in stats["usage"] by every adapter
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+# Provider-specific names for the same counts
+_ALIASES = {
+    # Llama on Bedrock
+    "prompt_token_count": "input_tokens",
+    "generation_token_count": "output_tokens",
+    # amazon-bedrock-invocationMetrics of streamed responses
+    "inputTokenCount": "input_tokens",
+    "outputTokenCount": "output_tokens",
+    "cacheReadInputTokenCount": "cache_read_input_tokens",
+    "cacheWriteInputTokenCount": "cache_creation_input_tokens",
+    # Ollama
+    "prompt_eval_count": "input_tokens",
+    "eval_count": "output_tokens",
+}
+
+# Token counts Bedrock returns as HTTP headers on every InvokeModel response
+_HEADERS = {
+    "x-amzn-bedrock-input-token-count": "input_tokens",
+    "x-amzn-bedrock-output-token-count": "output_tokens",
+    "x-amzn-bedrock-cache-read-input-token-count": "cache_read_input_tokens",
+    "x-amzn-bedrock-cache-write-input-token-count": "cache_creation_input_tokens",
+}
+
+
+def merge_usage(usage: Optional[Dict[str, int]], reported: Optional[Dict[str, Any]]) -> None:
+    """Copy the token counts found in `reported` into `usage` under the normalized names."""
+    if usage is None or not reported:
+        return
+    for name, value in reported.items():
+        field = name if name in USAGE_FIELDS else _ALIASES.get(name)
+        if field and isinstance(value, int):
+            usage[field] = value
+
+
+def merge_header_usage(usage: Optional[Dict[str, int]], response: Dict[str, Any]) -> None:
+    """Copy the token-count headers of an InvokeModel response into `usage`."""
+    if usage is None:
+        return
+    headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    for header, field in _HEADERS.items():
+        if header in headers:
+            usage[field] = int(headers[header])
+
+
+def merge_stream_usage(usage: Optional[Dict[str, int]], chunk: Dict[str, Any]) -> None:
+    """Copy the invocation metrics Bedrock appends to the last chunk of a stream into `usage`."""
+    merge_usage(usage, chunk.get("amazon-bedrock-invocationMetrics"))
@@ -19,7 +19,8 @@ st.title("Windows Event Log Analyzer")
 event_type = st.selectbox(
     "Choose Event Type to Analyze:",
     #("Task Scheduler", "Basic Chat", "RDP Events", "Upload CSV")
-    ("Basic Chat", "Task Scheduler", "RDP Events", "Upload CSV")
+    ("Basic Chat", "Task Scheduler", "RDP Events", "Upload CSV"),
+    key="event_type"  # set by the Upload CSV page's "Send to analysis"
 )
 
 # BASIC CHAT SECTION
@@ -1,4 +1,5 @@
 import argparse
+import os
 import time
 import sys
 import logging
@@ -15,9 +16,14 @@ from Bedrock.call_LLM_1stpass import generate_timeline
 from Bedrock.call_LLM_2ndpass import generate_flagged_timeline
 from tools.appendprompts import append_prompts_to_md
 from tools.counttokens import count_input_tokens, count_output_tokens
-from tools.split_jsonToFit import split_json_by_tokens_and_time
+from tools.run_metrics import RunMetrics
+from tools.split_jsonToFit import iter_parts, split_json_by_tokens_and_time
 from tools.events_extractor import extract_events
-from tools.consolidatorJSON import consolidate
+from tools.event_index import index_is_current, offset_index_path
+from tools.event_store import EventStore, open_event_store
+from tools.consolidatorJSON import IncrementalConsolidator
+from tools.event_collapser import collapse_file
+from tools.template_miner import mine_file
 
 # ──────────────────────────────
 # Config & Constants
@@ -26,8 +32,20 @@ MODEL_ID = "apac.anthropic.claude-sonnet-4-20250514-v1:0"
 REGION = "ap-southeast-1"
 TOKENS_PER_FILE = 50_000
 TIME_GAP_SECONDS = 3600
+STREAM_SPLIT = True
+SPLIT_WORKERS = os.cpu_count() or 1
+PAYLOAD_FORMAT = "elide"
+REDUCE_EVENTS = "collapse"  # "collapse", "templates" or None
 MAX_TOKENS = 10_000
-SLEEP_BETWEEN_STAGES = 5
+MAX_WORKERS = 4
+REQUESTS_PER_MINUTE = 20
+TOKENS_PER_MINUTE = 200_000
+STREAM_RESPONSES = True
+EXPORT_PROMETHEUS = False
+OVERLAP_SPLIT = True  # start first-pass calls while later parts are still being split
+WRITE_PARTS = True  # keep ./requestsToLLM/<name>/part_NN.json (used by the token-count fallback)
+USE_EVENT_STORE = True  # ingest the log once into ./.cache/event_store; split and extract by query
+INDEX_LOGS = True  # without the store: LineNumber -> byte offset sidecar (<log>.lnidx) for extraction
 
 # ──────────────────────────────
 # Helpers
@@ -45,55 +63,178 @@ def setup_logging(run_dir: Path) -> None:
     )
 
 
-def split_logs(logs_file: Path) -> tuple[str, Path, int]:
-    """Split a large JSON log file into smaller parts."""
+def reduce_logs(run_dir: Path, logs_file: Path) -> Path:
+    """
+    Reduce repetitive events before the first pass, either by collapsing
+    exact signatures or by mining templates (see REDUCE_EVENTS). Group
+    members go to the reduced.groups.json sidecar, not to the LLM.
+    """
+    out_path = run_dir / "reduced.json"
+    if REDUCE_EVENTS == "templates":
+        logging.info("Mining event templates...")
+        mine_file(input_file=logs_file, output_file=out_path)
+    else:
+        logging.info("Collapsing repetitive events...")
+        collapse_file(input_file=logs_file, output_file=out_path)
+    return out_path
+
+
+def ingest_logs(logs_file: Path) -> EventStore:
+    """Open the event store of the logs file, ingesting it on first use."""
+    logging.info("Opening event store...")
+    store = open_event_store(logs_file)
+    logging.info(f"{len(store)} events in {store.path}")
+    return store
+
+
+def split_events(input_file: Path | None, store: EventStore | None):
+    """Events for the splitter from the store, when it holds the file being split."""
+    if store is None or input_file is not None:
+        return None
+    return store.iter_events()
+
+
+def split_index_file(logs_file: Path, input_file: Path | None = None) -> Path | None:
+    """
+    Where the splitter should write the offset index of `logs_file`: only
+    when it reads the original log (not a reduced one) and the index isn't
+    already current. Otherwise extraction builds or reuses it.
+    """
+    if USE_EVENT_STORE or not INDEX_LOGS or (input_file is not None and input_file != logs_file):
+        return None
+    index_file = offset_index_path(logs_file)
+    return None if index_is_current(logs_file, index_file) else index_file
+
+
+def split_logs(logs_file: Path, input_file: Path | None = None, store: EventStore | None = None) -> tuple[str, Path, int]:
+    """Split a large JSON log file (or its reduced form) into smaller parts."""
     logging.info("Splitting large JSON file...")
     json_name = logs_file.stem
     output_dir = Path("./requestsToLLM") / json_name
 
     num_parts = split_json_by_tokens_and_time(
-        input_file=logs_file,
+        input_file=input_file or logs_file,
         output_dir=output_dir,
         tokens_per_file=TOKENS_PER_FILE,
         time_gap_seconds=TIME_GAP_SECONDS,
+        stream=STREAM_SPLIT,
+        workers=SPLIT_WORKERS,
+        payload_format=PAYLOAD_FORMAT,
+        index_file=split_index_file(logs_file, input_file),
+        events=split_events(input_file, store),
     )
 
     logging.info(f"JSON split into {num_parts} parts.")
     return json_name, output_dir, num_parts
 
 
-def generate_first_pass(run_dir: Path, prompt_file: Path, num_parts: int, json_name: str, temperature: float):
-    """Run the first-pass timeline generation."""
+def iter_log_parts(logs_file: Path, input_file: Path | None = None, store: EventStore | None = None):
+    """
+    Return (json_name, parts): a lazy iterator of (part_number, events) for
+    generate_first_pass, split exactly like split_logs. Parts are also
+    written to ./requestsToLLM/<json_name>/ if WRITE_PARTS.
+    """
+    json_name = logs_file.stem
+    parts = iter_parts(
+        input_file=input_file or logs_file,
+        tokens_per_file=TOKENS_PER_FILE,
+        time_gap_seconds=TIME_GAP_SECONDS,
+        stream=STREAM_SPLIT,
+        workers=SPLIT_WORKERS,
+        payload_format=PAYLOAD_FORMAT,
+        output_dir=Path("./requestsToLLM") / json_name if WRITE_PARTS else None,
+        index_file=split_index_file(logs_file, input_file),
+        events=split_events(input_file, store),
+    )
+    return json_name, parts
+
+
+def generate_first_pass(
+    run_dir: Path,
+    prompt_file: Path,
+    num_parts: int | None,
+    json_name: str,
+    temperature: float,
+    metrics: RunMetrics = None,
+    parts=None,
+    on_reply=None,
+):
+    """
+    Run the first-pass timeline generation over the `num_parts` split files,
+    or over `parts` (see iter_log_parts) as they are produced. `on_reply`
+    receives each part's reply as soon as it completes.
+    """
     out_path = run_dir / f"{run_dir.name}-1.md"
-    generate_timeline(
+    failed_parts = {}
+    num_parts = generate_timeline(
         md_filepath=out_path,
         region=REGION,
         prompt_filepath=prompt_file,
         start_range=1,
-        end_range=num_parts + 1,
+        end_range=(num_parts or 0) + 1,
         log_name=json_name,
         model_id=MODEL_ID,
+        max_workers=MAX_WORKERS,
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        tokens_per_minute=TOKENS_PER_MINUTE,
         max_tokens=MAX_TOKENS,
         temperature=temperature,
+        payload_format=PAYLOAD_FORMAT,
+        stream=STREAM_RESPONSES,
+        metrics=metrics,
+        parts=parts,
+        failed_parts=failed_parts,
+        on_reply=on_reply,
     )
+    if failed_parts:
+        # The pipeline goes on with the parts that succeeded
+        failed = sorted(failed_parts)
+        logging.warning(f"First pass: {len(failed)} of {num_parts} parts failed: {failed}")
+        if metrics is not None:
+            metrics.info["failed_parts"] = failed
+        if len(failed) == num_parts:
+            raise RuntimeError(f"First pass failed for every part: {failed}")
+    logging.info(f"First pass done over {num_parts} parts.")
     return out_path
 
 
-def consolidate_outputs(run_dir: Path) -> Path:
-    """Consolidate LLM outputs into a single JSON."""
-    out_path = run_dir / "combined.json"
-    consolidate(input_dir=run_dir, output_file=out_path)
-    return out_path
+def start_consolidation(run_dir: Path) -> IncrementalConsolidator:
+    """
+    Create the consolidator that collects flagged records from first-pass
+    replies as they arrive (logged to combined.jsonl).
+    """
+    return IncrementalConsolidator(
+        output_file=run_dir / "combined.json",
+        source_file=run_dir / f"{run_dir.name}-1.md",
+    )
 
 
-def extract_flagged_events(run_dir: Path, combined_json: Path, logs_file: Path) -> Path:
-    """Extract flagged events into a detailed JSON."""
+def consolidate_outputs(consolidator: IncrementalConsolidator) -> Path:
+    """Write the records collected during the first pass into a single JSON."""
+    return consolidator.finalize()
+
+
+def extract_flagged_events(
+    run_dir: Path,
+    combined_json: Path,
+    logs_file: Path,
+    reduced_json: Path | None = None,
+    store: EventStore | None = None,
+) -> Path:
+    """Extract flagged events (expanding reduced groups) into a detailed JSON."""
     out_path = run_dir / "flagged_detailed.json"
-    extract_events(flagged_file=combined_json, og_json_path=logs_file, output_file=out_path)
+    extract_events(
+        flagged_file=combined_json,
+        og_json_path=logs_file,
+        output_file=out_path,
+        collapsed_file=reduced_json,
+        index_file=offset_index_path(logs_file) if INDEX_LOGS and store is None else None,
+        store=store,
+    )
     return out_path
 
 
-def generate_second_pass(run_dir: Path, prompt_file: Path, flagged_json: Path, temperature: float):
+def generate_second_pass(run_dir: Path, prompt_file: Path, flagged_json: Path, temperature: float, metrics: RunMetrics = None):
     """Run the second-pass flagged timeline generation."""
     out_path = run_dir / f"{run_dir.name}-2.md"
     generate_flagged_timeline(
@@ -106,11 +247,51 @@ def generate_second_pass(run_dir: Path, prompt_file: Path, flagged_json: Path, t
         max_tokens=MAX_TOKENS,
         delay_between_parts=0.0,
         model_id=MODEL_ID,
-        temperature=temperature
+        temperature=temperature,
+        payload_format=PAYLOAD_FORMAT,
+        stream=STREAM_RESPONSES,
+        metrics=metrics,
     )
     return out_path
 
 
+def count_run_tokens(
+    metrics: RunMetrics,
+    prompt1_file: Path,
+    prompt2_file: Path,
+    json_name: str,
+    run_dir: Path,
+):
+    """Return (input_tokens, output_tokens) for the run and note their source in metrics.info."""
+    if metrics is not None and metrics.has_usage():
+        input_tokens, output_tokens, source = metrics.input_tokens(), metrics.output_tokens(), "reported"
+    else:
+        # Fallback estimate: re-tokenize the prompts, parts and outputs
+        logging.info("Token usage not reported for every call; estimating from run files...")
+        output_tokens = count_output_tokens(run_dir.parent, run_dir.name)
+        input_tokens = count_input_tokens(
+            prompt1_file, prompt2_file, Path(f"./requestsToLLM/{json_name}/")
+        )
+        source = "estimated"
+    if metrics is not None:
+        metrics.info.update(token_source=source, input_tokens=input_tokens, output_tokens=output_tokens)
+        if source == "reported":
+            # Part of the totals above: replies replayed from the response cache
+            metrics.info.update(
+                replayed_input_tokens=input_tokens - metrics.input_tokens(replayed=False),
+                replayed_output_tokens=output_tokens - metrics.output_tokens(replayed=False),
+            )
+    return input_tokens, output_tokens
+
+
+def write_run_metrics(run_dir: Path, metrics: RunMetrics) -> None:
+    """Write metrics.json (and metrics.prom if EXPORT_PROMETHEUS) into the run dir."""
+    metrics.write(run_dir / "metrics.json", run_id=run_dir.name, model_id=MODEL_ID)
+    if EXPORT_PROMETHEUS:
+        metrics.write_prometheus(run_dir / "metrics.prom", run_id=run_dir.name)
+    logging.info(f"Stage timings (s): {metrics.stage_seconds}")
+
+
 def finalize_results(
     flagged_output_md: Path,
     first_output_md: Path,
@@ -119,12 +300,14 @@ def finalize_results(
     json_name: str,
     run_dir: Path,
     start_time: float,
+    metrics: RunMetrics = None,
 ) -> None:
-    """Perform token counting and append metadata to final output."""
-    output_tokens = count_output_tokens(run_dir.parent, run_dir.name)
-    input_tokens = count_input_tokens(
-        prompt1_file, prompt2_file, Path(f"./requestsToLLM/{json_name}/")
-    )
+    """
+    Count tokens and append metadata to final output. Token counts are the
+    ones the model reported; the files are only re-tokenized when some call
+    didn't report usage.
+    """
+    input_tokens, output_tokens = count_run_tokens(metrics, prompt1_file, prompt2_file, json_name, run_dir)
     end_time = time.time()
 
     append_prompts_to_md(
@@ -145,7 +328,7 @@ def finalize_results(
 def main(logs_file: Path, prompt1_file: Path, prompt2_file: Path, ts_temperature: float):
     """
     Analyze TS event logs:
-    1. Split large logs JSON
+    1. Reduce repetitive events and split large logs JSON
     2. Generate timeline (first pass)
     3. Consolidate outputs
     4. Extract flagged events
@@ -160,39 +343,68 @@ def main(logs_file: Path, prompt1_file: Path, prompt2_file: Path, ts_temperature
     logging.info(f"Run started: {run_id}")
 
     start_time = time.time()
-
-    # 1. Split logs
-    if not logs_file.exists():
-        logging.error(f"Logs file not found: {logs_file}")
-        sys.exit(1)
-    json_name, _, num_parts = split_logs(logs_file)
-
-    # 2. First pass
-    first_output_md = generate_first_pass(run_dir, prompt1_file, num_parts, json_name, ts_temperature)
-    time.sleep(SLEEP_BETWEEN_STAGES)
-
-    # 3. Consolidate
-    combined_json = consolidate_outputs(run_dir)
-    time.sleep(SLEEP_BETWEEN_STAGES)
-
-    # 4. Extract flagged
-    flagged_json = extract_flagged_events(run_dir, combined_json, logs_file)
-    time.sleep(SLEEP_BETWEEN_STAGES)
-
-    # 5. Second pass
-    flagged_output_md = generate_second_pass(run_dir, prompt2_file, flagged_json, ts_temperature)
-    time.sleep(SLEEP_BETWEEN_STAGES)
-
-    # 6. Finalize
-    finalize_results(
-        flagged_output_md,
-        first_output_md,
-        prompt1_file,
-        prompt2_file,
-        json_name,
-        run_dir,
-        start_time,
-    )
+    metrics = RunMetrics(events_path=run_dir / "metrics.jsonl")
+    try:
+        # 1. Split logs
+        if not logs_file.exists():
+            logging.error(f"Logs file not found: {logs_file}")
+            sys.exit(1)
+        store = None
+        if USE_EVENT_STORE:
+            with metrics.stage("ingest"):
+                store = ingest_logs(logs_file)
+        reduced_json = None
+        if REDUCE_EVENTS:
+            with metrics.stage("reduce"):
+                reduced_json = reduce_logs(run_dir, logs_file)
+        # Replies are consolidated as they arrive during the first pass
+        consolidator = start_consolidation(run_dir)
+        if OVERLAP_SPLIT:
+            # 1+2. Split and run the first pass concurrently
+            json_name, parts = iter_log_parts(logs_file, reduced_json, store)
+            with metrics.stage("split_and_first_pass"):
+                first_output_md = generate_first_pass(
+                    run_dir, prompt1_file, None, json_name, ts_temperature, metrics, parts,
+                    on_reply=consolidator.add_reply,
+                )
+        else:
+            with metrics.stage("split"):
+                json_name, _, num_parts = split_logs(logs_file, reduced_json, store)
+
+            # 2. First pass
+            with metrics.stage("first_pass"):
+                first_output_md = generate_first_pass(
+                    run_dir, prompt1_file, num_parts, json_name, ts_temperature, metrics,
+                    on_reply=consolidator.add_reply,
+                )
+
+        # 3. Consolidate
+        with metrics.stage("consolidate"):
+            combined_json = consolidate_outputs(consolidator)
+
+        # 4. Extract flagged
+        with metrics.stage("extract"):
+            flagged_json = extract_flagged_events(run_dir, combined_json, logs_file, reduced_json, store)
+
+        # 5. Second pass
+        with metrics.stage("second_pass"):
+            flagged_output_md = generate_second_pass(run_dir, prompt2_file, flagged_json, ts_temperature, metrics)
+
+        # 6. Finalize
+        with metrics.stage("finalize"):
+            finalize_results(
+                flagged_output_md,
+                first_output_md,
+                prompt1_file,
+                prompt2_file,
+                json_name,
+                run_dir,
+                start_time,
+                metrics,
+            )
+    finally:
+        # Also when a stage fails, so the calls made so far are kept
+        write_run_metrics(run_dir, metrics)
 
     logging.info(f"Analysis complete. Outputs saved in: {run_dir}")
 
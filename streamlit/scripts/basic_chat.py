@@ -96,11 +96,11 @@ def show_basic_chat_page():
         else:
             # Choose Bedrock model function dynamically
             if "claude" in model_name.lower():
-                generator = call_bedrock_claude(model_name, conversation_text, temperature, max_tokens, region_name)
+                generator = call_bedrock_claude(model_name, conversation_text, temperature, max_tokens, region_name, stream=True)
             elif "deepseek" in model_name.lower():
-                generator = call_bedrock_deepseek(model_name, conversation_text, temperature, max_tokens, region_name)
+                generator = call_bedrock_deepseek(model_name, conversation_text, temperature, max_tokens, region_name, stream=True)
             elif "llama" in model_name.lower():
-                generator = call_bedrock_llama(model_name, conversation_text, temperature, max_tokens, region_name)
+                generator = call_bedrock_llama(model_name, conversation_text, temperature, max_tokens, region_name, stream=True)
             else:
                 st.error("Unsupported Bedrock model. Please use a Claude, DeepSeek or Llama model.")
                 return
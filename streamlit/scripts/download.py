@@ -15,10 +15,20 @@ def save_uploaded(uploaded, filename):
     return None
 
 
+def sent_logs(event_type):
+    """Logs file sent from the Upload CSV page for this event type, if it still exists."""
+    logs_path = st.session_state.get("analysis_logs", {}).get(event_type)
+    if logs_path and os.path.isfile(logs_path):
+        st.info(f"Using {os.path.basename(logs_path)} extracted on the Upload CSV page "
+                "(upload a logs file to use that instead).")
+        return logs_path
+    return None
+
+
 def run_analysis_and_download(event_type, logs_file, prompt1_file, prompt2_file, param_value):
     """
     Shared pipeline to:
-      1. Save uploaded files
+      1. Save uploaded files (or use logs sent from the Upload CSV page)
       2. Run the analysis script for the given event type
       3. Provide download options for results
     """
@@ -26,6 +36,8 @@ def run_analysis_and_download(event_type, logs_file, prompt1_file, prompt2_file,
     # Save uploads with distinct names
     event_key = event_type.replace(' ', '_').lower()
     logs_path = save_uploaded(logs_file, f"{event_key}_logs")
+    if logs_path is None:
+        logs_path = sent_logs(event_type)
     prompt1_path = save_uploaded(prompt1_file, f"{event_key}_prompt1")
     prompt2_path = save_uploaded(prompt2_file, f"{event_key}_prompt2")
 
@@ -1,102 +1,77 @@
 import streamlit as st
 import pandas as pd
-import json
-from datetime import datetime, timedelta
-
-# =====================
-# Helper Functions
-# =====================
-
-# Helper functions
-def parse_time(ts):
-    if isinstance(ts, str):
-        ts = ts[:26]  # hotfix for python 3.10: keep up to microseconds
-        return datetime.fromisoformat(ts)
-    return ts
-
-def filter_RDP_events(data):
-    """Filter Remote Desktop Protocol (RDP) related events."""
-    rdp_event_ids = {
-        "21", "22", "23", "24", "25", "39", "40",
-        "1024", "1025", "1026", "1027", "1028", "1029", "1102", "1103"
-    }
-    
-    rdp_events = []
-    events_4648 = []
-    
-    # Loop through all events and categorize them
-    for event in data:
-        # Check if it's an RDP event
-        if ((event.get("Provider") == "Microsoft-Windows-Sysmon" 
-             and str(event.get("EventId")) == "3" 
-             and event.get("PayloadData2") == "RuleName: RDP")
-            or (event.get("Provider") in (
-                "Microsoft-Windows-TerminalServices-LocalSessionManager",
-                "Microsoft-Windows-TerminalServices-ClientActiveXCore"
-            ) and str(event.get("EventId")) in rdp_event_ids)):
-            rdp_events.append(event)
-        
-        # Check if it's a 4648 event
-        elif str(event.get("EventId")) == "4648":
-            events_4648.append(event)
-    
-    # Parse and cache times for RDP events
-    for event in rdp_events:
-        event["ParsedTime"] = parse_time(event.get("TimeCreated"))
-    
-    # Parse and cache times for 4648 events
-    for event in events_4648:
-        event["ParsedTime"] = parse_time(event.get("TimeCreated"))
-    
-    # Get RDP events with EventId 1029
-    rdp_events_1029 = [e for e in rdp_events if str(e.get("EventId")) == "1029"]
-    
-    # Find 4648 events within 10 seconds of 1029 events
-    time_window = timedelta(seconds=10)
-    relevant_4648_events = []
-    
-    for event_4648 in events_4648:
-        for rdp_event in rdp_events_1029:
-            if abs(event_4648["ParsedTime"] - rdp_event["ParsedTime"]) <= time_window:
-                relevant_4648_events.append(event_4648)
-                break
-    
-    # Merge all relevant events
-    all_events = rdp_events + relevant_4648_events
-    
-    # Sort by time
-    sorted_events = sorted(all_events, key=lambda e: e["ParsedTime"])
-    
-    # Remove ParsedTime before returning
-    for e in sorted_events:
-        e.pop("ParsedTime", None)
-    
-    return sorted_events
-
-def filter_Pwsh_events(data):
-    """Filter PowerShell (Pwsh) related events."""
-    filtered = [
-        e for e in data
-        if str(e.get("EventId")) in ("4103", "4104")
-    ]
-    return sorted(filtered, key=lambda e: e.get("TimeCreated"))
-
-def filter_task_scheduler_events(data):
-    """Filter Task Scheduler-related events."""
-    filtered = [
-        e for e in data
-        if e.get("Provider") == "Microsoft-Windows-TaskScheduler"
-    ]
-    return sorted(filtered, key=lambda e: e.get("TimeCreated"))
+import gzip
+import shutil
+import sys
+import tempfile
+import weakref
+from pathlib import Path
+
+# ──────────────────────────────
+# Project imports
+# ──────────────────────────────
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(PROJECT_ROOT))
+from tools.event_classifier import CATEGORIES
+from tools.csv_ingest import CSV_WORKERS, classify_csv
 
 # =====================
 # Streamlit Page
 # =====================
 
-@st.cache_data
-def load_csv(file):
-    df = pd.read_csv(file)
-    return df, df.to_dict(orient="records")
+# Extracted categories the analysis pipeline can take directly, by app event type
+ANALYSIS_EVENT_TYPES = {
+    "rdp": "RDP Events",
+    "task_scheduler": "Task Scheduler",
+}
+
+
+class SessionDir:
+    """Per-session temporary directory, removed on reset() or when the session's state is dropped."""
+
+    def __init__(self):
+        self.path = Path(tempfile.mkdtemp(prefix="upload-csv-"))
+        self._cleanup = weakref.finalize(self, shutil.rmtree, str(self.path), ignore_errors=True)
+
+    def reset(self):
+        """Remove every file in the directory."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+
+def preview_csv(file, rows=5):
+    """First rows of the upload, without parsing the rest of it."""
+    file.seek(0)
+    preview = pd.read_csv(file, nrows=rows)
+    file.seek(0)
+    return preview
+
+def gzip_file(path):
+    """Compress `path` to `path`.gz, streaming, and remove the original."""
+    gz_path = path.with_name(path.name + ".gz")
+    with open(path, "rb") as src, gzip.open(gz_path, "wb") as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+    path.unlink()
+    return gz_path
+
+def analysis_logs_path(path):
+    """A plain JSON file the analysis scripts can read: `path` itself, or its decompressed copy."""
+    path = Path(path)
+    if path.suffix != ".gz":
+        return path
+    plain = path.parent / "analysis" / path.stem
+    if not plain.exists():
+        plain.parent.mkdir(exist_ok=True)
+        with gzip.open(path, "rb") as src, open(plain, "wb") as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    return plain
+
+def send_to_analysis(name, path):
+    """Button callback: hand the extracted file to the analysis page of its event type."""
+    event_type = ANALYSIS_EVENT_TYPES[name]
+    st.session_state.analysis_logs[event_type] = str(analysis_logs_path(path))
+    # Runs before the app's event type selectbox is created, so it may be set
+    st.session_state.event_type = event_type
 
 def show_upload_csv_page():
     st.header("Upload CSV")
@@ -107,6 +82,10 @@ def show_upload_csv_page():
         st.session_state.extracted_files = {}
     if 'current_file' not in st.session_state:
         st.session_state.current_file = None
+    if 'extract_dir' not in st.session_state:
+        st.session_state.extract_dir = SessionDir()
+    if 'analysis_logs' not in st.session_state:
+        st.session_state.analysis_logs = {}
 
     uploaded_file = st.file_uploader("Upload CSV", type=["csv"])
 
@@ -116,54 +95,73 @@ def show_upload_csv_page():
             st.session_state.extracted_files = {}
             st.session_state.current_file = uploaded_file
 
-        # Read CSV with caching
-        df, records = load_csv(uploaded_file)
-
+        # Only the first rows are parsed here; extraction streams the rest
         st.write("Preview of uploaded CSV:")
-        st.dataframe(df.head())
+        st.dataframe(preview_csv(uploaded_file))
 
-        # Event type checkboxes
+        # Event type checkboxes, one per registered category
         st.subheader("Select event types to extract:")
-        extract_rdp = st.checkbox("RDP Events")
-        extract_pwsh = st.checkbox("PowerShell Events")
-        extract_tasks = st.checkbox("Task Scheduler Events")
+        selected = [
+            name for name, category in CATEGORIES.items()
+            if st.checkbox(f"{category.label} Events")
+        ]
+        compress = st.checkbox("Compress downloads (gzip)")
 
         # Extract button
         if st.button("Extract Events"):
             extracted_files = {}
 
-            if extract_rdp:
-                rdp_events = filter_RDP_events(records)
-                rdp_json = json.dumps(rdp_events, indent=2)
-                extracted_files["RDP_events.json"] = rdp_json
-                st.success(f"Extracted {len(rdp_events)} RDP events.")
-
-            if extract_pwsh:
-                pwsh_events = filter_Pwsh_events(records)
-                pwsh_json = json.dumps(pwsh_events, indent=2)
-                extracted_files["PowerShell_events.json"] = pwsh_json
-                st.success(f"Extracted {len(pwsh_events)} PowerShell events.")
-
-            if extract_tasks:
-                task_events = filter_task_scheduler_events(records)
-                task_json = json.dumps(task_events, indent=2)
-                extracted_files["TaskScheduler_events.json"] = task_json
-                st.success(f"Extracted {len(task_events)} Task Scheduler events.")
+            if selected:
+                # Previous extractions (and the logs sent from them) are replaced
+                extract_dir = st.session_state.extract_dir
+                extract_dir.reset()
+                for event_type, logs_path in list(st.session_state.analysis_logs.items()):
+                    if extract_dir.path in Path(logs_path).parents:
+                        del st.session_state.analysis_logs[event_type]
+
+                # Classify chunk by chunk, in parallel shards; matched events
+                # are spilled to disk, so memory stays bounded by one chunk per worker
+                progress_bar = st.progress(0.0, text="Extracting events...")
+                results = classify_csv(
+                    uploaded_file, extract_dir.path, selected,
+                    progress=lambda done: progress_bar.progress(done, text="Extracting events..."),
+                    workers=CSV_WORKERS
+                )
+                for name, (path, count) in results.items():
+                    category = CATEGORIES[name]
+                    extracted_files[name] = str(gzip_file(path) if compress else path)
+                    st.success(f"Extracted {count} {category.label} events.")
+                progress_bar.empty()
 
             if not extracted_files:
                 st.warning("Please select at least one event type.")
             else:
-                # Store in session state
+                # Only the file paths are kept in session state
                 st.session_state.extracted_files = extracted_files
 
-        # Download buttons (persisted using session state)
+        # Downloads (persisted using session state)
         if st.session_state.extracted_files:
             st.subheader("Download JSON files")
-            for filename, content in st.session_state.extracted_files.items():
+            labels = {
+                Path(path).name: name for name, path in st.session_state.extracted_files.items()
+            }
+            selected_file = st.selectbox("Pick a file to download", list(labels))
+            name = labels[selected_file]
+            file_path = Path(st.session_state.extracted_files[name])
+
+            # Read from the file when the button is rendered; only the picked file is served
+            with open(file_path, "rb") as f:
                 st.download_button(
-                    label=f"Download {filename}",
-                    data=content,
-                    file_name=filename,
-                    mime="application/json"
+                    label=f"Download {selected_file} ({file_path.stat().st_size / 1e6:.1f} MB)",
+                    data=f,
+                    file_name=selected_file,
+                    mime="application/gzip" if file_path.suffix == ".gz" else "application/json"
                 )
 
+            if name in ANALYSIS_EVENT_TYPES:
+                st.button(
+                    f"Send to {ANALYSIS_EVENT_TYPES[name]} analysis",
+                    on_click=send_to_analysis,
+                    args=(name, file_path),
+                    help="Analyze this file directly, without downloading and uploading it again"
+                )
@@ -0,0 +1,31 @@
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+# Same import root as the scripts (tools.*, LLM_APIs.*)
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+
+
+class StubEncoder:
+    """Offline stand-in for a tiktoken encoding: one token per word or punctuation mark."""
+
+    _TOKEN = re.compile(r"\w+|[^\w\s]")
+
+    def encode(self, text):
+        return self._TOKEN.findall(text)
+
+    def encode_batch(self, texts):
+        return [self.encode(text) for text in texts]
+
+
+@pytest.fixture
+def stub_tokenizer(monkeypatch):
+    """Make tiktoken.get_encoding() return a StubEncoder, so no encoding is downloaded."""
+    import tiktoken
+
+    encoder = StubEncoder()
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: encoder)
+    return encoder
@@ -0,0 +1,77 @@
+import json
+import time
+
+import pytest
+
+from tools.consolidatorJSON import extract_flagged_from_md, iter_json_objects
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Objects in fences and prose; braces inside strings don't count
+    ('Flagged:\n```json\n{"LineNumber": 1, "Reason": "x {not a brace}"}\n```\nand {"LineNumber": 2}',
+     [{"LineNumber": 1, "Reason": "x {not a brace}"}, {"LineNumber": 2}]),
+    # A stray quote in prose doesn't swallow what follows
+    ('prose with a stray " quote {"LineNumber": 7}', [{"LineNumber": 7}]),
+    ('set {} and {"LineNumber": 8}', [{}, {"LineNumber": 8}]),
+    ("no objects at all, just {braces}", []),
+])
+def test_objects_in_markdown(text, expected):
+    assert list(iter_json_objects(text)) == expected
+
+
+def test_nested_object_is_yielded_once():
+    text = '{"records": [{"LineNumber": 1, "Detail": {"a": 1}}, {"LineNumber": 2}]}'
+
+    assert list(iter_json_objects(text)) == [json.loads(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Reply cut off mid-record: the complete records before it are kept
+    ('{"records": [{"LineNumber": 5}, {"LineNumber": 6}', [{"LineNumber": 5}, {"LineNumber": 6}]),
+    ('{"records": [{"LineNumber": 5}, {"LineNumber": 6}, {"LineNu', [{"LineNumber": 5}, {"LineNumber": 6}]),
+    # Truncated block doesn't pair its open braces with the next block's
+    ('```json\n{"records": [{"LineNumber": 1}, {"LineNumber": 2}, {"LineNu\n```\n'
+     '```json\n{"LineNumber": 3}\n```',
+     [{"LineNumber": 1}, {"LineNumber": 2}, {"LineNumber": 3}]),
+    # Missing comma: the scan resumes at the error
+    ('{"a": 1 "b": 2} {"LineNumber": 4}', [{"LineNumber": 4}]),
+])
+def test_truncated_and_malformed(text, expected):
+    assert list(iter_json_objects(text)) == expected
+
+
+@pytest.mark.parametrize("value", [True, False, None, -1.5, 1e-7, "\u00e9"])
+@pytest.mark.parametrize("window", [512, 1024, 2048])
+def test_values_across_window_edge(value, window):
+    """A record whose last value straddles a decode window's end is still decoded."""
+    base = len(json.dumps({"LineNumber": 1, "Summary": "", "flag": value}))
+    for summary_length in range(window - base - 8, window - base + 8):
+        record = {"LineNumber": 1, "Summary": "x" * summary_length, "flag": value}
+
+        assert list(iter_json_objects(json.dumps(record) + " tail")) == [record]
+
+
+@pytest.mark.parametrize("depth", [2_000, 20_000])
+def test_deep_nesting_stays_linear(depth):
+    unclosed = '{"a":' * depth + '{"LineNumber": 9}'
+    balanced = '{"a":' * depth + '{"LineNumber": 9}' + "}" * depth + ' {"LineNumber": 10}'
+
+    started = time.monotonic()
+    assert list(iter_json_objects(unclosed)) == [{"LineNumber": 9}]
+    assert list(iter_json_objects(balanced))[-1] == {"LineNumber": 10}
+    # Quadratic rescans took tens of seconds at these sizes
+    assert time.monotonic() - started < 5
+
+
+def test_extract_flagged_from_md_normalizes_records():
+    md = (
+        "## Part 1\n```json\n"
+        '{"records": [{"Reason": "odd", "LineNumber": "12", "Summary": "s"}, {"LineNumber": "n/a"}]}\n'
+        "```\nAlso {\"LineNumber\": 13, \"reason\": \"late\", \"Extra\": 1} and a cut-off "
+        '{"LineNumber": 14, "Summ'
+    )
+
+    assert extract_flagged_from_md(md) == [
+        {"LineNumber": 12, "Summary": "s", "reason": "odd"},
+        {"LineNumber": 13, "Summary": "", "reason": "late", "Extra": 1},
+    ]
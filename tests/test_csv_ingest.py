@@ -0,0 +1,150 @@
+import csv
+import io
+import json
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+import tools.csv_ingest as csv_ingest
+from tools.csv_ingest import classify_csv, read_event_chunks, shard_ranges
+from tools.event_classifier import CATEGORIES, classify
+
+COLUMNS = ["LineNumber", "TimeCreated", "EventId", "Provider", "PayloadData1", "PayloadData2", "Payload"]
+
+PROVIDERS = [
+    "Microsoft-Windows-TerminalServices-LocalSessionManager",
+    "Microsoft-Windows-Sysmon",
+    "Microsoft-Windows-TaskScheduler",
+    "Microsoft-Windows-Security-Auditing",
+    "PowerShell",
+]
+
+# Field values that exercise the CSV quoting: embedded newlines, escaped
+# quotes, commas, and quotes at the very start or end of a field
+PAYLOADS = [
+    "",
+    "plain",
+    "line one\nline two",
+    "\n\n",
+    'say "hi", then leave',
+    '"quoted"',
+    'trailing quote"',
+    "comma, inside",
+    "long\n" + "\n" * 200 + "end",
+]
+
+
+def make_rows(n=3000, seed=3):
+    """Rows in file order with out-of-order times and 1029/4648 pairs close enough to correlate."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(1, n + 1):
+        t = start + timedelta(seconds=rng.randint(0, 6 * 3600), microseconds=rng.randint(0, 999_999))
+        event_id = rng.choice(["3", "21", "1029", "4648", "4103", "4104", "106"])
+        if event_id == "4648" and rows and rng.random() < 0.5:
+            # Right after an earlier row, often a 1029
+            t = datetime.strptime(rows[-1][1][:26], "%Y-%m-%d %H:%M:%S.%f") + timedelta(seconds=rng.randint(0, 15))
+        rows.append([
+            str(i),
+            t.strftime("%Y-%m-%d %H:%M:%S.%f") + "0",
+            event_id,
+            rng.choice(PROVIDERS),
+            rng.choice(PAYLOADS),
+            rng.choice(["", "RuleName: RDP", "x"]),
+            rng.choice(PAYLOADS),
+        ])
+    return rows
+
+
+@pytest.fixture(scope="module")
+def csv_file(tmp_path_factory):
+    rows = make_rows()
+    path = tmp_path_factory.mktemp("csv") / "events.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+    return path, rows
+
+
+def read_outputs(results):
+    return {name: path.read_text(encoding="utf-8") for name, (path, _) in results.items()}
+
+
+def test_serial_matches_whole_file_classification(csv_file, tmp_path):
+    path, _ = csv_file
+    with open(path, "rb") as f:
+        df = next(read_event_chunks(f, chunksize=1 << 30))
+    classification = classify(df)
+
+    results = classify_csv(path, tmp_path, chunksize=250)
+
+    for name in CATEGORIES:
+        out_path, count = results[name]
+        expected = classification.events(name)
+        assert count == len(expected)
+        assert out_path.read_text(encoding="utf-8") == json.dumps(expected, indent=2)
+
+
+def test_multiline_fields_round_trip(csv_file, tmp_path):
+    path, rows = csv_file
+    by_line = {int(row[0]): dict(zip(COLUMNS, row)) for row in rows}
+
+    results = classify_csv(path, tmp_path, chunksize=250)
+
+    multiline = 0
+    for out_path, _ in results.values():
+        for event in json.loads(out_path.read_text(encoding="utf-8")):
+            expected = dict(by_line[event["LineNumber"]], LineNumber=event["LineNumber"])
+            assert event == expected
+            multiline += "\n" in event["PayloadData1"]
+    assert multiline > 0
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+@pytest.mark.parametrize("chunksize", [97, 100_000])
+def test_sharded_matches_serial(csv_file, tmp_path, monkeypatch, workers, chunksize):
+    path, _ = csv_file
+    serial = read_outputs(classify_csv(path, tmp_path / "serial", chunksize=chunksize))
+
+    # Shard the small fixture as finely as a large export
+    monkeypatch.setattr(csv_ingest, "MIN_SHARD_BYTES", 1)
+    progress = []
+    sharded = read_outputs(classify_csv(
+        path, tmp_path / "sharded", chunksize=chunksize, workers=workers, progress=progress.append
+    ))
+
+    assert sharded == serial
+    assert progress[-1] == 1.0
+
+
+def test_sharded_file_object_matches_serial(csv_file, tmp_path, monkeypatch):
+    path, _ = csv_file
+    serial = read_outputs(classify_csv(path, tmp_path / "serial"))
+
+    monkeypatch.setattr(csv_ingest, "MIN_SHARD_BYTES", 1)
+    with open(path, "rb") as f:
+        sharded = read_outputs(classify_csv(f, tmp_path / "sharded", workers=2))
+
+    assert sharded == serial
+
+
+@pytest.mark.parametrize("shards", [2, 7, 64])
+def test_shard_ranges_hold_whole_records(csv_file, shards):
+    path, rows = csv_file
+    data = path.read_bytes()
+
+    header, ranges = shard_ranges(path, shards)
+
+    assert header == data[:len(header)]
+    assert ranges[0][0] == len(header) and ranges[-1][1] == len(data)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    line_numbers = []
+    for start, end in ranges:
+        df = pd.read_csv(io.BytesIO(header + data[start:end]), dtype=str, keep_default_na=False)
+        assert list(df.columns) == COLUMNS
+        line_numbers.extend(int(n) for n in df["LineNumber"])
+    assert line_numbers == [int(row[0]) for row in rows]
@@ -0,0 +1,157 @@
+import json
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from tools.event_collapser import collapse_events, collapse_file, group_line_numbers, groups_path
+from tools.event_store import EventStore
+from tools.events_extractor import extract_events
+from tools.template_miner import mine_file, mine_templates
+
+
+def make_events():
+    """A task that runs every 10 minutes (new instance GUID each run) among one-off events."""
+    start = datetime(2024, 5, 1, 12, 0, 0)
+    events = []
+    for i in range(1, 61):
+        t = start + timedelta(minutes=10 * (i // 3), seconds=i % 3)
+        if i % 3:
+            event = {
+                "EventId": "201",
+                "Provider": "Microsoft-Windows-TaskScheduler",
+                "PayloadData1": f"TaskName: \\Updater {{{uuid.UUID(int=i)}}}",
+                "PayloadData2": f"InstanceId: {uuid.UUID(int=1000 + i)} ResultCode: 0",
+                "ExecutableInfo": "C:\\Program Files\\Updater\\update.exe",
+            }
+        else:
+            event = {
+                "EventId": "106",
+                "Provider": "Microsoft-Windows-TaskScheduler",
+                "PayloadData1": f"TaskName: \\OneOff{i}",
+                "PayloadData2": f"UserContext: user{i}",
+                "ExecutableInfo": "",
+            }
+        events.append({"LineNumber": i, "TimeCreated": t.strftime("%Y-%m-%d %H:%M:%S.%f") + "0", **event})
+    return events
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    events = make_events()
+    path = tmp_path / "log.json"
+    path.write_text(json.dumps(events, indent=2), encoding="utf-8")
+    return path, events
+
+
+def write_flagged(path, line_numbers):
+    records = [{"LineNumber": n, "Summary": "", "reason": "test"} for n in line_numbers]
+    path.write_text(json.dumps({"consolidated_flagged_records": records}), encoding="utf-8")
+    return path
+
+
+def test_collapse_events_counts_and_groups():
+    events = make_events()
+    groups = {}
+
+    records = collapse_events(events, groups=groups)
+
+    updater = [rec for rec in records if "Count" in rec]
+    assert len(updater) == 1
+    assert updater[0]["Count"] == 40
+    assert updater[0]["FirstTime"] == events[0]["TimeCreated"]
+    assert updater[0]["LastTime"] == events[-2]["TimeCreated"]
+    assert sum(rec.get("Count", 1) for rec in records) == len(events)
+    # Members go to `groups`, not into the records sent to the model
+    assert all(set(rec) <= set(events[0]) | {"Count", "FirstTime", "LastTime"} for rec in records)
+    assert groups == {1: [ev["LineNumber"] for ev in events if ev["EventId"] == "201"]}
+
+
+def test_result_codes_stay_in_separate_groups():
+    events = [ev for ev in make_events() if ev["EventId"] == "201"]
+    for i, ev in enumerate(events):
+        code = "2147942402" if i % 10 == 0 else "0"
+        ev["PayloadData2"] = f"InstanceId: {uuid.UUID(int=i)} ResultCode: {code}"
+        # Varying numbers outside the code don't split a group
+        ev["PayloadData3"] = f"ProcessId: {4000 + i} Duration: 0x{i:x}"
+    groups = {}
+
+    records = collapse_events(events, groups=groups)
+
+    assert [(rec["Count"], rec["PayloadData2"].split()[-1]) for rec in records] == [(4, "2147942402"), (36, "0")]
+    assert sorted(n for members in groups.values() for n in members) == [ev["LineNumber"] for ev in events]
+
+
+def test_collapse_keeps_small_groups_in_order():
+    events = make_events()
+
+    records = collapse_events(events, min_count=41)
+
+    assert records == events
+
+
+@pytest.mark.parametrize("lookup", ["scan", "index", "store"])
+def test_flagged_collapsed_record_expands_to_members(log_file, tmp_path, lookup):
+    path, events = log_file
+    reduced = tmp_path / "reduced.json"
+    collapse_file(path, reduced)
+    records = json.loads(reduced.read_text(encoding="utf-8"))
+    collapsed = next(rec for rec in records if "Count" in rec)
+    single = next(rec for rec in records if "Count" not in rec)
+    flagged = write_flagged(tmp_path / "flagged.json", [collapsed["LineNumber"], single["LineNumber"]])
+    output = tmp_path / "flagged_detailed.json"
+
+    kwargs = {}
+    if lookup == "index":
+        kwargs["index_file"] = tmp_path / "log.idx"
+    elif lookup == "store":
+        kwargs["store"] = EventStore.create(tmp_path / "log.sqlite", events)
+    extract_events(flagged, path, output, collapsed_file=reduced, **kwargs)
+    if "store" in kwargs:
+        kwargs["store"].close()
+
+    expected = [ev for ev in events if ev["EventId"] == "201" or ev["LineNumber"] == single["LineNumber"]]
+    assert json.loads(output.read_text(encoding="utf-8")) == expected
+
+
+def test_unflagged_groups_are_not_expanded(log_file, tmp_path):
+    path, events = log_file
+    reduced = tmp_path / "reduced.json"
+    collapse_file(path, reduced)
+    flagged = write_flagged(tmp_path / "flagged.json", [3])
+    output = tmp_path / "flagged_detailed.json"
+
+    extract_events(flagged, path, output, collapsed_file=reduced)
+
+    assert json.loads(output.read_text(encoding="utf-8")) == [events[2]]
+
+
+def test_template_sidecar_expands_like_collapsed(log_file, tmp_path):
+    path, events = log_file
+    templates = tmp_path / "templates.json"
+    mine_file(path, templates)
+    groups = group_line_numbers(templates)
+    assert groups_path(templates).exists()
+    assert sorted(n for members in groups.values() for n in members) == [ev["LineNumber"] for ev in events]
+
+    records = json.loads(templates.read_text(encoding="utf-8"))
+    first = records[0]
+    flagged = write_flagged(tmp_path / "flagged.json", [first["LineNumber"]])
+    output = tmp_path / "flagged_detailed.json"
+    extract_events(flagged, path, output, collapsed_file=templates)
+
+    members = set(groups[first["LineNumber"]])
+    assert len(members) == first["Count"]
+    assert json.loads(output.read_text(encoding="utf-8")) == [ev for ev in events if ev["LineNumber"] in members]
+
+
+def test_template_parameters_hold_raw_values():
+    events = [
+        {"LineNumber": i, "TimeCreated": f"2024-05-01 12:00:0{i}.0000000", "EventId": "201",
+         "Provider": "Microsoft-Windows-TaskScheduler", "PayloadData1": f"Task \\Updater result {value} done"}
+        for i, value in enumerate(["0x1F", "17", "0x2", "ok"], 1)
+    ]
+    templates = mine_templates(events, sim_threshold=0.5)
+
+    assert len(templates) == 1
+    assert templates[0]["Parameters"] == [{"0x1F": 1, "17": 1, "0x2": 1, "ok": 1}]
@@ -0,0 +1,44 @@
+import codecs
+import json
+import os
+
+import pytest
+
+from tools.event_store import iter_source_events, open_event_store
+
+
+def make_log(n, host="host"):
+    return [
+        {"LineNumber": i, "TimeCreated": f"2024-05-01 12:00:{i % 60:02d}.0000000", "EventId": "4624",
+         "Provider": "Microsoft-Windows-Security-Auditing", "Computer": host}
+        for i in range(1, n + 1)
+    ]
+
+
+@pytest.mark.parametrize("as_path", [False, True])
+def test_json_with_bom_is_read_as_json(tmp_path, as_path):
+    events = make_log(3)
+    data = codecs.BOM_UTF8 + b"\r\n  " + json.dumps(events).encode("utf-8")
+    source = tmp_path / "upload"
+    source.write_bytes(data)
+
+    assert list(iter_source_events(source if as_path else data)) == events
+
+
+def test_least_recently_used_stores_are_evicted(tmp_path):
+    store_dir = tmp_path / "stores"
+    logs = [json.dumps(make_log(200, host=f"host{i}")).encode("utf-8") for i in range(3)]
+    paths = []
+    for i, log in enumerate(logs[:2]):
+        with open_event_store(log, name="log.json", store_dir=store_dir) as store:
+            paths.append(store.path)
+        os.utime(store.path, (1000 + i, 1000 + i))
+    size = paths[0].stat().st_size
+
+    # Reusing the older store makes the other one the least recently used
+    with open_event_store(logs[0], name="log.json", store_dir=store_dir) as store:
+        assert store.path == paths[0]
+    with open_event_store(logs[2], name="log.json", store_dir=store_dir, max_bytes=2 * size + size // 2) as store:
+        paths.append(store.path)
+
+    assert sorted(store_dir.glob("*.sqlite")) == sorted([paths[0], paths[2]])
@@ -0,0 +1,29 @@
+from LLM_APIs.response_cache import ResponseCache
+from tools.run_metrics import RunMetrics
+
+
+def test_response_cache_keeps_usage(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    cache.put("with", "reply", "model", {"input_tokens": 120, "output_tokens": 30})
+    cache.put("without", "other reply", "model")
+
+    assert cache.lookup("with") == ("reply", {"input_tokens": 120, "output_tokens": 30})
+    assert cache.lookup("without") == ("other reply", None)
+    assert cache.get("with") == "reply"
+    assert cache.lookup("missing") is None
+    cache.close()
+
+
+def test_replayed_usage_is_counted_apart():
+    metrics = RunMetrics()
+    metrics.record("first_pass", {"usage": {"input_tokens": 100, "cache_read_input_tokens": 20, "output_tokens": 10}})
+    metrics.record("first_pass", {"cache_hit": True, "usage": {"input_tokens": 50, "output_tokens": 5}})
+
+    assert metrics.has_usage()
+    assert (metrics.input_tokens(), metrics.output_tokens()) == (170, 15)
+    assert (metrics.input_tokens(replayed=False), metrics.output_tokens(replayed=False)) == (120, 10)
+    assert metrics.totals()["replayed_input_tokens"] == 50
+
+    # A reply cached without its usage leaves the run's tokens unknown
+    metrics.record("second_pass", {"cache_hit": True, "usage": {}})
+    assert not metrics.has_usage()
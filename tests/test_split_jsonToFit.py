@@ -0,0 +1,95 @@
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from dateutil import parser as dateparser
+
+from tools.split_jsonToFit import iter_parts, split_json_by_tokens_and_time
+
+
+def baseline_parts(events, encoder, tokens_per_file, time_gap_seconds):
+    """The splitter's original algorithm: load everything, count and parse per event."""
+    parts, current, current_tokens, prev_time = [], [], 0, None
+    for ev in events:
+        curr_time = dateparser.parse(ev["TimeCreated"])
+        tok = len(encoder.encode(json.dumps(ev, separators=(",", ":"), ensure_ascii=False)))
+        exceed_token = (current_tokens + tok) > tokens_per_file
+        exceed_time = (prev_time is not None and
+                       (curr_time - prev_time).total_seconds() > time_gap_seconds)
+        if exceed_token or exceed_time:
+            if current:
+                parts.append(current)
+            current, current_tokens = [ev], tok
+        else:
+            current.append(ev)
+            current_tokens += tok
+        prev_time = curr_time
+    if current:
+        parts.append(current)
+    return parts
+
+
+def make_events(n=400, seed=7):
+    """EvtxECmd-style events with varied sizes, gaps just under, at and over an hour, and an oversized one."""
+    rng = random.Random(seed)
+    t = datetime(2024, 3, 1, 8, 0, 0)
+    gaps = [timedelta(seconds=3599), timedelta(seconds=3600), timedelta(seconds=3601), timedelta(hours=5)]
+    events = []
+    for i in range(1, n + 1):
+        t += rng.choice(gaps) if rng.random() < 0.05 else timedelta(milliseconds=rng.randint(0, 90_000))
+        words = " ".join(rng.choice(["svchost", "logon", "4624", "C:\\Windows", "ÄÖü"]) for _ in range(rng.randint(1, 40)))
+        events.append({
+            "LineNumber": i,
+            "TimeCreated": t.strftime("%Y-%m-%d %H:%M:%S.%f") + "0",
+            "EventId": str(rng.choice([4624, 4648, 1029, 106])),
+            "Provider": "Microsoft-Windows-Security-Auditing",
+            "PayloadData1": words * (60 if i == n // 2 else 1),
+        })
+    return events
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    events = make_events()
+    path = tmp_path / "log.json"
+    path.write_text(json.dumps(events, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path, events
+
+
+@pytest.mark.parametrize("tokens_per_file", [50, 400, 5000])
+@pytest.mark.parametrize("stream", [False, True])
+def test_part_boundaries_match_baseline(stub_tokenizer, log_file, tokens_per_file, stream):
+    path, events = log_file
+    expected = baseline_parts(events, stub_tokenizer, tokens_per_file, 3600)
+
+    parts = list(iter_parts(path, tokens_per_file=tokens_per_file, stream=stream))
+
+    assert [index for index, _ in parts] == list(range(1, len(expected) + 1))
+    assert [part for _, part in parts] == expected
+
+
+def test_given_events_match_baseline(stub_tokenizer):
+    events = make_events(seed=11)
+    expected = baseline_parts(events, stub_tokenizer, 400, 3600)
+
+    parts = [part for _, part in iter_parts(None, tokens_per_file=400, events=iter(events))]
+
+    assert parts == expected
+
+
+
+@pytest.mark.parametrize("tokens_per_file", [50, 400, 5000])
+@pytest.mark.parametrize("stream", [False, True])
+def test_written_parts_match_baseline(stub_tokenizer, log_file, tmp_path, tokens_per_file, stream):
+    path, events = log_file
+    expected = baseline_parts(events, stub_tokenizer, tokens_per_file, 3600)
+    output_dir = tmp_path / "parts"
+
+    count = split_json_by_tokens_and_time(path, output_dir, tokens_per_file=tokens_per_file, stream=stream)
+
+    assert count == len(expected)
+    assert {p.name for p in output_dir.iterdir()} == {f"part_{i:02d}.json" for i in range(1, count + 1)}
+    for i, part in enumerate(expected, 1):
+        with open(output_dir / f"part_{i:02d}.json", encoding="utf-8") as f:
+            assert json.load(f) == part
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# bench_consolidator.py
+"""
+Benchmark consolidatorJSON.extract_flagged_from_md against the regex
+extractor it replaced, on large well-formed replies and on malformed ones
+(truncated output, reordered keys, unterminated strings, stray braces,
+deeply nested or unclosed objects). The legacy extractor runs in a child
+process with a per-input time limit, so a slow match can't stall the run.
+
+The regex finishes in milliseconds on every input here; what the scanner
+adds is records the regex misses (reordered keys, extra fields). It is
+slower on the deep-nesting inputs, where every brace and key of the
+over-deep span goes through the Python token loop once (about 0.3s for
+0.9MB of 3000-deep objects), against the regex's few milliseconds.
+"""
+import multiprocessing
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(PROJECT_ROOT))
+from tools.consolidatorJSON import extract_flagged_from_md
+
+# The pattern used before the linear scanner, kept verbatim for comparison
+LEGACY_RECORD_PATTERN = re.compile(
+    r"""\{
+        \s*"LineNumber"\s*:\s*(?P<LineNumber>\d+)\s*,      # line number
+        \s*"Summary"\s*:\s*"(?P<Summary>(?:\\.|[^"\\])*)"\s*,  # summary (handles escapes)
+        \s*"[Rr]eason"\s*:\s*"(?P<reason>(?:\\.|[^"\\])*)"\s*    # reason
+    \}""",
+    re.VERBOSE | re.DOTALL
+)
+
+
+def legacy_extract(md_text: str) -> List[Dict]:
+    return [
+        {
+            "LineNumber": int(m.group("LineNumber")),
+            "Summary": m.group("Summary"),
+            "reason": m.group("reason"),
+        }
+        for m in LEGACY_RECORD_PATTERN.finditer(md_text)
+    ]
+
+
+def record_text(line_number: int, rng: random.Random, shuffle: bool = False) -> str:
+    fields = [
+        f'"LineNumber": {line_number}',
+        f'"Summary": "Scheduled task \\"Updater{line_number}\\" created by SYSTEM"',
+        f'"reason": "Task registered from {rng.choice(["temp", "appdata", "public"])} directory"',
+    ]
+    if shuffle:
+        fields.append('"Severity": "high"')
+        rng.shuffle(fields)
+    return "  {" + ", ".join(fields) + "}"
+
+
+def make_inputs(records: int, seed: int = 0) -> Dict[str, str]:
+    rng = random.Random(seed)
+    body = ",\n".join(record_text(i, rng) for i in range(1, records + 1))
+    well_formed = (
+        "## Flagged events\n\nThe following entries look suspicious:\n\n"
+        f"```json\n[\n{body}\n]\n```\n\nNo other anomalies.\n"
+    )
+    shuffled = ",\n".join(record_text(i, rng, shuffle=True) for i in range(1, records + 1))
+    return {
+        "well_formed": well_formed,
+        # Reply cut off mid-record by max_tokens
+        "truncated": well_formed[: len(well_formed) * 2 // 3],
+        "reordered_keys_extra_fields": f"```json\n[\n{shuffled}\n]\n```\n",
+        # Records wrapped in an object the reply never closes
+        "truncated_wrapper": '{"flagged_records": [\n' + body[: len(body) // 2],
+        # Each record starts like a match but its Summary never closes
+        "unterminated_strings": "".join(
+            f'{{"LineNumber": {i}, "Summary": "' + "x" * 200 + "\n" for i in range(records)
+        ),
+        # A single unclosed Summary followed by lots of escaped text
+        "long_unclosed_summary": '{"LineNumber": 1, "Summary": "' + "\\a" * (records * 50),
+        "stray_braces": "{" * (records * 20) + record_text(1, rng) + "}" * (records * 5),
+        # Nesting deeper than the decoder's recursion limit, never closed
+        "deep_unclosed": '{"a":' * (records * 5 // 2),
+        "deep_unclosed_records": '{"LineNumber": 1, "x": {"y": ' * records,
+        # Deep but balanced objects, each followed by a real record
+        "deep_balanced": (
+            '{"a":' * 3000 + "1" + "}" * 3000 + "\n" + record_text(1, rng) + "\n"
+        ) * max(records // 400, 1),
+    }
+
+
+def _run_legacy(md_text: str, queue) -> None:
+    started = time.perf_counter()
+    count = len(legacy_extract(md_text))
+    queue.put((time.perf_counter() - started, count))
+
+
+def time_legacy(md_text: str, time_limit: float) -> Tuple[float, object]:
+    """Run the regex in a child process so a runaway match can be stopped."""
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_legacy, args=(md_text, queue))
+    proc.start()
+    proc.join(time_limit)
+    if proc.is_alive():
+        proc.terminate()
+        proc.join()
+        return time_limit, "timeout"
+    return queue.get()
+
+
+def time_call(fn: Callable[[str], List], md_text: str, repeat: int) -> Tuple[float, int]:
+    best = float("inf")
+    count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = len(fn(md_text))
+        best = min(best, time.perf_counter() - started)
+    return best, count
+
+
+def run_benchmark(records: int, time_limit: float, repeat: int) -> None:
+    print(f"{'input':<30} {'size':>10} {'scanner':>12} {'found':>7} {'regex':>12} {'found':>7}")
+    for name, md_text in make_inputs(records).items():
+        scan_seconds, scan_count = time_call(extract_flagged_from_md, md_text, repeat)
+        regex_seconds, regex_count = time_legacy(md_text, time_limit)
+        regex_time = f">{time_limit:.0f}s" if regex_count == "timeout" else f"{regex_seconds * 1000:.1f}ms"
+        print(
+            f"{name:<30} {len(md_text) / 1e6:>8.2f}MB "
+            f"{scan_seconds * 1000:>10.1f}ms {scan_count:>7} "
+            f"{regex_time:>12} {regex_count!s:>7}"
+        )
+
+
+if __name__ == "__main__":
+    # === CONFIGURE THESE ===
+    RECORDS    = 20000   # records per input (~3MB well-formed reply)
+    TIME_LIMIT = 30.0    # seconds before the legacy regex is stopped
+    REPEAT     = 3       # best of N runs for the scanner
+    # =======================
+
+    run_benchmark(RECORDS, TIME_LIMIT, REPEAT)
@@ -3,34 +3,195 @@
 
 import re
 import json
+import threading
 from pathlib import Path
-from typing import List, Dict, Union
+from typing import Any, Iterator, List, Dict, Optional, Union
 
-def extract_flagged_from_md(md_text: str) -> List[Dict[str, Union[int, str]]]:
+# Tokens that matter for finding object boundaries in model output: complete
+# single-line JSON strings (so braces inside them are ignored), braces, and
+# markdown code-fence lines. A stray quote in prose can never open a string
+# that swallows the rest of the document, since strings stop at a newline.
+# Groups: 1 an opening brace, 2 a closing brace, 3 a code fence.
+_TOKEN_PATTERN = re.compile(r'"(?:[^"\\\n]|\\.)*"|(\{)|(\})|^([ \t]*(?:```|~~~))', re.MULTILINE)
+
+# Where a JSON object can start: a brace followed by a key or the closing brace
+_OBJECT_START = re.compile(r'\{\s*["}]')
+
+_DECODER = json.JSONDecoder()
+
+# First window _decode_at() tries; a flagged record is a few hundred characters
+_INITIAL_WINDOW = 512
+
+# A decode error this close to the end of the window may come from a value
+# the window cut in two (tru|e, -1|.5, "\u00|e9"), so the window grows instead
+_WINDOW_MARGIN = 32
+
+# Deepest object _recover_objects() decodes; flagged records nest a few levels,
+# and skipping deeper spans keeps recovery linear on pathological nesting
+_MAX_RECOVER_DEPTH = 32
+
+
+def _object_spans(text: str, start: int, end: Optional[int] = None) -> tuple:
+    """
+    (spans, stop): (start, end) of every balanced {...} in text[start:end]
+    nested at most _MAX_RECOVER_DEPTH levels deep, in order of start, and
+    the position the scan stopped at.
+
+    One pass over the tokens with a stack of open braces; a code fence
+    discards braces left open inside the block it closes, so truncated
+    output in one block doesn't pair with braces in the next. Without `end`
+    the scan covers the object opening at text[start] and stops past its
+    closing brace, or at the code fence or end of text that cuts it off.
     """
-    Find all JSON-like records in the markdown text and
+    whole = end is None
+    if whole:
+        end = len(text)
+    elif text.find("}", start, end) == -1:
+        return [], end
+    spans = []
+    stack = []  # [start, depth of the deepest span closed inside it]
+    for match in _TOKEN_PATTERN.finditer(text, start, end):
+        kind = match.lastindex
+        if kind == 1:
+            stack.append([match.start(), 0])
+        elif kind == 2:
+            if not stack:
+                continue
+            span_start, inner = stack.pop()
+            if inner < _MAX_RECOVER_DEPTH:
+                spans.append((span_start, match.end()))
+            if stack:
+                if stack[-1][1] <= inner:
+                    stack[-1][1] = inner + 1
+            elif whole:
+                end = match.end()
+                break
+        elif kind == 3:
+            if whole:
+                end = match.start()
+                break
+            stack.clear()
+    spans.sort()
+    return spans, end
+
+
+def _recover_objects(text: str, spans: List[tuple]) -> Iterator[Any]:
+    """Complete objects decoded from `spans` of a malformed region, outermost first."""
+    covered_until = 0
+    for span_start, span_end in spans:
+        if span_start < covered_until:
+            continue
+        try:
+            obj, stop = _DECODER.raw_decode(text[span_start:span_end])
+        except (json.JSONDecodeError, RecursionError):
+            continue
+        if stop == span_end - span_start:
+            covered_until = span_end
+            yield obj
+
+
+def _decode_at(text: str, pos: int) -> tuple:
+    """
+    raw_decode() of the value starting at text[pos], returning (obj, end).
+    A JSONDecodeError's position is relative to `pos`.
+
+    The decode runs on a window after `pos` that doubles while the error is
+    near its end: JSONDecodeError works out the line and column of a failure
+    by scanning the document it was given, which on a multi-MB reply would
+    make every failed candidate cost the whole prefix of the text.
+    """
+    window = _INITIAL_WINDOW
+    while True:
+        chunk = text[pos:pos + window]
+        try:
+            obj, end = _DECODER.raw_decode(chunk)
+            return obj, pos + end
+        except json.JSONDecodeError as e:
+            ran_out = e.pos >= len(chunk) - _WINDOW_MARGIN or e.msg.startswith("Unterminated string")
+            if pos + window >= len(text) or not ran_out:
+                raise
+        window *= 2
+
+
+def iter_json_objects(text: str) -> Iterator[Any]:
+    """
+    Yield every JSON object embedded in `text` (markdown, prose, code fences),
+    in document order.
+
+    Objects are decoded in place with `raw_decode` from each "{" that opens
+    a key (or an empty object) and isn't inside an object already decoded. When one is malformed (a truncated
+    reply, a missing comma), the complete objects nested in it up to the
+    error are recovered from its balanced brace spans and the scan resumes
+    at the error, so each character is decoded once, plus once per enclosing
+    malformed object. An object nested too deeply to decode is skipped as a
+    whole span (objects of reasonable depth inside it are still recovered),
+    so deep or truncated nesting stays linear too.
+    """
+    match = _OBJECT_START.search(text)
+    while match:
+        pos = match.start()
+        try:
+            obj, end = _decode_at(text, pos)
+        except json.JSONDecodeError as e:
+            end = pos + max(e.pos, 1)
+            spans, _ = _object_spans(text, pos + 1, end)
+            yield from _recover_objects(text, spans)
+        except RecursionError:
+            spans, end = _object_spans(text, pos)
+            yield from _recover_objects(text, spans)
+        else:
+            yield obj
+        match = _OBJECT_START.search(text, end)
+
+
+def _iter_records(value: Any) -> Iterator[Dict[str, Any]]:
+    """Dicts carrying a LineNumber, searched depth-first through `value`."""
+    if isinstance(value, dict):
+        if "LineNumber" in value:
+            yield value
+            return
+        for item in value.values():
+            yield from _iter_records(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _iter_records(item)
+
+
+def _normalize_record(obj: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """LineNumber/Summary/reason first, then any extra fields; None if LineNumber isn't an integer."""
+    try:
+        line_number = int(obj["LineNumber"])
+    except (TypeError, ValueError):
+        return None
+    reason = obj.get("reason", obj.get("Reason", ""))
+    rec = {
+        "LineNumber": line_number,
+        "Summary":    obj.get("Summary", ""),
+        "reason":     reason,
+    }
+    for key, value in obj.items():
+        if key not in rec and key != "Reason":
+            rec[key] = value
+    return rec
+
+
+def extract_flagged_from_md(md_text: str) -> List[Dict[str, Any]]:
+    """
+    Find all flagged records in the markdown text and
     return a list of dicts where each has keys:
       - LineNumber (int)
       - Summary (str)
-      - reason  (str)
+      - reason  (str, also read from "Reason")
+    followed by any extra fields the model added. Records are JSON objects
+    with a "LineNumber" key, in any key order, anywhere in the reply: bare,
+    in code fences, or nested in a wrapper object or array.
     """
-    record_pattern = re.compile(
-        r"""\{
-            \s*"LineNumber"\s*:\s*(?P<LineNumber>\d+)\s*,      # line number
-            \s*"Summary"\s*:\s*"(?P<Summary>(?:\\.|[^"\\])*)"\s*,  # summary (handles escapes)
-            \s*"[Rr]eason"\s*:\s*"(?P<reason>(?:\\.|[^"\\])*)"\s*    # reason
-        \}""",
-        re.VERBOSE | re.DOTALL
-    )
-
     flagged = []
-    for match in record_pattern.finditer(md_text):
-        rec = {
-            "LineNumber": int(match.group("LineNumber")),
-            "Summary":    match.group("Summary"),
-            "reason":     match.group("reason")
-        }
-        flagged.append(rec)
+    for obj in iter_json_objects(md_text):
+        for candidate in _iter_records(obj):
+            rec = _normalize_record(candidate)
+            if rec is not None:
+                flagged.append(rec)
     return flagged
 
 def consolidate(
@@ -74,6 +235,68 @@ def consolidate(
 
     print(f"Wrote {len(all_flagged)} records to {output_file}")
 
+class IncrementalConsolidator:
+    """
+    Consolidate flagged records part by part, as first-pass replies arrive.
+
+    add_reply() extracts a reply's flagged records, indexes them by
+    LineNumber and appends them (tagged with their part) to `log_file`, a
+    JSON-lines log that is flushed per part and survives a crash.
+    finalize() writes `output_file` in the same layout as consolidate(), with
+    records in part order regardless of the order replies arrived in.
+    add_reply() is safe to call from the first pass's worker threads.
+    """
+
+    def __init__(
+        self,
+        output_file: Union[str, Path],
+        log_file: Optional[Union[str, Path]] = None,
+        source_file: Optional[Union[str, Path]] = None
+    ):
+        self.output_file = Path(output_file)
+        self.log_file = Path(log_file) if log_file else self.output_file.with_suffix(".jsonl")
+        self.source_file = str(source_file) if source_file else None
+        self.parts: Dict[int, List[Dict[str, Union[int, str]]]] = {}
+        self.by_line_number: Dict[int, List[Dict[str, Union[int, str]]]] = {}
+        self._lock = threading.Lock()
+
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        self.log_file.write_text("", encoding="utf-8")
+
+    def add_reply(self, part_number: int, text: str) -> int:
+        """Index the flagged records of one part's reply; returns how many were found."""
+        records = extract_flagged_from_md(text)
+        if self.source_file:
+            for rec in records:
+                rec["source_file"] = self.source_file
+        with self._lock:
+            self.parts[part_number] = records
+            for rec in records:
+                self.by_line_number.setdefault(rec["LineNumber"], []).append(rec)
+            with self.log_file.open("a", encoding="utf-8") as f:
+                for rec in records:
+                    f.write(json.dumps({"part": part_number, **rec}, ensure_ascii=False) + "\n")
+        return len(records)
+
+    def records(self) -> List[Dict[str, Union[int, str]]]:
+        """All flagged records, in part order."""
+        with self._lock:
+            return [rec for part in sorted(self.parts) for rec in self.parts[part]]
+
+    def finalize(self) -> Path:
+        """Write the consolidated JSON and return its path."""
+        all_flagged = self.records()
+        output_data = {
+            "consolidated_flagged_records": all_flagged,
+            "total_flagged": len(all_flagged)
+        }
+        self.output_file.parent.mkdir(parents=True, exist_ok=True)
+        with self.output_file.open("w", encoding="utf-8") as f:
+            json.dump(output_data, f, indent=2, ensure_ascii=False)
+
+        print(f"Wrote {len(all_flagged)} records to {self.output_file}")
+        return self.output_file
+
 if __name__ == "__main__":
     # === CONFIGURE THESE PATHS ===
     LOG_NAME    = "TS"
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# correlation.py
+"""
+Temporal correlation of two event streams.
+
+A rule relates "target" events to "anchor" events that happened within a
+time window around them, optionally only when both carry the same key
+(e.g. the same user or host). Both streams are sorted once and every target
+finds its window with a binary search, so a join costs
+O((anchors + targets) log anchors) instead of comparing every pair.
+
+Rules are registered in CORRELATION_RULES; RDP's logon rule is built in.
+"""
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tools.timestamps import MISSING_NS, NS_PER_SECOND
+
+
+def _window_bounds(
+    sorted_anchor_times: np.ndarray,
+    target_times: np.ndarray,
+    before_ns: int,
+    after_ns: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """[lo, hi) of the sorted anchors within [t - before_ns, t + after_ns] of each target."""
+    lo = np.searchsorted(sorted_anchor_times, target_times - before_ns, side="left")
+    hi = np.searchsorted(sorted_anchor_times, target_times + after_ns, side="right")
+    return lo, hi
+
+
+def _key_codes(anchor_keys: Sequence[Any], target_keys: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Integer codes for both key columns, shared so equal keys get equal codes (-1 = missing)."""
+    codes, _ = pd.factorize(pd.Series(list(anchor_keys) + list(target_keys), dtype=object))
+    return codes[:len(anchor_keys)], codes[len(anchor_keys):]
+
+
+def _iter_windows(
+    anchor_times: Sequence[int],
+    target_times: Sequence[int],
+    before_ns: int,
+    after_ns: Optional[int],
+    anchor_keys: Optional[Sequence[Any]],
+    target_keys: Optional[Sequence[Any]]
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Per key group, yield (target indices, lo, hi, anchor indices sorted by
+    time): target i's anchors are anchors[lo[i]:hi[i]]. Each stream is
+    sorted by (key, time) once and groups are runs of the sorted arrays.
+    """
+    after_ns = before_ns if after_ns is None else after_ns
+    anchor_times = np.asarray(anchor_times, dtype=np.int64)
+    target_times = np.asarray(target_times, dtype=np.int64)
+    if anchor_keys is not None and target_keys is not None:
+        anchor_codes, target_codes = _key_codes(anchor_keys, target_keys)
+    else:
+        anchor_codes = np.zeros(len(anchor_times), dtype=np.int64)
+        target_codes = np.zeros(len(target_times), dtype=np.int64)
+
+    anchor_idx = np.flatnonzero((anchor_times != MISSING_NS) & (anchor_codes >= 0))
+    target_idx = np.flatnonzero((target_times != MISSING_NS) & (target_codes >= 0))
+    anchor_order = anchor_idx[np.lexsort((anchor_times[anchor_idx], anchor_codes[anchor_idx]))]
+    target_order = target_idx[np.argsort(target_codes[target_idx], kind="stable")]
+    sorted_anchor_codes = anchor_codes[anchor_order]
+    sorted_target_codes = target_codes[target_order]
+
+    codes, starts = np.unique(sorted_target_codes, return_index=True)
+    stops = np.append(starts[1:], len(target_order))
+    anchor_starts = np.searchsorted(sorted_anchor_codes, codes, side="left")
+    anchor_stops = np.searchsorted(sorted_anchor_codes, codes, side="right")
+    for start, stop, a_start, a_stop in zip(starts, stops, anchor_starts, anchor_stops):
+        if a_start == a_stop:
+            continue
+        anchors = anchor_order[a_start:a_stop]
+        targets = target_order[start:stop]
+        lo, hi = _window_bounds(anchor_times[anchors], target_times[targets], before_ns, after_ns)
+        yield targets, lo, hi, anchors
+
+
+def window_join(
+    anchor_times: Sequence[int],
+    target_times: Sequence[int],
+    before_ns: int,
+    after_ns: Optional[int] = None,
+    anchor_keys: Optional[Sequence[Any]] = None,
+    target_keys: Optional[Sequence[Any]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    All (anchor index, target index) pairs where the anchor's time lies in
+    [target time - before_ns, target time + after_ns] (after_ns defaults to
+    before_ns) and, if keys are given, both keys are equal and not missing.
+    Times are epoch ns; MISSING_NS never matches. Pairs are ordered by
+    target index, then anchor time.
+    """
+    pair_anchors, pair_targets = [], []
+    for targets, lo, hi, anchors in _iter_windows(
+        anchor_times, target_times, before_ns, after_ns, anchor_keys, target_keys
+    ):
+        counts = hi - lo
+        if not counts.any():
+            continue
+        # Expand each target's [lo, hi) run into individual anchor positions
+        run_offsets = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        pair_anchors.append(anchors[run_offsets + np.arange(counts.sum())])
+        pair_targets.append(np.repeat(targets, counts))
+
+    if not pair_targets:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    anchors = np.concatenate(pair_anchors)
+    targets = np.concatenate(pair_targets)
+    by_target = np.argsort(targets, kind="stable")
+    return anchors[by_target], targets[by_target]
+
+
+def within_window(
+    anchor_times: Sequence[int],
+    target_times: Sequence[int],
+    before_ns: int,
+    after_ns: Optional[int] = None,
+    anchor_keys: Optional[Sequence[Any]] = None,
+    target_keys: Optional[Sequence[Any]] = None
+) -> np.ndarray:
+    """Boolean mask over the targets: True where window_join() would pair it with any anchor."""
+    related = np.zeros(len(target_times), dtype=bool)
+    for targets, lo, hi, _ in _iter_windows(
+        anchor_times, target_times, before_ns, after_ns, anchor_keys, target_keys
+    ):
+        related[targets] = hi > lo
+    return related
+
+
+class CorrelationRule:
+    """
+    Targets related to anchors within [-before_ns, +after_ns] of their time.
+
+    `anchor_key` / `target_key` name the event fields (e.g. "Computer" for
+    the same host) whose values must be equal for a pair to count; None
+    relates events regardless of key.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        before_ns: int,
+        after_ns: Optional[int] = None,
+        anchor_key: Optional[str] = None,
+        target_key: Optional[str] = None,
+        description: str = ""
+    ):
+        self.name = name
+        self.before_ns = before_ns
+        self.after_ns = before_ns if after_ns is None else after_ns
+        self.anchor_key = anchor_key
+        self.target_key = target_key if target_key is not None else anchor_key
+        self.description = description
+
+    @property
+    def keyed(self) -> bool:
+        return self.anchor_key is not None
+
+    def related(
+        self,
+        anchor_times: Sequence[int],
+        target_times: Sequence[int],
+        anchor_keys: Optional[Sequence[Any]] = None,
+        target_keys: Optional[Sequence[Any]] = None
+    ) -> np.ndarray:
+        """Mask over the targets that have an anchor in the window (see within_window)."""
+        if not self.keyed:
+            anchor_keys = target_keys = None
+        return within_window(anchor_times, target_times, self.before_ns, self.after_ns,
+                             anchor_keys, target_keys)
+
+    def pairs(
+        self,
+        anchor_times: Sequence[int],
+        target_times: Sequence[int],
+        anchor_keys: Optional[Sequence[Any]] = None,
+        target_keys: Optional[Sequence[Any]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Every related (anchor index, target index) pair (see window_join)."""
+        if not self.keyed:
+            anchor_keys = target_keys = None
+        return window_join(anchor_times, target_times, self.before_ns, self.after_ns,
+                           anchor_keys, target_keys)
+
+
+CORRELATION_RULES: Dict[str, CorrelationRule] = {}
+
+
+def register_rule(rule: CorrelationRule) -> CorrelationRule:
+    CORRELATION_RULES[rule.name] = rule
+    return rule
+
+
+# Explicit-credential logons (4648) within 10 seconds of an RDP 1029
+# (a client's hashed user name) on either side belong to that session
+RDP_LOGON_RULE = register_rule(CorrelationRule(
+    name="rdp_logon",
+    before_ns=10 * NS_PER_SECOND,
+    description="4648 logons within 10s of an RDP 1029",
+))
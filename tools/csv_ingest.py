@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+# csv_ingest.py
+"""
+Chunked classification of EvtxECmd CSV exports.
+
+classify_csv() reads the CSV `chunksize` rows at a time, classifies each
+chunk with the registered categories (tools.event_classifier) and spills
+every category's matched rows to disk as a run sorted by TimeCreated. Once
+the whole file is read, correlations (e.g. RDP's 4648 logons) are joined
+over the anchors and candidates collected from all chunks, and each
+category's runs are merged into its JSON file. Only one chunk of the CSV is
+in memory at a time.
+
+With workers > 1, byte ranges of the CSV are classified in parallel
+processes and their runs merged the same way, giving the same output.
+
+Values are read as the EvtxECmd JSON exports hold them: every field a
+string ("" when empty) except LineNumber, which is an int.
+"""
+import heapq
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from tools.event_classifier import CATEGORIES, EventCategory, EventColumns
+
+# Rows per chunk; bounds peak memory of an ingestion
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", 100_000))
+
+# Parallel mode: processes (CSV_WORKERS, default: up to 4 cores, since each
+# holds a chunk of rows in memory), shards per worker for load balancing,
+# and the smallest shard worth a process
+CSV_WORKERS = int(os.environ.get("CSV_WORKERS", min(4, os.cpu_count() or 1)))
+SHARDS_PER_WORKER = 4
+MIN_SHARD_BYTES = 8 << 20
+
+# Read size when scanning for shard boundaries
+SCAN_BLOCK = 1 << 20
+
+# Columns converted to int (when they hold one), as in the JSON exports
+INTEGER_COLUMNS = ("LineNumber",)
+
+Source = Union[str, Path, IO[bytes]]
+
+
+def _as_int(value: Any) -> Any:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _int_column(column: pd.Series) -> pd.Series:
+    """`column` as Python ints, leaving values that aren't one unchanged."""
+    try:
+        return column.astype("int64").astype(object)
+    except (ValueError, OverflowError):
+        return column.map(_as_int).astype(object)
+
+
+def _source_size(f: IO[bytes]) -> int:
+    position = f.tell()
+    size = f.seek(0, os.SEEK_END)
+    f.seek(position)
+    return size
+
+
+def read_event_chunks(
+    f: IO[bytes],
+    chunksize: int = CSV_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """
+    The CSV in `f` as DataFrames of at most `chunksize` rows. Each chunk's
+    index continues the previous one, so it is the row's position in the file.
+    """
+    reader = pd.read_csv(f, dtype=str, keep_default_na=False, chunksize=chunksize)
+    with reader:
+        for chunk in reader:
+            # Short rows still come back as NaN, which json.dumps can't write validly
+            chunk = chunk.fillna("")
+            for column in INTEGER_COLUMNS:
+                if column in chunk.columns:
+                    chunk[column] = _int_column(chunk[column])
+            yield chunk
+
+
+def _array_element(event: Dict[str, Any]) -> str:
+    """json.dumps(event, indent=2) as an element of an indent=2 array."""
+    if not event or any(isinstance(v, (dict, list)) for v in event.values()):
+        return json.dumps(event, indent=2).replace("\n", "\n  ")
+    # Flat events (every CSV row) skip the pure-Python indenting encoder
+    dumps = json.dumps
+    return "{\n    " + ",\n    ".join(f"{dumps(k)}: {dumps(v)}" for k, v in event.items()) + "\n  }"
+
+
+def write_json_array(events: Iterable[Dict[str, Any]], path: Union[str, Path]) -> int:
+    """
+    Write `events` to `path` exactly as json.dumps(list(events), indent=2)
+    would, one event at a time. Returns the number of events written.
+    """
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for event in events:
+            f.write("[\n  " if count == 0 else ",\n  ")
+            f.write(_array_element(event))
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
+
+
+class _Run:
+    """
+    One sorted spill file of a category: lines of "time<TAB>flag<TAB>seq<TAB>event".
+    `flag` is 1 for correlation candidates so they sort after direct
+    matches with the same time; (shard, seq) is the row's position in the file.
+    """
+
+    def __init__(self, path: Path, shard: int):
+        self.path = path
+        self.shard = shard
+
+    @classmethod
+    def write(cls, path: Path, shard: int, flag: int, times: np.ndarray,
+              chunk: pd.DataFrame, rows: np.ndarray) -> "_Run":
+        order = np.lexsort((rows, times))
+        # One JSON object per line; to_json escapes non-ASCII and newlines
+        records = chunk.iloc[rows[order]].to_json(orient="records", lines=True).split("\n")
+        seqs = chunk.index.to_numpy()[rows[order]]
+        with path.open("w", encoding="utf-8", newline="") as f:
+            for time_ns, seq, record in zip(times[order], seqs, records):
+                f.write(f"{time_ns}\t{flag}\t{seq}\t{record}\n")
+        return cls(path, shard)
+
+    def __iter__(self) -> Iterator[Tuple[int, int, int, int, str]]:
+        with self.path.open(encoding="utf-8", newline="") as f:
+            for line in f:
+                time_ns, flag, seq, record = line.rstrip("\n").split("\t", 3)
+                yield int(time_ns), int(flag), self.shard, int(seq), record
+
+
+class _CategorySpill:
+    """
+    Runs and correlation state of one category across the chunks of a CSV
+    (or of one shard of it). Picklable, so shard workers can return it.
+    """
+
+    def __init__(self, name: str, spill_dir: Path, shard: int = 0):
+        self.name = name
+        self.spill_dir = spill_dir
+        self.shard = shard
+        self.runs: List[_Run] = []
+        self.anchor_times: List[np.ndarray] = []
+        self.anchor_keys: List[np.ndarray] = []
+        self.target_times: List[np.ndarray] = []
+        self.target_keys: List[np.ndarray] = []
+        self.target_rows: List[np.ndarray] = []
+
+    @property
+    def category(self) -> EventCategory:
+        return CATEGORIES[self.name]
+
+    def _spill(self, flag: int, cols: EventColumns, chunk: pd.DataFrame, mask: np.ndarray) -> np.ndarray:
+        times = cols.times_ns(mask)
+        path = self.spill_dir / f"{self.name}-{self.shard}-{len(self.runs)}.tsv"
+        self.runs.append(_Run.write(path, self.shard, flag, times, chunk, np.flatnonzero(mask)))
+        return times
+
+    def add(self, cols: EventColumns, chunk: pd.DataFrame) -> None:
+        matched = np.asarray(self.category.match(cols), dtype=bool)
+        if matched.any():
+            self._spill(0, cols, chunk, matched)
+
+        correlation = self.category.correlation
+        if correlation is None:
+            return
+        rule = correlation.rule
+        anchors = np.asarray(correlation.anchors(cols, matched), dtype=bool)
+        targets = np.asarray(correlation.targets(cols, matched), dtype=bool) & ~matched
+        if anchors.any():
+            self.anchor_times.append(cols.times_ns(anchors))
+            if rule.keyed:
+                self.anchor_keys.append(cols.column(rule.anchor_key)[anchors].to_numpy(dtype=object))
+        if targets.any():
+            # Candidates are spilled now and filtered once every anchor is known
+            self.target_times.append(self._spill(1, cols, chunk, targets))
+            # (shard, seq) of each candidate
+            seqs = chunk.index.to_numpy()[targets]
+            self.target_rows.append(np.stack([np.full(len(seqs), self.shard), seqs], axis=1))
+            if rule.keyed:
+                self.target_keys.append(cols.column(rule.target_key)[targets].to_numpy(dtype=object))
+
+    def absorb(self, other: "_CategorySpill") -> None:
+        """Add the runs and correlation state of a later shard."""
+        self.runs += other.runs
+        self.anchor_times += other.anchor_times
+        self.anchor_keys += other.anchor_keys
+        self.target_times += other.target_times
+        self.target_keys += other.target_keys
+        self.target_rows += other.target_rows
+
+    def _related_rows(self) -> set:
+        """(shard, seq) of the correlation candidates related to an anchor anywhere in the file."""
+        if not self.anchor_times or not self.target_times:
+            return set()
+        rule = self.category.correlation.rule
+        keys = ((np.concatenate(self.anchor_keys), np.concatenate(self.target_keys))
+                if rule.keyed else (None, None))
+        related = rule.related(np.concatenate(self.anchor_times), np.concatenate(self.target_times), *keys)
+        return set(map(tuple, np.concatenate(self.target_rows)[related].tolist()))
+
+    def events(self) -> Iterator[Dict[str, Any]]:
+        """Matched and related events, in the order Classification.events() gives them."""
+        related = self._related_rows()
+        for _, flag, shard, seq, record in heapq.merge(*self.runs):
+            if flag == 0 or (shard, seq) in related:
+                yield json.loads(record)
+
+
+# ─── Sharding ───
+
+def _next_record_start(f: IO[bytes], pos: int, quoted: bool) -> int:
+    """
+    Offset just past the first newline at or after `pos` that ends a record,
+    i.e. is not inside a quoted field. `quoted` is the quote state at `pos`.
+    """
+    f.seek(pos)
+    while True:
+        block = f.read(SCAN_BLOCK)
+        if not block:
+            return pos
+        i = 0
+        while True:
+            newline = block.find(b"\n", i)
+            if newline < 0:
+                quoted ^= block.count(b'"', i) & 1
+                pos += len(block)
+                break
+            quoted ^= block.count(b'"', i, newline) & 1
+            if not quoted:
+                return pos + newline + 1
+            i = newline + 1
+
+
+def shard_ranges(path: Union[str, Path], shards: int) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    Split a CSV into up to `shards` byte ranges of whole records.
+
+    Returns the header line and the (start, end) offsets of each range.
+    Boundaries are moved to the next newline outside a quoted field; the
+    quote state at each boundary is found by counting quotes from the start
+    of the file in one sequential pass (an escaped "" counts twice, so it
+    doesn't change the state).
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_end = _next_record_start(f, 0, False)
+        f.seek(0)
+        header = f.read(header_end)
+
+        targets = [header_end + (size - header_end) * i // shards for i in range(1, shards)]
+        quoted_at = []
+        pos, quoted = header_end, False
+        f.seek(pos)
+        for target in targets:
+            while pos < target:
+                block = f.read(min(SCAN_BLOCK, target - pos))
+                if not block:
+                    break
+                quoted ^= block.count(b'"') & 1
+                pos += len(block)
+            quoted_at.append(quoted)
+
+        starts = [header_end]
+        for target, quoted in zip(targets, quoted_at):
+            start = _next_record_start(f, target, quoted)
+            # A quoted field can span a whole shard; skip empty ranges
+            if starts[-1] < start < size:
+                starts.append(start)
+    return header, list(zip(starts, starts[1:] + [size]))
+
+
+class _ByteRange(io.RawIOBase):
+    """A header followed by bytes [start, end) of a file, as one readable stream."""
+
+    def __init__(self, path: Union[str, Path], start: int, end: int, header: bytes = b""):
+        self._f = open(path, "rb")
+        self._f.seek(start)
+        self._remaining = end - start
+        self._header = header
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._header:
+            n = min(len(buffer), len(self._header))
+            buffer[:n] = self._header[:n]
+            self._header = self._header[n:]
+            return n
+        n = min(len(buffer), self._remaining)
+        data = self._f.read(n)
+        buffer[:len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self) -> None:
+        self._f.close()
+        super().close()
+
+
+def _classify_shard(
+    path: str,
+    header: bytes,
+    start: int,
+    end: int,
+    names: List[str],
+    chunksize: int,
+    spill_dir: Path,
+    shard: int
+) -> List[_CategorySpill]:
+    """Worker: classify one byte range and spill its matches."""
+    spills = [_CategorySpill(name, spill_dir, shard) for name in names]
+    with io.BufferedReader(_ByteRange(path, start, end, header)) as f:
+        for chunk in read_event_chunks(f, chunksize):
+            cols = EventColumns(chunk)
+            for spill in spills:
+                spill.add(cols, chunk)
+    return spills
+
+
+def _classify_sharded(
+    path: Path,
+    names: List[str],
+    chunksize: int,
+    spill_dir: Path,
+    workers: int,
+    progress: Optional[Callable[[float], None]]
+) -> List[_CategorySpill]:
+    """Classify the shards of `path` in a process pool; returns one merged spill per category."""
+    size = os.path.getsize(path) or 1
+    shards = max(1, min(workers * SHARDS_PER_WORKER, size // MIN_SHARD_BYTES))
+    header, ranges = shard_ranges(path, shards)
+
+    results: List[Optional[List[_CategorySpill]]] = [None] * len(ranges)
+    done = 0
+    # Spawned, not forked: a fork of a threaded parent (Streamlit, the
+    # pipelines' thread pools) can inherit a lock held by another thread
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges)), mp_context=context) as pool:
+        futures = {
+            pool.submit(_classify_shard, str(path), header, start, end, names, chunksize, spill_dir, shard): shard
+            for shard, (start, end) in enumerate(ranges)
+        }
+        for future in as_completed(futures):
+            shard = futures[future]
+            results[shard] = future.result()
+            start, end = ranges[shard]
+            done += end - start
+            if progress is not None:
+                progress(min(done / size, 1.0))
+
+    # Shards in file order, so (shard, seq) keeps ties in file order
+    merged = results[0]
+    for shard_spills in results[1:]:
+        for spill, other in zip(merged, shard_spills):
+            spill.absorb(other)
+    return merged
+
+
+def classify_csv(
+    source: Source,
+    output_dir: Union[str, Path],
+    names: Optional[List[str]] = None,
+    chunksize: int = CSV_CHUNK_ROWS,
+    progress: Optional[Callable[[float], None]] = None,
+    workers: int = 1
+) -> Dict[str, Tuple[Path, int]]:
+    """
+    Classify a CSV export chunk by chunk and write each selected category's
+    events (all registered categories by default) to its file_name in
+    `output_dir`. The files hold what Classification.events() returns for
+    the whole CSV.
+
+    `source` is a path or a binary file object (e.g. Streamlit's
+    UploadedFile), read from its start. `progress`, if given, is called with
+    the fraction of the file read so far after every chunk (every shard
+    when parallel).
+
+    With `workers` > 1 the CSV is split into byte ranges of whole records
+    that are classified in a process pool; the output is the same. A file
+    object is first copied to a temporary file the workers can read.
+    Workers are spawned, so only categories registered when their modules
+    are imported are seen by them.
+
+    Returns {category name: (output path, event count)}.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    names = list(names or CATEGORIES)
+
+    with tempfile.TemporaryDirectory(prefix="csv-spill-", dir=output_dir) as spill_dir:
+        spill_dir = Path(spill_dir)
+        if workers > 1:
+            path = source
+            if not isinstance(source, (str, Path)):
+                path = spill_dir / "source.csv"
+                source.seek(0)
+                with path.open("wb") as f:
+                    shutil.copyfileobj(source, f, SCAN_BLOCK)
+            spills = _classify_sharded(Path(path), names, chunksize, spill_dir, workers, progress)
+        else:
+            spills = [_CategorySpill(name, spill_dir) for name in names]
+            f = open(source, "rb") if isinstance(source, (str, Path)) else source
+            try:
+                f.seek(0)
+                size = _source_size(f) or 1
+                for chunk in read_event_chunks(f, chunksize):
+                    cols = EventColumns(chunk)
+                    for spill in spills:
+                        spill.add(cols, chunk)
+                    if progress is not None:
+                        progress(min(f.tell() / size, 1.0))
+            finally:
+                if f is not source:
+                    f.close()
+
+        results = {}
+        for spill in spills:
+            path = output_dir / spill.category.file_name
+            results[spill.name] = (path, write_json_array(spill.events(), path))
+    if progress is not None:
+        progress(1.0)
+    return results
+
+
+if __name__ == "__main__":
+    # === CONFIGURE THESE PATHS ===
+    SOURCE_FILE = Path("./csv_data/events.csv")
+    OUTPUT_DIR = Path("./csv_data/extracted")
+    # ============================
+
+    for name, (path, count) in classify_csv(SOURCE_FILE, OUTPUT_DIR, workers=CSV_WORKERS).items():
+        print(f"{CATEGORIES[name].label}: {count} events -> {path}")
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# event_classifier.py
+"""
+Vectorized event classification over an EvtxECmd DataFrame.
+
+Every registered category is a boolean mask computed from whole columns, so
+one classify() call tags each row with all the categories it belongs to;
+Classification.events() then turns only one category's rows into dicts,
+sorted by TimeCreated. The results are the same records, in the same order, as the
+per-event filter_* functions of the Upload CSV page.
+
+New categories are added with register_category().
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from tools.correlation import RDP_LOGON_RULE, CorrelationRule
+from tools.timestamps import parse_time_series_ns
+
+
+class EventColumns:
+    """
+    Column views shared by all category masks of one classify() call.
+
+    Each column a mask looks at is factorized once into integer codes, so a
+    test like "EventId is one of ..." compares the few distinct values, then
+    the codes, instead of a string per row.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._factorized: Dict[tuple, tuple] = {}
+
+    def column(self, name: str) -> pd.Series:
+        """The column as-is, or all-None if the export doesn't have it."""
+        if name in self.df.columns:
+            return self.df[name]
+        return pd.Series([None] * len(self.df), index=self.df.index, dtype=object)
+
+    def _codes(self, name: str, as_str: bool) -> tuple:
+        key = (name, as_str)
+        if key not in self._factorized:
+            # Missing values get code -1 and never match
+            codes, uniques = pd.factorize(self.column(name))
+            values = [str(u) for u in uniques] if as_str else list(uniques)
+            self._factorized[key] = (codes, values)
+        return self._factorized[key]
+
+    def isin(self, name: str, values, as_str: bool = False) -> np.ndarray:
+        """
+        Rows whose `name` value is in `values`. With `as_str`, values are
+        compared as str(value), like str(event.get("EventId")) was.
+        """
+        codes, uniques = self._codes(name, as_str)
+        wanted = set(values)
+        hits = [i for i, value in enumerate(uniques) if value in wanted]
+        return np.isin(codes, hits)
+
+    def equals(self, name: str, value, as_str: bool = False) -> np.ndarray:
+        return self.isin(name, (value,), as_str)
+
+    def event_id_in(self, *event_ids: str) -> np.ndarray:
+        return self.isin("EventId", event_ids, as_str=True)
+
+    def provider_in(self, *providers: str) -> np.ndarray:
+        return self.isin("Provider", providers)
+
+    def times_ns(self, mask: np.ndarray) -> np.ndarray:
+        """TimeCreated as epoch ns for the rows in `mask` (MISSING_NS if unparseable)."""
+        return parse_time_series_ns(self.column("TimeCreated")[mask])
+
+
+class CategoryCorrelation:
+    """
+    Extra rows of a category: `targets` related by `rule` to its `anchors`.
+
+    Both are functions of (cols, matched) -> boolean array, where `matched`
+    is the category's own match mask; e.g. RDP anchors on its matched 1029s
+    and targets unmatched 4648s. Keeping anchors and targets separate lets
+    a chunked pass (tools.csv_ingest) collect them across chunks and join
+    them once at the end.
+    """
+
+    def __init__(
+        self,
+        rule: CorrelationRule,
+        anchors: Callable[[EventColumns, np.ndarray], np.ndarray],
+        targets: Callable[[EventColumns, np.ndarray], np.ndarray]
+    ):
+        self.rule = rule
+        self.anchors = anchors
+        self.targets = targets
+
+
+class EventCategory:
+    """
+    A named selection of events.
+
+    `match(cols)` returns a boolean array over the rows. `correlation`, if
+    given, adds rows that belong to the category because of their relation
+    to matched rows (e.g. RDP's 4648 logons). Correlated rows sort after
+    directly matched rows with the same time.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        file_name: str,
+        match: Callable[[EventColumns], np.ndarray],
+        correlation: Optional[CategoryCorrelation] = None
+    ):
+        self.name = name
+        self.label = label
+        self.file_name = file_name
+        self.match = match
+        self.correlation = correlation
+
+
+CATEGORIES: Dict[str, EventCategory] = {}
+
+
+def register_category(category: EventCategory) -> EventCategory:
+    """Add (or replace) a category; classify() evaluates them in registration order."""
+    CATEGORIES[category.name] = category
+    return category
+
+
+# ─── Built-in categories ───
+
+RDP_EVENT_IDS = (
+    "21", "22", "23", "24", "25", "39", "40",
+    "1024", "1025", "1026", "1027", "1028", "1029", "1102", "1103"
+)
+RDP_PROVIDERS = (
+    "Microsoft-Windows-TerminalServices-LocalSessionManager",
+    "Microsoft-Windows-TerminalServices-ClientActiveXCore"
+)
+SYSMON_PROVIDER = "Microsoft-Windows-Sysmon"
+TASK_SCHEDULER_PROVIDER = "Microsoft-Windows-TaskScheduler"
+
+
+def _rdp_match(cols: EventColumns) -> np.ndarray:
+    sysmon_rdp = (
+        cols.provider_in(SYSMON_PROVIDER)
+        & cols.event_id_in("3")
+        & cols.equals("PayloadData2", "RuleName: RDP")
+    )
+    terminal_services = cols.provider_in(*RDP_PROVIDERS) & cols.event_id_in(*RDP_EVENT_IDS)
+    return sysmon_rdp | terminal_services
+
+
+def correlate_rows(
+    cols: EventColumns,
+    rule: CorrelationRule,
+    anchors: np.ndarray,
+    targets: np.ndarray
+) -> np.ndarray:
+    """Rows in the `targets` mask that `rule` relates to a row in the `anchors` mask."""
+    related = np.zeros(len(targets), dtype=bool)
+    if not anchors.any() or not targets.any():
+        return related
+    keys = ((cols.column(rule.anchor_key)[anchors], cols.column(rule.target_key)[targets])
+            if rule.keyed else (None, None))
+    hit = rule.related(cols.times_ns(anchors), cols.times_ns(targets), *keys)
+    related[np.flatnonzero(targets)[hit]] = True
+    return related
+
+
+register_category(EventCategory(
+    name="rdp",
+    label="RDP",
+    file_name="RDP_events.json",
+    match=_rdp_match,
+    correlation=CategoryCorrelation(
+        RDP_LOGON_RULE,
+        anchors=lambda cols, rdp: rdp & cols.event_id_in("1029"),
+        targets=lambda cols, rdp: ~rdp & cols.event_id_in("4648"),
+    ),
+))
+register_category(EventCategory(
+    name="powershell",
+    label="PowerShell",
+    file_name="PowerShell_events.json",
+    match=lambda cols: cols.event_id_in("4103", "4104"),
+))
+register_category(EventCategory(
+    name="task_scheduler",
+    label="Task Scheduler",
+    file_name="TaskScheduler_events.json",
+    match=lambda cols: cols.provider_in(TASK_SCHEDULER_PROVIDER),
+))
+
+
+# ─── Classification ───
+
+class Classification:
+    """Per-category row masks of one DataFrame, from classify()."""
+
+    def __init__(self, df: pd.DataFrame, cols: EventColumns, matched: Dict[str, np.ndarray],
+                 correlated: Dict[str, np.ndarray]):
+        self.df = df
+        self.cols = cols
+        self.matched = matched
+        self.correlated = correlated
+
+    def mask(self, name: str) -> np.ndarray:
+        return self.matched[name] | self.correlated[name]
+
+    def counts(self) -> Dict[str, int]:
+        return {name: int(self.mask(name).sum()) for name in self.matched}
+
+    def tags(self) -> pd.Series:
+        """Comma-separated category names of every row ("" if none)."""
+        tags = pd.Series("", index=self.df.index)
+        for name in self.matched:
+            hit = self.mask(name)
+            tags[hit] = np.where(tags[hit] == "", name, tags[hit] + "," + name)
+        return tags
+
+    def events(self, name: str) -> List[Dict[str, Any]]:
+        """The category's rows as dicts, stably sorted by TimeCreated."""
+        matched, correlated = self.matched[name], self.correlated[name]
+        rows = np.flatnonzero(matched | correlated)
+        times = self.cols.times_ns(matched | correlated)
+        # Same order as sorting direct matches followed by correlated rows
+        order = np.lexsort((rows, correlated[rows] & ~matched[rows], times))
+        return self.df.iloc[rows[order]].to_dict(orient="records")
+
+
+def classify(df: pd.DataFrame, names: Optional[List[str]] = None) -> Classification:
+    """Evaluate the registered categories (or just `names`) over `df` in one pass."""
+    selected = [CATEGORIES[n] for n in (names or CATEGORIES)]
+    cols = EventColumns(df)
+    matched = {c.name: np.asarray(c.match(cols), dtype=bool) for c in selected}
+    correlated = {}
+    for c in selected:
+        related = np.zeros(len(df), dtype=bool)
+        if c.correlation is not None:
+            m = matched[c.name]
+            related = correlate_rows(
+                cols, c.correlation.rule, c.correlation.anchors(cols, m), c.correlation.targets(cols, m)
+            ) & ~m
+        correlated[c.name] = related
+    return Classification(df, cols, matched, correlated)
+
+
+def category_events(df: pd.DataFrame, name: str) -> List[Dict[str, Any]]:
+    """Events of one category, for callers that only need that one."""
+    return classify(df, [name]).events(name)
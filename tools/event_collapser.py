@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# event_collapser.py
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from tools.json_stream import iter_json_array
+from tools.timestamps import parse_time_ns
+
+# Fields that make up an event's signature. PayloadData1 carries the task
+# path for Task Scheduler events; PayloadData2-6 carry result codes and
+# actions, so a failed or unusual run isn't folded into the benign group;
+# ExecutableInfo keeps tasks whose action changed apart as well.
+SIGNATURE_FIELDS = ("Provider", "EventId", "PayloadData1", "PayloadData2", "PayloadData3",
+                    "PayloadData4", "PayloadData5", "PayloadData6", "ExecutableInfo")
+
+# Detail fields whose numbers (process IDs, durations, counters) are masked
+# as well as their GUIDs; the task path in PayloadData1 only has GUIDs masked
+DETAIL_FIELDS = frozenset(("PayloadData2", "PayloadData3", "PayloadData4",
+                           "PayloadData5", "PayloadData6"))
+
+# GUIDs ({...} task suffixes, instance IDs) vary per run of the same task
+GUID_PATTERN = re.compile(
+    r"\{?[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}\}?"
+)
+
+# Variable parts masked inside a value or token. Order matters: GUIDs first
+# so their hex groups are not masked as numbers.
+MASKS = (
+    (re.compile(r"[0-9A-Fa-f]{8}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{4}-[0-9A-Fa-f]{12}"), "<GUID>"),
+    (re.compile(r"0[xX][0-9A-Fa-f]+"), "<HEX>"),
+    (re.compile(r"\d+"), "<NUM>"),
+)
+
+# Result, return, exit, error and status codes set a failed run apart from
+# the normal ones, so their values are kept when a detail field is masked
+CODE_PATTERN = re.compile(r"\b(?:Result|Return|Exit|Error|Status)\s*Code\s*[:=]?\s*[-\w]+", re.IGNORECASE)
+
+
+def _mask(text: str) -> str:
+    for pattern, repl in MASKS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def normalize_value(value: Any, mask_numbers: bool = False) -> str:
+    """
+    Mask GUIDs/instance IDs so repeated runs of a task compare equal; with
+    `mask_numbers`, also hex values and numbers outside result/status codes.
+    """
+    if not mask_numbers:
+        return GUID_PATTERN.sub("<GUID>", str(value))
+    text = str(value)
+    parts = []
+    last = 0
+    for code in CODE_PATTERN.finditer(text):
+        parts.append(_mask(text[last:code.start()]))
+        parts.append(code.group())
+        last = code.end()
+    parts.append(_mask(text[last:]))
+    return "".join(parts)
+
+
+def event_signature(event: Dict[str, Any], fields: Sequence[str] = SIGNATURE_FIELDS) -> Tuple[str, ...]:
+    """Return the normalized signature tuple of an event."""
+    return tuple(normalize_value(event.get(f, ""), f in DETAIL_FIELDS) for f in fields)
+
+
+def collapse_events(
+    events: Iterable[Dict[str, Any]],
+    min_count: int = 2,
+    fields: Sequence[str] = SIGNATURE_FIELDS,
+    groups: Optional[Dict[int, List[int]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Group events by normalized signature and replace each group of at least
+    `min_count` events with one record: a copy of its first event plus
+
+      - Count       (int)   number of member events
+      - FirstTime   (str)   earliest TimeCreated in the group
+      - LastTime    (str)   latest TimeCreated in the group
+
+    Smaller groups are passed through unchanged. Output keeps input order,
+    with each collapsed record at the position of its first member.
+
+    Member LineNumbers are kept out of the records, which go to the LLM; if
+    `groups` is given, it is filled with each collapsed record's LineNumber
+    -> the LineNumbers of its members, in input order (see write_groups).
+
+    Args:
+        events: Iterable of EvtxECmd events (may be a lazy stream)
+        min_count: Minimum group size to collapse (default: 2)
+        fields: Event fields forming the signature (default: SIGNATURE_FIELDS)
+        groups: Optional dict to receive the group members
+    """
+    by_signature: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+
+    for index, ev in enumerate(events):
+        sig = event_signature(ev, fields)
+        t = parse_time_ns(ev.get("TimeCreated"))
+        group = by_signature.get(sig)
+        if group is None:
+            by_signature[sig] = {
+                "index": index,
+                "first": ev,
+                "count": 1,
+                "line_numbers": [ev.get("LineNumber")],
+                "min": (t, ev.get("TimeCreated")),
+                "max": (t, ev.get("TimeCreated")),
+                # Members are kept only until the group is large enough to collapse
+                "members": [(index, ev)],
+            }
+            continue
+
+        group["count"] += 1
+        group["line_numbers"].append(ev.get("LineNumber"))
+        if t is not None:
+            if group["min"][0] is None or t < group["min"][0]:
+                group["min"] = (t, ev.get("TimeCreated"))
+            if group["max"][0] is None or t > group["max"][0]:
+                group["max"] = (t, ev.get("TimeCreated"))
+        if group["members"] is not None:
+            if group["count"] >= min_count:
+                group["members"] = None
+            else:
+                group["members"].append((index, ev))
+
+    ordered: List[Tuple[int, Dict[str, Any]]] = []
+    for group in by_signature.values():
+        if group["members"] is not None:
+            ordered.extend(group["members"])
+            continue
+        rec = dict(group["first"])
+        rec["Count"] = group["count"]
+        rec["FirstTime"] = group["min"][1]
+        rec["LastTime"] = group["max"][1]
+        if groups is not None:
+            add_group(groups, rec.get("LineNumber"), group["line_numbers"])
+        # Collapsed records sit where their first member was
+        ordered.append((group["index"], rec))
+
+    return [rec for _, rec in sorted(ordered, key=lambda item: item[0])]
+
+
+def collapse_file(
+    input_file: Union[str, Path],
+    output_file: Union[str, Path],
+    min_count: int = 2
+) -> int:
+    """
+    Stream `input_file` (a JSON array of events), collapse repetitive events
+    and write the reduced array to `output_file`, and the members of each
+    collapsed record to its groups sidecar (see groups_path).
+
+    Returns:
+        int: Number of records written.
+    """
+    groups: Dict[int, List[int]] = {}
+    records = collapse_events(iter_json_array(input_file), min_count=min_count, groups=groups)
+
+    out_path = Path(output_file)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2, ensure_ascii=False)
+    write_groups(output_file, groups)
+
+    total = sum(rec.get("Count", 1) for rec in records)
+    print(f"Collapsed {total} events into {len(records)} records in {output_file}")
+    return len(records)
+
+
+def groups_path(reduced_file: Union[str, Path]) -> Path:
+    """Sidecar of a reduced log holding its group members: reduced.json -> reduced.groups.json."""
+    reduced_file = Path(reduced_file)
+    return reduced_file.with_name(reduced_file.stem + ".groups.json")
+
+
+def add_group(groups: Dict[int, List[int]], line_number: Any, members: Iterable[Any]) -> None:
+    """Record a reduced record's members; records or members without an integer LineNumber are skipped."""
+    try:
+        key = int(line_number)
+    except (TypeError, ValueError):
+        return
+    numbers = []
+    for n in members:
+        try:
+            numbers.append(int(n))
+        except (TypeError, ValueError):
+            continue
+    groups[key] = numbers
+
+
+def write_groups(reduced_file: Union[str, Path], groups: Dict[int, List[int]]) -> Path:
+    """Write the group members of `reduced_file` to its sidecar; returns the sidecar path."""
+    path = groups_path(reduced_file)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({str(k): v for k, v in groups.items()}, f)
+    return path
+
+
+def group_line_numbers(reduced_file: Union[str, Path]) -> Dict[int, List[int]]:
+    """
+    Map each collapsed (or template) record's LineNumber to the LineNumbers
+    of its members, read from the sidecar of `reduced_file`. Empty if the
+    sidecar doesn't exist (nothing was grouped).
+    """
+    path = groups_path(reduced_file)
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+
+if __name__ == "__main__":
+    # === CONFIGURE THESE PATHS ===
+    INPUT_FILE  = Path("./json_data2/mediumCSV-2.json")
+    OUTPUT_FILE = Path("./json_data2/mediumCSV-2-collapsed.json")
+    # ============================
+
+    collapse_file(INPUT_FILE, OUTPUT_FILE)
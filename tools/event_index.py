@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# event_index.py
+"""
+Sidecar LineNumber index for random access into an events JSON array.
+
+The index file is a fixed header followed by (LineNumber, byte offset, byte
+length) records sorted by LineNumber, so a lookup is a binary search over the
+memory-mapped index and a slice of the memory-mapped log: fetching k events
+costs O(k log n) and never parses the rest of the file.
+
+The header records the size and mtime of the log it was built from;
+EventIndex refuses a stale index.
+"""
+import bisect
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union
+
+from tools.json_stream import iter_json_array_with_offsets
+
+MAGIC = b"EVTIDX01"
+_HEADER = struct.Struct("<8sQq")   # magic, source size, source mtime (ns)
+_ENTRY = struct.Struct("<qQQ")     # LineNumber, byte offset, byte length
+
+
+def offset_index_path(source_file: Union[str, Path]) -> Path:
+    """Default sidecar location: <log>.json.lnidx next to the log."""
+    source_file = Path(source_file)
+    return source_file.with_name(source_file.name + ".lnidx")
+
+
+def _source_stamp(source_file: Path) -> Tuple[int, int]:
+    stat = source_file.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+
+class OffsetIndexWriter:
+    """
+    Collects (LineNumber, offset, length) entries while a log is being read
+    (see tools.split_jsonToFit.iter_parts) and writes the sorted index on
+    close(). Events without an integer LineNumber are not indexed.
+    """
+
+    def __init__(self, source_file: Union[str, Path], index_file: Union[str, Path, None] = None):
+        self.source_file = Path(source_file)
+        self.index_file = Path(index_file) if index_file else offset_index_path(source_file)
+        self.entries: List[Tuple[int, int, int]] = []
+
+    def add(self, event: Any, offset: int, length: int) -> None:
+        try:
+            line_number = int(event.get("LineNumber"))
+        except (AttributeError, TypeError, ValueError):
+            return
+        self.entries.append((line_number, offset, length))
+
+    def close(self) -> Path:
+        self.entries.sort()
+        size, mtime_ns = _source_stamp(self.source_file)
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_file.with_name(self.index_file.name + ".tmp")
+        with tmp_path.open("wb") as f:
+            f.write(_HEADER.pack(MAGIC, size, mtime_ns))
+            for entry in self.entries:
+                f.write(_ENTRY.pack(*entry))
+        os.replace(tmp_path, self.index_file)
+        print(f"Indexed {len(self.entries)} events of {self.source_file} in {self.index_file}")
+        return self.index_file
+
+
+def iter_indexed_events(
+    source_file: Union[str, Path],
+    writer: OffsetIndexWriter
+) -> Iterator[Any]:
+    """Stream the events of `source_file`, adding each to `writer`; the index is written at the end."""
+    for event, offset, length in iter_json_array_with_offsets(source_file):
+        writer.add(event, offset, length)
+        yield event
+    writer.close()
+
+
+def build_offset_index(
+    source_file: Union[str, Path],
+    index_file: Union[str, Path, None] = None
+) -> Path:
+    """Index an existing log in one streaming pass; returns the index path."""
+    writer = OffsetIndexWriter(source_file, index_file)
+    for _ in iter_indexed_events(source_file, writer):
+        pass
+    return writer.index_file
+
+
+def index_is_current(
+    source_file: Union[str, Path],
+    index_file: Union[str, Path, None] = None
+) -> bool:
+    """True if the index exists and was built from the log as it is now."""
+    index_file = Path(index_file) if index_file else offset_index_path(source_file)
+    try:
+        with index_file.open("rb") as f:
+            magic, size, mtime_ns = _HEADER.unpack(f.read(_HEADER.size))
+    except (OSError, struct.error):
+        return False
+    return magic == MAGIC and (size, mtime_ns) == _source_stamp(Path(source_file))
+
+
+class EventIndex:
+    """
+    Random access to the events of a log through its offset index.
+
+        with EventIndex(log_file) as index:
+            events = index.fetch([12, 4051, 90210])
+    """
+
+    def __init__(self, source_file: Union[str, Path], index_file: Union[str, Path, None] = None):
+        self.source_file = Path(source_file)
+        self.index_file = Path(index_file) if index_file else offset_index_path(source_file)
+        if not index_is_current(self.source_file, self.index_file):
+            raise ValueError(f"{self.index_file} is missing or out of date for {self.source_file}")
+
+        self._index_fh = self.index_file.open("rb")
+        self._source_fh = self.source_file.open("rb")
+        self._index = mmap.mmap(self._index_fh.fileno(), 0, access=mmap.ACCESS_READ)
+        # mmap rejects empty files; an empty log has nothing to fetch anyway
+        self._source = (mmap.mmap(self._source_fh.fileno(), 0, access=mmap.ACCESS_READ)
+                        if self.source_file.stat().st_size else b"")
+        self._count = (len(self._index) - _HEADER.size) // _ENTRY.size
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> Tuple[int, int, int]:
+        return _ENTRY.unpack_from(self._index, _HEADER.size + i * _ENTRY.size)
+
+    def _line_number(self, i: int) -> int:
+        return self._entry(i)[0]
+
+    def locate(self, line_number: int) -> List[Tuple[int, int]]:
+        """(offset, length) of every event with this LineNumber."""
+        lo = bisect.bisect_left(range(self._count), line_number, key=self._line_number)
+        found = []
+        while lo < self._count:
+            entry_line, offset, length = self._entry(lo)
+            if entry_line != line_number:
+                break
+            found.append((offset, length))
+            lo += 1
+        return found
+
+    def read(self, offset: int, length: int) -> Dict[str, Any]:
+        return json.loads(self._source[offset:offset + length])
+
+    def fetch(self, line_numbers: Iterable[int]) -> List[Dict[str, Any]]:
+        """Events with any of `line_numbers`, in file order."""
+        locations = sorted({loc for ln in set(line_numbers) for loc in self.locate(int(ln))})
+        return [self.read(offset, length) for offset, length in locations]
+
+    def close(self) -> None:
+        if isinstance(self._source, mmap.mmap):
+            self._source.close()
+        self._index.close()
+        self._source_fh.close()
+        self._index_fh.close()
+
+    def __enter__(self) -> "EventIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    # === CONFIGURE THESE PATHS ===
+    SOURCE_FILE = Path("./json_data2/mediumCSV-2.json")
+    # ============================
+
+    build_offset_index(SOURCE_FILE)
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# event_store.py
+"""
+Indexed SQLite store for EvtxECmd event logs.
+
+A CSV or JSON log is ingested once into a database named after the SHA-256
+of its contents, under EVENT_STORE_DIR (default .cache/event_store), so
+uploading or analysing the same host's log again reopens the existing store
+instead of re-parsing it. Once the stores exceed EVENT_STORE_MAX_BYTES, the
+least recently used ones are deleted. Each event is kept as its original JSON next to
+indexed EventId, Provider, TimeCreated (epoch ns) and LineNumber columns;
+filters, the splitter and the extractor read events back through queries.
+"""
+import codecs
+import hashlib
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple, Union
+
+import pandas as pd
+
+from tools.json_stream import iter_json_array
+from tools.timestamps import MISSING_NS, parse_time_ns
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = Path(os.environ.get("EVENT_STORE_DIR", ".cache/event_store"))
+DEFAULT_MAX_BYTES = int(os.environ.get("EVENT_STORE_MAX_BYTES", 10 << 30))
+
+# Bump when the schema changes so old stores are rebuilt
+SCHEMA_VERSION = 1
+
+# Rows inserted per transaction while ingesting
+INSERT_BATCH = 10_000
+
+# Values bound per "IN (...)" lookup, under SQLite's variable limit
+LOOKUP_BATCH = 900
+
+Source = Union[str, Path, bytes, io.IOBase]
+
+
+def _read_bytes(source: Source) -> bytes:
+    if isinstance(source, (str, Path)):
+        return Path(source).read_bytes()
+    if isinstance(source, bytes):
+        return source
+    # Streamlit's UploadedFile and other in-memory buffers
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    source.seek(0)
+    return source.read()
+
+
+def source_digest(source: Source) -> str:
+    """SHA-256 of the log's contents; names its store."""
+    if isinstance(source, (str, Path)):
+        digest = hashlib.sha256()
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    return hashlib.sha256(_read_bytes(source)).hexdigest()
+
+
+def _is_json(data: bytes, name: str = "") -> bool:
+    if name.lower().endswith(".json"):
+        return True
+    if name.lower().endswith(".csv"):
+        return False
+    data = data.lstrip()
+    if data.startswith(codecs.BOM_UTF8):
+        data = data[len(codecs.BOM_UTF8):].lstrip()
+    return data[:1] == b"["
+
+
+def iter_source_events(source: Source, name: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Events of a CSV or JSON log, with the values the rest of the pipeline
+    sees: a JSON array's elements as-is, CSV rows as pandas.read_csv parses
+    them.
+    """
+    if isinstance(source, (str, Path)):
+        name = name or str(source)
+        with open(source, "rb") as f:
+            head = f.read(64)
+        if _is_json(head, name):
+            yield from iter_json_array(source)
+            return
+        csv_source = source
+    else:
+        data = _read_bytes(source)
+        name = name or getattr(source, "name", "")
+        if _is_json(data, name):
+            yield from json.loads(data)
+            return
+        csv_source = io.BytesIO(data)
+
+    yield from pd.read_csv(csv_source).to_dict(orient="records")
+
+
+def _event_row(seq: int, event: Dict[str, Any]) -> tuple:
+    try:
+        line_number = int(event.get("LineNumber"))
+    except (TypeError, ValueError):
+        line_number = None
+    event_id = event.get("EventId")
+    time_ns = parse_time_ns(event.get("TimeCreated"))
+    return (
+        seq,
+        line_number,
+        None if event_id is None else str(event_id),
+        event.get("Provider"),
+        MISSING_NS if time_ns is None else time_ns,
+        json.dumps(event, ensure_ascii=False),
+    )
+
+
+class EventStore:
+    """
+    One ingested log in a SQLite file.
+
+    Events come back as the dicts that were ingested. `seq` is the event's
+    position in the source, so ordering by it reproduces file order;
+    ordering by (time_ns, seq) reproduces a stable sort on TimeCreated with
+    unparseable times first. Safe to share between threads.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+
+    @classmethod
+    def create(cls, path: Union[str, Path], events: Iterable[Dict[str, Any]], **meta: Any) -> "EventStore":
+        """Build a store at `path` from `events` (replacing any existing file)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.unlink(missing_ok=True)
+
+        conn = sqlite3.connect(str(tmp_path))
+        try:
+            conn.execute("PRAGMA journal_mode=OFF")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                """CREATE TABLE events (
+                       seq INTEGER PRIMARY KEY,
+                       line_number INTEGER,
+                       event_id TEXT,
+                       provider TEXT,
+                       time_ns INTEGER NOT NULL,
+                       event TEXT NOT NULL
+                   )"""
+            )
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+            batch = []
+            count = 0
+            for seq, event in enumerate(events):
+                batch.append(_event_row(seq, event))
+                if len(batch) >= INSERT_BATCH:
+                    conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", batch)
+                    count += len(batch)
+                    batch = []
+            conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", batch)
+            count += len(batch)
+
+            # Indexes are cheaper to build once over the loaded table
+            conn.execute("CREATE INDEX events_event_id ON events (event_id, time_ns)")
+            conn.execute("CREATE INDEX events_provider ON events (provider, event_id)")
+            conn.execute("CREATE INDEX events_time ON events (time_ns)")
+            conn.execute("CREATE INDEX events_line_number ON events (line_number)")
+            conn.executemany(
+                "INSERT INTO meta VALUES (?, ?)",
+                [(k, json.dumps(v)) for k, v in {**meta, "schema": SCHEMA_VERSION, "events": count}.items()],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, path)
+        logger.info(f"Ingested {count} events into {path}")
+        return cls(path)
+
+    def meta(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __len__(self) -> int:
+        return self.meta("events", 0)
+
+    def query(
+        self,
+        where: str = "1",
+        params: Sequence[Any] = (),
+        order_by: str = "seq",
+        limit: int = -1
+    ) -> List[Dict[str, Any]]:
+        """
+        Events matching an SQL condition over the events table's columns
+        (seq, line_number, event_id, provider, time_ns).
+        """
+        return list(self.iter_query(where, params, order_by, limit))
+
+    def iter_query(
+        self,
+        where: str = "1",
+        params: Sequence[Any] = (),
+        order_by: str = "seq",
+        limit: int = -1
+    ) -> Iterator[Dict[str, Any]]:
+        """query(), decoding rows as they are consumed (e.g. by the splitter)."""
+        for _, event in self._iter_rows(where, params, order_by, limit):
+            yield event
+
+    def _iter_rows(
+        self,
+        where: str,
+        params: Sequence[Any],
+        order_by: str,
+        limit: int = -1
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        sql = f"SELECT seq, event FROM events WHERE {where} ORDER BY {order_by} LIMIT ?"
+        with self._lock:
+            cursor = self._conn.execute(sql, (*params, limit))
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(1000)
+            if not rows:
+                return
+            for seq, event in rows:
+                yield seq, json.loads(event)
+
+    def iter_events(self) -> Iterator[Dict[str, Any]]:
+        """Every event, in source order."""
+        return self.iter_query()
+
+    def by_line_numbers(self, line_numbers: Iterable[int]) -> List[Dict[str, Any]]:
+        """Events with any of `line_numbers`, in source order."""
+        numbers = sorted({int(n) for n in line_numbers})
+        rows = []
+        for i in range(0, len(numbers), LOOKUP_BATCH):
+            batch = numbers[i:i + LOOKUP_BATCH]
+            rows += self._iter_rows(f"line_number IN ({', '.join('?' * len(batch))})", batch, "seq")
+        rows.sort(key=lambda row: row[0])
+        return [event for _, event in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "EventStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def evict_stores(
+    store_dir: Union[str, Path] = DEFAULT_STORE_DIR,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    keep: Iterable[Union[str, Path]] = ()
+) -> List[Path]:
+    """
+    Delete the least recently used stores in `store_dir` (by modification
+    time, which open_event_store refreshes on reuse) until the rest fit in
+    `max_bytes`. Stores in `keep` are never deleted, nor are stores another
+    process still holds open on platforms that lock them. Returns the
+    deleted paths.
+    """
+    keep = {Path(p).resolve() for p in keep}
+    stores = []
+    for path in Path(store_dir).glob("*.sqlite"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        stores.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in stores)
+    evicted = []
+    for _, size, path in sorted(stores):
+        if total <= max_bytes:
+            break
+        if path.resolve() in keep:
+            continue
+        try:
+            path.unlink()
+        except OSError as e:
+            logger.warning(f"Could not evict event store {path}: {e}")
+            continue
+        total -= size
+        evicted.append(path)
+    if evicted:
+        logger.info(f"Evicted {len(evicted)} event store(s) from {store_dir}")
+    return evicted
+
+
+def open_event_store(
+    source: Source,
+    name: str = "",
+    store_dir: Union[str, Path] = DEFAULT_STORE_DIR,
+    max_bytes: int = DEFAULT_MAX_BYTES
+) -> EventStore:
+    """
+    Return the store for `source` (a path, bytes or an uploaded file),
+    ingesting it only if no store exists yet for its contents. `name` is
+    used to tell CSV from JSON when `source` has no file name. After a new
+    store is built, older stores are evicted down to `max_bytes` (see
+    evict_stores).
+    """
+    digest = source_digest(source)
+    path = Path(store_dir) / f"{digest}.sqlite"
+    if path.exists():
+        store = EventStore(path)
+        try:
+            if store.meta("schema") == SCHEMA_VERSION:
+                logger.info(f"Reusing event store {path}")
+                # Marks it recently used for evict_stores
+                os.utime(path)
+                return store
+        except sqlite3.Error:
+            pass
+        store.close()
+
+    source_name = name or (str(source) if isinstance(source, (str, Path)) else getattr(source, "name", ""))
+    store = EventStore.create(
+        path,
+        iter_source_events(source, name),
+        source=source_name,
+        sha256=digest,
+    )
+    evict_stores(store_dir, max_bytes, keep=[path])
+    return store
+
+
+if __name__ == "__main__":
+    # === CONFIGURE THESE PATHS ===
+    SOURCE_FILE = Path("./json_data2/mediumCSV-2.json")
+    # ============================
+
+    logging.basicConfig(level=logging.INFO)
+    with open_event_store(SOURCE_FILE) as store:
+        print(f"{len(store)} events in {store.path}")
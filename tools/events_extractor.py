@@ -2,7 +2,11 @@
 
 import json
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
+
+from tools.event_collapser import group_line_numbers
+from tools.event_index import EventIndex, build_offset_index, index_is_current
+from tools.event_store import EventStore
 
 def load_json(path: Path) -> Union[Dict[str, Any], List[Any]]:
     """
@@ -20,20 +24,37 @@ def save_json(path: Path, data: Union[Dict[str, Any], List[Any]]) -> None:
     with path.open('w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
 
+def flagged_line_numbers(
+    flagged_json: Dict[str, Any],
+    groups: Optional[Dict[int, List[int]]] = None
+) -> set:
+    """LineNumbers extract_matches selects: the flagged records plus expanded groups."""
+    record_numbers = set()
+    for rec in flagged_json.get("consolidated_flagged_records", []):
+        try:
+            record_numbers.add(int(rec["LineNumber"]))
+        except (KeyError, TypeError, ValueError):
+            continue
+    if groups:
+        for rn in list(record_numbers):
+            record_numbers.update(groups.get(rn, ()))
+    return record_numbers
+
 def extract_matches(
     flagged_json: Dict[str, Any],
-    all_events: List[Dict[str, Any]]
+    all_events: List[Dict[str, Any]],
+    groups: Optional[Dict[int, List[int]]] = None
 ) -> List[Dict[str, Any]]:
     """
     Given a flagged JSON dict (with a "consolidated_flagged_records" list)
     and the full events list, return those events whose LineNumber appears
     among the flagged records.
+
+    If `groups` (collapsed record LineNumber -> member LineNumbers, see
+    tools.event_collapser.group_line_numbers) is given, a flagged collapsed
+    record is expanded to all of its member events.
     """
-    record_numbers = {
-        rec["LineNumber"]
-        for rec in flagged_json.get("consolidated_flagged_records", [])
-        if "LineNumber" in rec
-    }
+    record_numbers = flagged_line_numbers(flagged_json, groups)
 
     matched: List[Dict[str, Any]] = []
     for evt in all_events:
@@ -51,24 +72,48 @@ def extract_matches(
 def extract_events(
     flagged_file: Union[str, Path],
     og_json_path: Union[str, Path],
-    output_file: Union[str, Path]
+    output_file: Union[str, Path],
+    collapsed_file: Optional[Union[str, Path]] = None,
+    index_file: Optional[Union[str, Path]] = None,
+    store: Optional[EventStore] = None
 ) -> None:
     """
     Load `og_json_path` (the master events list) and `flagged_file` (which
     must contain a "consolidated_flagged_records" list with LineNumber fields),
     extract matching events, sort them by their "TimeCreated" field, and
     write the result to `output_file`.
+
+    If the first pass ran on collapsed events, pass the collapsed JSON as
+    `collapsed_file` so flagged groups expand back to their original events
+    (their members are read from its groups sidecar, see
+    tools.event_collapser.groups_path).
+
+    If `index_file` (a LineNumber offset index, see tools.event_index) is
+    given, matching events are read straight from their byte ranges in
+    `og_json_path` instead of parsing the whole log; the index is built
+    first if it is missing or older than the log. If `store` (the log
+    ingested with tools.event_store) is given, they are looked up there by
+    LineNumber instead. The output is the same either way.
     """
     flagged_file = Path(flagged_file)
     og_json_path = Path(og_json_path)
     output_file = Path(output_file)
 
-    # 1. Load all events
-    all_events = load_json(og_json_path)
-
-    # 2. Load flagged records and extract matches
+    # 1. Load flagged records
     flagged = load_json(flagged_file)
-    matches = extract_matches(flagged, all_events)
+    groups = group_line_numbers(collapsed_file) if collapsed_file else None
+
+    # 2. Extract matches, by index lookup or by scanning all events
+    if store is not None:
+        matches = store.by_line_numbers(flagged_line_numbers(flagged, groups))
+    elif index_file is not None:
+        if not index_is_current(og_json_path, index_file):
+            build_offset_index(og_json_path, index_file)
+        with EventIndex(og_json_path, index_file) as index:
+            matches = index.fetch(flagged_line_numbers(flagged, groups))
+    else:
+        all_events = load_json(og_json_path)
+        matches = extract_matches(flagged, all_events, groups)
     print(f"[{flagged_file.name}] → {len(matches)} matched records")
 
     # 3. Sort matches by timestamp
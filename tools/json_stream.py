@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# json_stream.py
+
+import codecs
+import json
+from pathlib import Path
+from typing import Any, Iterator, Tuple, Union
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+
+
+def iter_json_array(
+    input_file: Union[str, Path],
+    chunk_size: int = 1 << 20
+) -> Iterator[Any]:
+    """
+    Yield the elements of a top-level JSON array one at a time.
+
+    The file is read in `chunk_size` character blocks and each element is
+    decoded with `json.JSONDecoder.raw_decode` as soon as it is complete, so
+    only the current element (plus at most one read block) is held in memory
+    instead of the whole array.
+
+    Args:
+        input_file: Path to a JSON file whose top level is an array
+        chunk_size: Number of characters to read per block (default: 1 MiB)
+
+    Yields:
+        Each decoded array element, in file order.
+
+    Raises:
+        ValueError: If the file does not contain a well-formed top-level array.
+    """
+    for obj, _, _ in _iter_array(input_file, chunk_size, with_offsets=False):
+        yield obj
+
+
+def iter_json_array_with_offsets(
+    input_file: Union[str, Path],
+    chunk_size: int = 1 << 20
+) -> Iterator[Tuple[Any, int, int]]:
+    """
+    Like iter_json_array, but yield (element, byte_offset, byte_length) so the
+    element can later be re-read from the file by seeking to
+    file[byte_offset:byte_offset + byte_length] (see tools.event_index).
+    """
+    yield from _iter_array(input_file, chunk_size, with_offsets=True)
+
+
+def _iter_array(
+    input_file: Union[str, Path],
+    chunk_size: int,
+    with_offsets: bool
+) -> Iterator[Tuple[Any, int, int]]:
+    # newline="" keeps "\r\n" untranslated so character counts match the bytes on disk
+    with open(input_file, "r", encoding="utf-8", newline="") as f:
+        buf = f.read(chunk_size)
+        pos = 0
+        eof = not buf
+        # Byte offset in the file of buf[pos]; everything between elements is ASCII
+        byte_pos = 0
+
+        def fill(needed: int = 1) -> bool:
+            """Read blocks until `needed` chars are buffered past pos; False at EOF."""
+            nonlocal buf, pos, eof
+            while len(buf) - pos < needed and not eof:
+                block = f.read(max(chunk_size, needed))
+                if not block:
+                    eof = True
+                    break
+                # Drop the consumed prefix before growing the buffer
+                buf = buf[pos:] + block
+                pos = 0
+            return len(buf) - pos >= needed
+
+        def skip_ws() -> None:
+            nonlocal pos, byte_pos
+            while True:
+                start = pos
+                while pos < len(buf) and buf[pos] in _WHITESPACE:
+                    pos += 1
+                byte_pos += pos - start
+                if pos < len(buf) or not fill():
+                    return
+
+        # A UTF-8 byte order mark (written by some Windows tools) precedes the array
+        if buf.startswith("\ufeff"):
+            pos = 1
+            byte_pos = len(codecs.BOM_UTF8)
+
+        skip_ws()
+        if pos >= len(buf) or buf[pos] != "[":
+            raise ValueError(f"{input_file} does not contain a top-level JSON array")
+        pos += 1
+        byte_pos += 1
+
+        skip_ws()
+        if pos < len(buf) and buf[pos] == "]":
+            return
+
+        while True:
+            skip_ws()
+            # Decode the next element; if it runs past the buffered text,
+            # read another block and retry from the same position.
+            while True:
+                try:
+                    obj, end = _DECODER.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise ValueError(f"Malformed JSON array in {input_file}: {e}") from e
+                    fill(len(buf) - pos + chunk_size)
+                    continue
+                # A number at the very end of the buffer may be truncated
+                if end == len(buf) and not eof and isinstance(obj, (int, float)):
+                    fill(len(buf) - pos + chunk_size)
+                    continue
+                break
+            length = len(buf[pos:end].encode("utf-8")) if with_offsets else 0
+            yield obj, byte_pos, length
+            pos = end
+            byte_pos += length
+
+            skip_ws()
+            if pos >= len(buf):
+                raise ValueError(f"Unexpected end of JSON array in {input_file}")
+            if buf[pos] == ",":
+                pos += 1
+                byte_pos += 1
+            elif buf[pos] == "]":
+                return
+            else:
+                raise ValueError(
+                    f"Malformed JSON array in {input_file}: "
+                    f"expected ',' or ']' but found {buf[pos]!r}"
+                )
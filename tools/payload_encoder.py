@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# payload_encoder.py
+
+import json
+from typing import Any, Dict, List
+
+# Supported prompt payload formats:
+#   indent  - json.dumps(indent=2), the original prompt layout
+#   compact - single-line JSON without whitespace
+#   elide   - compact JSON with empty-string/null fields dropped per event
+#   table   - {"columns": [...], "rows": [[...], ...]} with keys written once
+#             and columns that are empty in every event dropped
+PAYLOAD_FORMATS = ("indent", "compact", "elide", "table")
+
+_COMPACT = dict(separators=(",", ":"), ensure_ascii=False)
+
+
+def _check_format(fmt: str) -> None:
+    if fmt not in PAYLOAD_FORMATS:
+        raise ValueError(f"Unknown payload format {fmt!r}; expected one of {PAYLOAD_FORMATS}")
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == ""
+
+
+def elide_empty(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of event without empty-string or null fields."""
+    return {k: v for k, v in event.items() if not _is_empty(v)}
+
+
+def table_columns(events: List[Dict[str, Any]]) -> List[str]:
+    """Keys with at least one non-empty value, in first-seen order."""
+    columns: Dict[str, None] = {}
+    for ev in events:
+        for k, v in ev.items():
+            if k not in columns and not _is_empty(v):
+                columns[k] = None
+    return list(columns)
+
+
+def encode_events(events: List[Dict[str, Any]], fmt: str = "indent") -> str:
+    """
+    Serialize a list of events for inclusion in an LLM prompt.
+
+    Args:
+        events: List of event dicts (one split part)
+        fmt: One of PAYLOAD_FORMATS (default: "indent")
+
+    Returns:
+        str: The encoded payload.
+    """
+    _check_format(fmt)
+    if fmt == "indent":
+        return json.dumps(events, indent=2)
+    if fmt == "compact":
+        return json.dumps(events, **_COMPACT)
+    if fmt == "elide":
+        return json.dumps([elide_empty(ev) for ev in events], **_COMPACT)
+
+    columns = table_columns(events)
+    rows = [json.dumps([ev.get(c, "") for c in columns], **_COMPACT) for ev in events]
+    return (
+        '{"columns":' + json.dumps(columns, **_COMPACT) + ',\n"rows":[\n'
+        + ",\n".join(rows)
+        + "\n]}"
+    )
+
+
+def event_token_text(event: Dict[str, Any], fmt: str = "compact") -> str:
+    """
+    Text whose token count approximates what `event` costs in a payload of
+    format `fmt`. Used by the splitter for its per-part token budget.
+
+    "indent" and "compact" keep the splitter's original accounting (compact
+    JSON of the full event) so default part boundaries are unchanged; "table"
+    counts only the row values, since keys are written once per part.
+    """
+    _check_format(fmt)
+    if fmt in ("indent", "compact"):
+        return json.dumps(event, **_COMPACT)
+    if fmt == "elide":
+        return json.dumps(elide_empty(event), **_COMPACT)
+    return json.dumps([v for v in event.values() if not _is_empty(v)], **_COMPACT)
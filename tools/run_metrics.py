@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# run_metrics.py
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Union
+
+from LLM_APIs.usage import USAGE_FIELDS
+
+# Per-call fields copied from an adapter's `stats` into the JSON-lines log
+CALL_FIELDS = (
+    "latency",
+    "queue_wait",
+    "time_to_first_token",
+    "retries",
+    "bytes_in",
+    "bytes_out",
+    "cache_hit",
+)
+
+
+def tokens_per_second(stats: Dict[str, Any]) -> Optional[float]:
+    """Output tokens over generation time (latency minus time-to-first-token when streamed)."""
+    output_tokens = (stats.get("usage") or {}).get("output_tokens")
+    generation_time = stats.get("latency", 0.0) - stats.get("time_to_first_token", 0.0)
+    if not output_tokens or generation_time <= 0:
+        return None
+    return output_tokens / generation_time
+
+
+class RunMetrics:
+    """
+    Per-run accumulator of LLM call statistics and pipeline stage timings.
+
+    record() takes the `stats` dict an LLM adapter filled in for one call
+    (see LLM_APIs.streaming.call_bedrock_model) and sums its provider-reported
+    token usage, latency, retries and cache hits into the stage; the usage of
+    a reply replayed from the response cache is summed apart, under
+    replayed_<field>; stage() times
+    a block of the pipeline. With an `events_path`, every call and stage is
+    also appended there as one JSON line. Safe to call from the first pass's
+    worker threads.
+    """
+
+    def __init__(self, events_path: Optional[Union[str, Path]] = None):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.stage_seconds: Dict[str, float] = {}
+        self.info: Dict[str, Any] = {}
+        self.events_path = Path(events_path) if events_path else None
+        self._lock = threading.Lock()
+
+    def _stage(self, stage: str) -> Dict[str, Any]:
+        if stage not in self.stages:
+            self.stages[stage] = {
+                "calls": 0,
+                "calls_with_usage": 0,
+                "response_cache_hits": 0,
+                "replayed_calls_with_usage": 0,
+                "retries": 0,
+                "latency_seconds": 0.0,
+                "queue_wait_seconds": 0.0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+                **{field: 0 for field in USAGE_FIELDS},
+                **{f"replayed_{field}": 0 for field in USAGE_FIELDS},
+            }
+        return self.stages[stage]
+
+    def _log(self, event: Dict[str, Any]) -> None:
+        # Caller holds the lock
+        if self.events_path is None:
+            return
+        self.events_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.events_path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(event) + "\n")
+
+    def record(self, stage: str, stats: Dict[str, Any], **fields: Any) -> None:
+        """Add one call's stats to `stage`; `fields` (e.g. part=3) only go to the JSON-lines log."""
+        usage = stats.get("usage") or {}
+        with self._lock:
+            totals = self._stage(stage)
+            totals["calls"] += 1
+            totals["retries"] += stats.get("retries", 0)
+            totals["latency_seconds"] += stats.get("latency", 0.0)
+            totals["queue_wait_seconds"] += stats.get("queue_wait", 0.0)
+            totals["bytes_in"] += stats.get("bytes_in", 0)
+            totals["bytes_out"] += stats.get("bytes_out", 0)
+            prefix = ""
+            if stats.get("cache_hit"):
+                totals["response_cache_hits"] += 1
+                prefix = "replayed_"
+            if usage:
+                totals[f"{prefix}calls_with_usage"] += 1
+            for field in USAGE_FIELDS:
+                totals[f"{prefix}{field}"] += usage.get(field) or 0
+            self._log({
+                "type": "call",
+                "time": time.time(),
+                "stage": stage,
+                **fields,
+                **{name: stats[name] for name in CALL_FIELDS if name in stats},
+                "tokens_per_second": tokens_per_second(stats),
+                "usage": usage,
+            })
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as pipeline stage `name` (also on failure)."""
+        started = time.monotonic()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            seconds = time.monotonic() - started
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+                self._log({
+                    "type": "stage",
+                    "time": time.time(),
+                    "stage": name,
+                    "seconds": seconds,
+                    "failed": failed,
+                })
+
+    def totals(self) -> Dict[str, Any]:
+        """Sum of every stage."""
+        with self._lock:
+            combined = {}
+            for totals in self.stages.values():
+                for name, value in totals.items():
+                    combined[name] = combined.get(name, 0) + value
+            return combined
+
+    def has_usage(self) -> bool:
+        """
+        True if every call that reached a model reported its token usage and
+        every reply replayed from the response cache was stored with its usage.
+        """
+        totals = self.totals()
+        hits = totals.get("response_cache_hits", 0)
+        model_calls = totals.get("calls", 0) - hits
+        return (totals.get("calls", 0) > 0
+                and totals.get("calls_with_usage", 0) >= model_calls
+                and totals.get("replayed_calls_with_usage", 0) >= hits)
+
+    def input_tokens(self, replayed: bool = True) -> int:
+        """
+        All prompt tokens, including those read from or written to the prompt
+        cache, and those of replies replayed from the response cache unless
+        `replayed` is False.
+        """
+        totals = self.totals()
+        prefixes = ("", "replayed_") if replayed else ("",)
+        return sum(totals.get(f"{prefix}{field}", 0)
+                   for prefix in prefixes
+                   for field in ("input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"))
+
+    def output_tokens(self, replayed: bool = True) -> int:
+        totals = self.totals()
+        return totals.get("output_tokens", 0) + (totals.get("replayed_output_tokens", 0) if replayed else 0)
+
+    def to_dict(self, **extra: Any) -> Dict[str, Any]:
+        with self._lock:
+            stages = {name: dict(totals) for name, totals in self.stages.items()}
+            stage_seconds = dict(self.stage_seconds)
+            info = dict(self.info)
+        return {
+            **info,
+            **extra,
+            "stage_seconds": stage_seconds,
+            "stages": stages,
+            "totals": self.totals(),
+        }
+
+    def write(self, path: Union[str, Path], **extra: Any) -> Path:
+        """Write the metrics (plus `info` and any `extra` top-level fields) as JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as f:
+            json.dump(self.to_dict(**extra), f, indent=2)
+        return path
+
+    def write_prometheus(self, path: Union[str, Path], **labels: str) -> Path:
+        """
+        Write the metrics in Prometheus text exposition format (e.g. for the
+        node_exporter textfile collector). `labels` are added to every sample.
+        """
+        def sample(name: str, value: Any, **extra: str) -> str:
+            all_labels = {**labels, **extra}
+            label_text = ",".join(f'{k}="{v}"' for k, v in all_labels.items())
+            return f"{name}{{{label_text}}} {float(value)}" if label_text else f"{name} {float(value)}"
+
+        lines = [
+            "# HELP pipeline_stage_seconds Wall time spent in each pipeline stage.",
+            "# TYPE pipeline_stage_seconds gauge",
+        ]
+        with self._lock:
+            lines += [sample("pipeline_stage_seconds", s, stage=n) for n, s in self.stage_seconds.items()]
+            stages = {name: dict(totals) for name, totals in self.stages.items()}
+
+        counters = {
+            "llm_calls_total": ("Model calls.", "calls"),
+            "llm_response_cache_hits_total": ("Calls answered from the response cache.", "response_cache_hits"),
+            "llm_retries_total": ("Retried model call attempts.", "retries"),
+            "llm_call_latency_seconds_total": ("Summed call latency.", "latency_seconds"),
+            "llm_queue_wait_seconds_total": ("Summed time calls waited for a slot.", "queue_wait_seconds"),
+            "llm_request_bytes_total": ("Request payload bytes.", "bytes_in"),
+            "llm_response_bytes_total": ("Response payload bytes.", "bytes_out"),
+        }
+        for metric, (help_text, key) in counters.items():
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [sample(metric, totals[key], stage=stage) for stage, totals in stages.items()]
+        lines += ["# HELP llm_tokens_total Provider-reported tokens.", "# TYPE llm_tokens_total counter"]
+        for stage, totals in stages.items():
+            lines += [sample("llm_tokens_total", totals[field], stage=stage, type=field)
+                      for field in USAGE_FIELDS]
+        lines += [
+            "# HELP llm_replayed_tokens_total Provider-reported tokens of replies replayed from the response cache.",
+            "# TYPE llm_replayed_tokens_total counter",
+        ]
+        for stage, totals in stages.items():
+            lines += [sample("llm_replayed_tokens_total", totals[f"replayed_{field}"], stage=stage, type=field)
+                      for field in USAGE_FIELDS]
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return path
+
+
+def record_call(metrics: Optional[RunMetrics], stage: str, stats: Dict[str, Any], **fields: Any) -> None:
+    """RunMetrics.record() that tolerates metrics being disabled (None)."""
+    if metrics is not None:
+        metrics.record(stage, stats, **fields)
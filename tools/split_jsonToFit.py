@@ -1,70 +1,142 @@
 #!/usr/bin/env python3
 import json
 import os
-from dateutil import parser as dateparser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import tiktoken
 from pathlib import Path
 
+from tools.event_index import OffsetIndexWriter, iter_indexed_events
+from tools.json_stream import iter_json_array
+from tools.payload_encoder import event_token_text
+from tools.timestamps import gap_exceeds, parse_time_ns
 
-def split_json_by_tokens_and_time(
+ENCODING_NAME = "cl100k_base"
+
+# Per-process encoder used by the token-counting pool workers
+_worker_encoder = None
+
+
+def count_tokens(obj, encoder, payload_format: str = "compact"):
+    """Return the number of tokens obj costs when encoded as `payload_format`."""
+    return len(encoder.encode(event_token_text(obj, payload_format)))
+
+
+def _init_token_worker(encoding_name):
+    """Load the tokenizer once per pool process."""
+    global _worker_encoder
+    _worker_encoder = tiktoken.get_encoding(encoding_name)
+
+
+def _count_block(block, payload_format):
+    """Serialize a block of events and batch-encode them in one call."""
+    texts = [event_token_text(obj, payload_format) for obj in block]
+    return [len(tokens) for tokens in _worker_encoder.encode_batch(texts)]
+
+
+def iter_token_counts(events, workers: int = 1, batch_size: int = 512, payload_format: str = "compact"):
+    """
+    Yield (event, token_count) pairs in input order.
+
+    With workers > 1, events are grouped into blocks of `batch_size` and
+    serialized/encoded in a process pool. At most `2 * workers` blocks are in
+    flight at once, so a lazy `events` iterable is never read far ahead.
+
+    Args:
+        events: Iterable of JSON-serializable events
+        workers: Number of worker processes (1 = count in this process)
+        batch_size: Events per block sent to a worker (default: 512)
+        payload_format: Payload format the counts are taken for (see
+                        tools.payload_encoder.PAYLOAD_FORMATS)
+    """
+    if workers <= 1:
+        encoder = tiktoken.get_encoding(ENCODING_NAME)
+        for ev in events:
+            yield ev, count_tokens(ev, encoder, payload_format)
+        return
+
+    events = iter(events)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_token_worker,
+        initargs=(ENCODING_NAME,),
+    ) as pool:
+        pending = deque()
+        while True:
+            block = list(islice(events, batch_size))
+            if block:
+                pending.append((block, pool.submit(_count_block, block, payload_format)))
+            if pending and (not block or len(pending) >= 2 * workers):
+                done_block, future = pending.popleft()
+                yield from zip(done_block, future.result())
+            if not block and not pending:
+                break
+
+
+def write_part(part_objs, part_index, output_dir: Path):
+    """Write the list of objects to output_dir/part_NN.json."""
+    os.makedirs(output_dir, exist_ok=True)
+    out_path = Path(output_dir) / f"part_{part_index:02d}.json"
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(part_objs, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {len(part_objs)} objects to {out_path}")
+
+
+def iter_parts(
     input_file: Path,
-    output_dir: Path,
     tokens_per_file: int = 50000,
-    time_gap_seconds: int = 3600
+    time_gap_seconds: int = 3600,
+    stream: bool = False,
+    workers: int = 1,
+    batch_size: int = 512,
+    payload_format: str = "compact",
+    output_dir: Path = None,
+    index_file: Path = None,
+    events=None
 ):
     """
-    Split a large JSON array into smaller parts based on token count and time gaps.
-    
-    Args:
-        input_file: Path to the input JSON file containing an array of objects
-        output_dir: Directory where the split parts will be written
-        tokens_per_file: Maximum tokens per part (default: 50000)
-        time_gap_seconds: Time gap in seconds to trigger a new part (default: 3600 = 1 hour)
-    
-    Returns:
-        int: Number of parts created
+    Yield (part_index, events) for each part of a JSON array split by token
+    count and time gaps, as soon as the part is complete. Part boundaries are
+    those of split_json_by_tokens_and_time; see it for the arguments.
+
+    If `output_dir` is given, each part is also written there as
+    part_NN.json before it is yielded.
     """
-    def count_tokens(obj, encoder):
-        """Return the number of tokens in the JSON serialization of obj."""
-        text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
-        return len(encoder.encode(text))
-
-    def write_part(part_objs, part_index):
-        """Write the list of objects to a JSON file."""
-        os.makedirs(output_dir, exist_ok=True)
-        out_path = output_dir / f"part_{part_index:02d}.json"
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(part_objs, f, indent=2, ensure_ascii=False)
-        print(f"Wrote {len(part_objs)} objects to {out_path}")
-
-    # Load all events
-    with open(input_file, "r", encoding="utf-8") as f:
-        events = json.load(f)
-
-    # Prepare tokenizer
-    encoder = tiktoken.get_encoding("cl100k_base")
+    # Unless given the events, load them all, or iterate over them lazily in
+    # streaming mode; indexing needs each event's byte offset, so it always streams
+    if events is None:
+        if index_file is not None:
+            events = iter_indexed_events(input_file, OffsetIndexWriter(input_file, index_file))
+        elif stream:
+            events = iter_json_array(input_file)
+        else:
+            with open(input_file, "r", encoding="utf-8") as f:
+                events = json.load(f)
 
     parts = []
     current_tokens = 0
     part_index = 1
     prev_time = None
 
-    for ev in events:
+    # tok: how many tokens each event would add
+    for ev, tok in iter_token_counts(
+        events, workers=workers, batch_size=batch_size, payload_format=payload_format
+    ):
         # Parse this event's time
-        curr_time = dateparser.parse(ev["TimeCreated"])
-
-        # How many tokens would this add?
-        tok = count_tokens(ev, encoder)
+        curr_time = parse_time_ns(ev["TimeCreated"])
 
         # Check size or time-gap thresholds
         exceed_token = (current_tokens + tok) > tokens_per_file
-        exceed_time = (prev_time is not None and 
-                      (curr_time - prev_time).total_seconds() > time_gap_seconds)
+        exceed_time = (prev_time is not None and curr_time is not None and
+                       gap_exceeds(prev_time, curr_time, time_gap_seconds))
 
         if exceed_token or exceed_time:
             # Flush current part
             if parts:
-                write_part(parts, part_index)
+                if output_dir is not None:
+                    write_part(parts, part_index, output_dir)
+                yield part_index, parts
                 part_index += 1
 
             # Start new part
@@ -77,8 +149,63 @@ def split_json_by_tokens_and_time(
 
         prev_time = curr_time
 
-    # Write any remaining
+    # Flush any remaining
     if parts:
-        write_part(parts, part_index)
+        if output_dir is not None:
+            write_part(parts, part_index, output_dir)
+        yield part_index, parts
+
+
+def split_json_by_tokens_and_time(
+    input_file: Path,
+    output_dir: Path,
+    tokens_per_file: int = 50000,
+    time_gap_seconds: int = 3600,
+    stream: bool = False,
+    workers: int = 1,
+    batch_size: int = 512,
+    payload_format: str = "compact",
+    index_file: Path = None,
+    events=None
+):
+    """
+    Split a large JSON array into smaller parts based on token count and time gaps.
+    
+    Args:
+        input_file: Path to the input JSON file containing an array of objects
+        output_dir: Directory where the split parts will be written
+        tokens_per_file: Maximum tokens per part (default: 50000)
+        time_gap_seconds: Time gap in seconds to trigger a new part (default: 3600 = 1 hour)
+        stream: Parse the input array one event at a time instead of loading it
+                whole, so peak memory is bounded by one part (default: False).
+                Part boundaries are identical in both modes.
+        workers: Processes used for token counting (default: 1 = in-process).
+                 Split decisions are still taken in input order.
+        batch_size: Events per token-counting batch when workers > 1 (default: 512)
+        payload_format: Prompt payload format the token budget is measured in
+                        (default: "compact", the original accounting)
+        index_file: If given, also write a LineNumber -> byte offset index of
+                    `input_file` there (see tools.event_index), read from the
+                    same pass over the input (default: None)
+        events: Events to split instead of reading `input_file`, e.g. a
+                tools.event_store.EventStore.iter_events() query (default: None)
+    
+    Returns:
+        int: Number of parts created
+    """
+    part_index = 1
+    for part_index, _ in iter_parts(
+        input_file,
+        tokens_per_file=tokens_per_file,
+        time_gap_seconds=time_gap_seconds,
+        stream=stream,
+        workers=workers,
+        batch_size=batch_size,
+        payload_format=payload_format,
+        output_dir=output_dir,
+        index_file=index_file,
+        events=events,
+    ):
+        pass
 
-    return part_index
\ No newline at end of file
+    return part_index
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# template_miner.py
+
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from tools.event_collapser import MASKS, add_group, write_groups
+from tools.json_stream import iter_json_array
+from tools.timestamps import parse_time_ns
+
+WILDCARD = "<*>"
+
+# EvtxECmd fields whose text is mined; empty fields are skipped
+MESSAGE_FIELDS = ("PayloadData1", "PayloadData2", "PayloadData3",
+                  "PayloadData4", "PayloadData5", "PayloadData6")
+FIELD_SEPARATOR = "|"
+
+_HAS_DIGIT = re.compile(r"\d")
+
+
+class _Cluster:
+    """One template: masked tokens with WILDCARD at positions that vary."""
+
+    __slots__ = ("template", "count", "first_event", "first_tokens", "line_numbers",
+                 "min_time", "max_time", "parameters", "overflow")
+
+    def __init__(self, template: List[str], raw: List[str], event: Dict[str, Any], t: Optional[int]):
+        self.template = template
+        self.count = 0
+        self.first_event = event
+        # Raw tokens of the first event, for positions that turn into parameters
+        self.first_tokens = raw
+        self.line_numbers: List[Any] = []
+        self.min_time = (t, event.get("TimeCreated"))
+        self.max_time = (t, event.get("TimeCreated"))
+        # position -> {raw value: count}
+        self.parameters: Dict[int, Dict[str, int]] = {}
+        self.overflow = 0
+
+
+class _Node:
+    __slots__ = ("children", "clusters")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.clusters: List[_Cluster] = []
+
+
+class TemplateMiner:
+    """
+    Online Drain-style template miner over EvtxECmd events.
+
+    Each event's PayloadData fields are joined into one message and routed
+    through a fixed-depth parse tree: (Provider, EventId) -> token count ->
+    the first `depth - 2` tokens -> a leaf holding candidate templates. The
+    message joins the most similar template at that leaf if the share of
+    equal tokens is at least `sim_threshold`, otherwise it starts a new one.
+    Each event costs one tree walk plus a scan of one small leaf, so the miner
+    runs in a single streaming pass.
+
+    GUIDs, hex values and digit runs are masked inside tokens before
+    matching, so repeated runs of the same task share a template exactly;
+    the raw values are kept as parameters.
+    """
+
+    def __init__(
+        self,
+        depth: int = 4,
+        sim_threshold: float = 0.7,
+        max_children: int = 100,
+        max_parameter_values: int = 20,
+        fields: Sequence[str] = MESSAGE_FIELDS
+    ):
+        """
+        Args:
+            depth: Parse tree depth; depth - 2 leading tokens are used for routing
+            sim_threshold: Minimum share of equal tokens to join a template
+            max_children: Max children per tree node before routing to WILDCARD
+            max_parameter_values: Distinct values kept per parameter position;
+                                  further values are only counted
+            fields: Event fields concatenated into the mined message
+        """
+        self.depth = max(depth, 3)
+        self.sim_threshold = sim_threshold
+        self.max_children = max_children
+        self.max_parameter_values = max_parameter_values
+        self.fields = tuple(fields)
+        self._roots: Dict[Tuple[Any, Any], Dict[int, _Node]] = {}
+        self._clusters: List[_Cluster] = []
+        self._mask_cache: Dict[str, str] = {}
+
+    # ── message handling ──────────────────────────────
+    def _mask(self, token: str) -> str:
+        masked = self._mask_cache.get(token)
+        if masked is None:
+            masked = token
+            if _HAS_DIGIT.search(token):
+                for pattern, repl in MASKS:
+                    masked = pattern.sub(repl, masked)
+            if len(self._mask_cache) > 200_000:
+                self._mask_cache.clear()
+            self._mask_cache[token] = masked
+        return masked
+
+    def _tokens(self, event: Dict[str, Any]) -> List[str]:
+        tokens: List[str] = []
+        for field in self.fields:
+            value = event.get(field)
+            if value is None or value == "":
+                continue
+            if tokens:
+                tokens.append(FIELD_SEPARATOR)
+            tokens.extend(str(value).split())
+        return tokens
+
+    # ── tree ──────────────────────────────
+    def _leaf(self, key: Tuple[Any, Any], masked: List[str]) -> _Node:
+        by_length = self._roots.setdefault(key, {})
+        node = by_length.get(len(masked))
+        if node is None:
+            node = by_length[len(masked)] = _Node()
+        for token in masked[: self.depth - 2]:
+            if "<" in token:  # masked variable: do not branch on it
+                token = WILDCARD
+            child = node.children.get(token)
+            if child is None:
+                if len(node.children) >= self.max_children:
+                    token = WILDCARD
+                    child = node.children.get(WILDCARD)
+                if child is None:
+                    child = node.children[token] = _Node()
+            node = child
+        return node
+
+    @staticmethod
+    def _similarity(template: List[str], masked: List[str]) -> Tuple[float, int]:
+        equal = wildcards = 0
+        for a, b in zip(template, masked):
+            if a == WILDCARD:
+                wildcards += 1
+            elif a == b:
+                equal += 1
+        return equal / len(masked) if masked else 1.0, wildcards
+
+    # ── public API ──────────────────────────────
+    def add_event(self, event: Dict[str, Any]) -> _Cluster:
+        """Route one event into the tree and update its template."""
+        raw = self._tokens(event)
+        masked = [self._mask(tok) for tok in raw]
+        key = (event.get("Provider"), str(event.get("EventId")))
+        leaf = self._leaf(key, masked)
+        t = parse_time_ns(event.get("TimeCreated"))
+
+        best, best_sim = None, (-1.0, -1)
+        for cluster in leaf.clusters:
+            sim = self._similarity(cluster.template, masked)
+            if sim > best_sim:
+                best, best_sim = cluster, sim
+
+        if best is None or best_sim[0] < self.sim_threshold:
+            best = _Cluster(list(masked), raw, event, t)
+            leaf.clusters.append(best)
+            self._clusters.append(best)
+        else:
+            for i, (a, b) in enumerate(zip(best.template, masked)):
+                if a != b and a != WILDCARD:
+                    # Position becomes a parameter; keep the old constant's raw value
+                    best.template[i] = WILDCARD
+                    if i not in best.parameters:
+                        best.parameters[i] = {best.first_tokens[i]: best.count}
+
+        self._record(best, raw, masked, event, t)
+        return best
+
+    def _record(self, cluster: _Cluster, raw: List[str], masked: List[str],
+                event: Dict[str, Any], t: Optional[int]) -> None:
+        cluster.count += 1
+        cluster.line_numbers.append(event.get("LineNumber"))
+        if t is not None:
+            if cluster.min_time[0] is None or t < cluster.min_time[0]:
+                cluster.min_time = (t, event.get("TimeCreated"))
+            if cluster.max_time[0] is None or t > cluster.max_time[0]:
+                cluster.max_time = (t, event.get("TimeCreated"))
+        for i, (tmpl, tok, m) in enumerate(zip(cluster.template, raw, masked)):
+            if tmpl != WILDCARD and tok == m:
+                continue
+            values = cluster.parameters.setdefault(i, {})
+            if tok in values:
+                values[tok] += 1
+            elif len(values) < self.max_parameter_values:
+                values[tok] = 1
+            else:
+                cluster.overflow += 1
+
+    def template_records(self) -> List[Dict[str, Any]]:
+        """
+        Return one record per template, ordered by first occurrence.
+        "Parameters" holds one {value: count} map per variable token of
+        "Template", in token order. Records share the collapsed-group layout
+        (Count, FirstTime, LastTime); their members are in groups().
+        """
+        records = []
+        for cluster in self._clusters:
+            first = cluster.first_event
+            rec = {
+                "LineNumber": first.get("LineNumber"),
+                "TimeCreated": first.get("TimeCreated"),
+                "EventId": first.get("EventId"),
+                "Provider": first.get("Provider"),
+                "MapDescription": first.get("MapDescription", ""),
+                "Template": " ".join(cluster.template),
+                "Parameters": [cluster.parameters[i] for i in sorted(cluster.parameters)],
+                "Count": cluster.count,
+                "FirstTime": cluster.min_time[1],
+                "LastTime": cluster.max_time[1],
+            }
+            if cluster.overflow:
+                rec["OmittedParameterValues"] = cluster.overflow
+            records.append(rec)
+        return records
+
+    def groups(self) -> Dict[int, List[int]]:
+        """
+        Each template record's LineNumber -> the LineNumbers of its events,
+        in input order (the collapsed-group sidecar, see
+        tools.event_collapser.write_groups), so extract_events can expand
+        flagged templates back to raw events.
+        """
+        groups: Dict[int, List[int]] = {}
+        for cluster in self._clusters:
+            add_group(groups, cluster.first_event.get("LineNumber"), cluster.line_numbers)
+        return groups
+
+
+def mine_templates(
+    events: Iterable[Dict[str, Any]],
+    groups: Optional[Dict[int, List[int]]] = None,
+    **miner_kwargs
+) -> List[Dict[str, Any]]:
+    """
+    Mine templates from an iterable of events in one pass. If `groups` is
+    given, it is filled with TemplateMiner.groups().
+    """
+    miner = TemplateMiner(**miner_kwargs)
+    for ev in events:
+        miner.add_event(ev)
+    if groups is not None:
+        groups.update(miner.groups())
+    return miner.template_records()
+
+
+def mine_file(
+    input_file: Union[str, Path],
+    output_file: Union[str, Path],
+    **miner_kwargs
+) -> int:
+    """
+    Stream `input_file` (a JSON array of events) through the template miner
+    and write the template records to `output_file`, and their events to
+    its groups sidecar (see tools.event_collapser.groups_path).
+
+    Returns:
+        int: Number of templates written.
+    """
+    groups: Dict[int, List[int]] = {}
+    records = mine_templates(iter_json_array(input_file), groups, **miner_kwargs)
+
+    out_path = Path(output_file)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2, ensure_ascii=False)
+    write_groups(output_file, groups)
+
+    total = sum(rec["Count"] for rec in records)
+    print(f"Mined {len(records)} templates from {total} events into {output_file}")
+    return len(records)
+
+
+if __name__ == "__main__":
+    # === CONFIGURE THESE PATHS ===
+    INPUT_FILE  = Path("./json_data2/mediumCSV-2.json")
+    OUTPUT_FILE = Path("./json_data2/mediumCSV-2-templates.json")
+    # ============================
+
+    mine_file(INPUT_FILE, OUTPUT_FILE)
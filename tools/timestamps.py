@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# timestamps.py
+
+from array import array
+from datetime import date, datetime, timezone
+from typing import Any, Iterable, Optional
+
+from dateutil import parser as dateparser
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_MICROSECOND = 1_000
+
+# Sentinel stored in integer arrays for missing/unparseable values
+# (same bit pattern numpy/pandas use for NaT)
+MISSING_NS = -(2 ** 63)
+
+# Canonical EvtxECmd layout: "2024-01-27 23:10:20.1764279"
+EVTXECMD_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def _datetime_to_ns(dt: datetime) -> int:
+    """Convert a datetime to epoch nanoseconds; naive values are taken as UTC."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * NS_PER_SECOND + delta.microseconds * NS_PER_MICROSECOND
+
+
+def _parse_evtxecmd(s: str) -> Optional[int]:
+    """
+    Parse "YYYY-MM-DD HH:MM:SS[.fffffff]" without going through strptime.
+    Returns None if `s` is not in that exact layout.
+    """
+    n = len(s)
+    if n < 19 or s[4] != "-" or s[7] != "-" or s[10] not in " T" or s[13] != ":" or s[16] != ":":
+        return None
+    if n > 19:
+        frac = s[20:]
+        if s[19] != "." or not (0 < len(frac) <= 9) or not frac.isdigit():
+            return None
+    else:
+        frac = ""
+    try:
+        hour, minute, second = int(s[11:13]), int(s[14:16]), int(s[17:19])
+        if hour > 23 or minute > 59 or second > 59:
+            return None
+        days = date(int(s[0:4]), int(s[5:7]), int(s[8:10])).toordinal() - _EPOCH_ORDINAL
+    except ValueError:
+        return None
+    ns = (days * 86400 + hour * 3600 + minute * 60 + second) * NS_PER_SECOND
+    if frac:
+        ns += int(frac.ljust(9, "0"))
+    return ns
+
+
+def parse_time_ns(value: Any) -> Optional[int]:
+    """
+    Parse a single TimeCreated value into integer epoch nanoseconds (UTC).
+
+    The EvtxECmd layout is handled by a fast fixed-position parser that keeps
+    the full 100ns precision; anything else falls back to dateutil.
+
+    Returns:
+        Epoch nanoseconds, or None for missing/empty/unparseable values.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return _datetime_to_ns(value)
+    if isinstance(value, float) and value != value:  # NaN from pandas
+        return None
+    s = str(value).strip()
+    if not s:
+        return None
+    if s.isascii():
+        ns = _parse_evtxecmd(s)
+        if ns is not None:
+            return ns
+    try:
+        return _datetime_to_ns(dateparser.parse(s))
+    except (ValueError, OverflowError):
+        return None
+
+
+def parse_times_ns(values: Iterable[Any]) -> array:
+    """
+    Parse a column of TimeCreated values into an array('q') of epoch
+    nanoseconds. Missing or unparseable values are stored as MISSING_NS.
+    """
+    out = array("q")
+    append = out.append
+    for value in values:
+        ns = parse_time_ns(value)
+        append(MISSING_NS if ns is None else ns)
+    return out
+
+
+def parse_time_series_ns(series):
+    """
+    Vectorized variant of parse_times_ns for a pandas Series.
+
+    The whole column is parsed in one `pd.to_datetime` call with the
+    EvtxECmd format; only values that fail it are re-parsed one by one.
+
+    Returns:
+        numpy int64 array of epoch nanoseconds (MISSING_NS where unparseable).
+    """
+    import pandas as pd
+
+    parsed = pd.to_datetime(series, format=EVTXECMD_FORMAT, errors="coerce")
+    out = parsed.to_numpy(dtype="datetime64[ns]").astype("int64")
+    retry = parsed.isna().to_numpy() & series.notna().to_numpy()
+    for i in retry.nonzero()[0]:
+        ns = parse_time_ns(series.iat[i])
+        out[i] = MISSING_NS if ns is None else ns
+    return out
+
+
+def time_sort_key(value: Any) -> int:
+    """Sort key for TimeCreated values; missing values sort first."""
+    ns = parse_time_ns(value)
+    return MISSING_NS if ns is None else ns
+
+
+def gap_exceeds(prev_ns: int, curr_ns: int, gap_seconds: float) -> bool:
+    """
+    True if curr_ns is more than gap_seconds after prev_ns.
+
+    Compared at microsecond resolution, matching the precision dateutil kept
+    when the splitter used it, so part boundaries stay reproducible.
+    """
+    delta_us = curr_ns // NS_PER_MICROSECOND - prev_ns // NS_PER_MICROSECOND
+    return delta_us > gap_seconds * 1_000_000